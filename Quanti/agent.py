@@ -0,0 +1,190 @@
+"""Long-lived benchmark agent: runs benchmark.py jobs in one warm interpreter.
+
+Usage: python3 agent.py                          serve one client on stdin/stdout (local-process mode)
+       python3 agent.py serve [--socket PATH]    daemon: serve clients one at a time on a Unix socket
+       python3 agent.py connect [--socket PATH]  bridge stdin/stdout to the daemon (exit 3 if none runs)
+
+The protocol is JSON lines. A client sends
+    {"op": "run", "id": "r1", "argv": ["Llama-3-8B", "data/input/llm_workload_10.csv", ...]}
+    {"op": "ping"}
+    {"op": "shutdown", "stop_server": false}
+and receives {"event": "ready"} on connect, then {"event": "log", "id", "line"} for every
+line the job (or a subprocess of it) prints, {"event": "done", "id", "exit", "elapsed_s"}
+when it ends, {"event": "pong"} and {"event": "bye"}. Jobs run one at a time, so a second
+client waits until the first disconnects. benchmark and its dependencies are imported
+once, when the agent starts.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+AGENT_SOCKET = "~/.quanti_agent.sock"
+NO_AGENT_EXIT = 3
+_JOB_END = "\x00quanti-job-end "
+
+
+class Agent:
+    def __init__(self, daemon: bool = False):
+        self.daemon = daemon
+        self.jobs = 0
+        self.started = time.time()
+        self._client = None
+        self._send_lock = threading.Lock()
+        self._job_id = None
+        self._job_flushed = threading.Event()
+
+        # Keep private copies of the real stdin/stdout, then point fd 0 at /dev/null and
+        # fds 1/2 at a pipe, so nothing a job or its subprocesses print can corrupt the protocol
+        self.stdin_fd = os.dup(0)
+        self.stdout_fd = os.dup(1)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        r, w = os.pipe()
+        os.dup2(w, 1)
+        os.dup2(w, 2)
+        os.close(w)
+        sys.stdout = open(1, "w", buffering=1, encoding="utf-8", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, encoding="utf-8", closefd=False)
+        threading.Thread(target=self._pump_logs, args=(r,), name="agent-logs", daemon=True).start()
+
+        import benchmark
+        self.benchmark = benchmark
+
+    def send(self, message: dict) -> None:
+        with self._send_lock:
+            if self._client is None:
+                return
+            try:
+                self._client.write(json.dumps(message) + "\n")
+                self._client.flush()
+            except (OSError, ValueError):
+                self._client = None
+
+    def _pump_logs(self, fd: int) -> None:
+        with open(fd, encoding="utf-8", errors="replace") as pipe:
+            for line in pipe:
+                line = line.rstrip("\n")
+                if line.startswith(_JOB_END):
+                    self._job_flushed.set()
+                elif self._client is not None:
+                    self.send({"event": "log", "id": self._job_id, "line": line})
+                elif self.daemon:
+                    # Between clients the daemon's log file gets the output
+                    os.write(self.stdout_fd, (line + "\n").encode())
+
+    def run_job(self, job_id: str, argv: list) -> int:
+        self._job_id = job_id
+        self._job_flushed.clear()
+        t0 = time.monotonic()
+        try:
+            code = self.benchmark.main(list(argv))
+        except SystemExit as e:  # argparse errors
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException as e:
+            print(f"❌ Agent job {job_id} crashed: {e!r}")
+            code = 1
+        # Every line of this job reaches the client before its done event
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.write(1, f"{_JOB_END}{job_id}\n".encode())
+        self._job_flushed.wait(timeout=10)
+        self.jobs += 1
+        self.send({"event": "done", "id": job_id, "exit": code, "elapsed_s": round(time.monotonic() - t0, 3)})
+        self._job_id = None
+        return code
+
+    def serve(self, reader, writer) -> bool:
+        """Handle one client until it disconnects. Returns True if it asked the agent to shut down."""
+        self._client = writer
+        self.send({"event": "ready", "pid": os.getpid(), "jobs": self.jobs,
+                   "uptime_s": round(time.time() - self.started, 1)})
+        try:
+            for line in reader:
+                if not line.strip():
+                    continue
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    self.send({"event": "error", "error": f"not JSON: {line.strip()[:200]}"})
+                    continue
+                op = msg.get("op")
+                if op == "run":
+                    self.run_job(str(msg.get("id", self.jobs)), msg.get("argv", []))
+                elif op == "ping":
+                    self.send({"event": "pong", "pid": os.getpid(), "jobs": self.jobs})
+                elif op == "shutdown":
+                    if msg.get("stop_server"):
+                        self.benchmark.stop_server()
+                    self.send({"event": "bye", "jobs": self.jobs})
+                    return True
+                else:
+                    self.send({"event": "error", "error": f"unknown op {op!r}"})
+            return False
+        finally:
+            self._client = None
+
+    def serve_pipe(self) -> None:
+        reader = open(self.stdin_fd, encoding="utf-8")
+        writer = open(self.stdout_fd, "w", encoding="utf-8", closefd=False)
+        self.serve(reader, writer)
+
+    def serve_socket(self, path: str) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen(16)
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn, conn.makefile("r", encoding="utf-8") as reader, \
+                        conn.makefile("w", encoding="utf-8") as writer:
+                    if self.serve(reader, writer):
+                        return
+        finally:
+            server.close()
+            os.remove(path)
+
+
+def connect(path: str) -> int:
+    """Copy stdin to the daemon's socket and its replies to stdout. Only the stdlib, so it starts fast."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return NO_AGENT_EXIT
+
+    def upstream():
+        for chunk in iter(lambda: os.read(0, 65536), b""):
+            sock.sendall(chunk)
+        sock.shutdown(socket.SHUT_WR)
+
+    threading.Thread(target=upstream, daemon=True).start()
+    for chunk in iter(lambda: sock.recv(65536), b""):
+        os.write(1, chunk)
+    return 0
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    mode = argv[0] if argv else "pipe"
+    path = os.path.expanduser(argv[argv.index("--socket") + 1] if "--socket" in argv else AGENT_SOCKET)
+    if mode == "connect":
+        return connect(path)
+    if mode == "serve":
+        Agent(daemon=True).serve_socket(path)
+    elif mode == "pipe":
+        Agent().serve_pipe()
+    else:
+        print(__doc__, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
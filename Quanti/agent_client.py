@@ -0,0 +1,141 @@
+"""Client of the persistent benchmark agent (agent.py) on a GPU host.
+
+The agent daemon keeps one Python process with benchmark.py's imports loaded between
+runs; each run is a JSON request over a Unix socket on the host, reached through the
+transport's multiplexed connection by a small `agent.py connect` bridge. The daemon is
+started on first use and survives the client, so a series of runs pays for the
+interpreter, imports and SSH session setup once.
+"""
+import json
+import subprocess
+import time
+
+REMOTE_ENV = "cd ~/Quanti && if [ -f ~/vllm-env/bin/activate ]; then source ~/vllm-env/bin/activate; fi && "
+AGENT_LOG = "~/.quanti_agent.log"
+NO_AGENT_EXIT = 3  # agent.py connect: no daemon listening
+
+
+class AgentError(RuntimeError):
+    pass
+
+
+class AgentClient:
+    def __init__(self, transport, daemon: bool = True, start_timeout_s: float = 120.0):
+        self.transport = transport
+        self.daemon = daemon
+        self.start_timeout_s = start_timeout_s
+        self.proc = None
+        self.info = {}
+        self._runs = 0
+
+    def __repr__(self):
+        return f"AgentClient({self.transport!r}, daemon={self.daemon})"
+
+    def _open(self) -> bool:
+        """Attach to the agent. False if daemon mode finds no daemon listening."""
+        if self.daemon:
+            # Without ~/Quanti (after a teardown) there is no agent to connect to either
+            cmd = f"[ -f ~/Quanti/agent.py ] || exit {NO_AGENT_EXIT}; {REMOTE_ENV}exec python3 agent.py connect"
+        else:
+            cmd = f"{REMOTE_ENV}exec python3 agent.py"
+        self.proc = self.transport.popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        ready = self._next()
+        if ready is None:
+            code = self.proc.wait()
+            self.proc = None
+            if self.daemon and code == NO_AGENT_EXIT:
+                return False
+            raise AgentError(f"agent exited with status {code} before it was ready")
+        if ready.get("event") != "ready":
+            raise AgentError(f"unexpected greeting from agent: {ready}")
+        self.info = ready
+        return True
+
+    def start_daemon(self) -> None:
+        print(f"🤖 Starting benchmark agent on {self.transport.host}...")
+        # Only the daemon goes to the background; a backgrounded `cd && ...` list would keep the pipes open
+        result = self.transport.run(f"{REMOTE_ENV}{{ nohup python3 agent.py serve >> {AGENT_LOG} 2>&1 < /dev/null & }}")
+        if result.returncode != 0:
+            raise AgentError(f"could not start agent: {result.stderr.decode(errors='replace').strip()}")
+
+    def connect(self, start: bool = True) -> bool:
+        """Attach, starting the daemon if needed (and allowed). Returns whether an agent is attached."""
+        if self.proc is not None:
+            return True
+        if self._open():
+            return True
+        if not start:
+            return False
+        self.start_daemon()
+        deadline = time.monotonic() + self.start_timeout_s
+        while time.monotonic() < deadline:
+            time.sleep(0.5)
+            if self._open():
+                print(f"✅ Agent ready (pid {self.info.get('pid')})")
+                return True
+        raise AgentError(f"agent did not come up within {self.start_timeout_s:.0f}s, see {AGENT_LOG}")
+
+    def _send(self, message: dict) -> None:
+        try:
+            self.proc.stdin.write((json.dumps(message) + "\n").encode())
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise AgentError(f"lost the agent connection: {e}")
+
+    def _next(self):
+        line = self.proc.stdout.readline()
+        return json.loads(line) if line else None
+
+    def run(self, argv: list, on_log=print) -> int:
+        """Run benchmark.py with argv inside the agent, passing its output lines to on_log. Returns the exit status."""
+        self.connect()
+        self._runs += 1
+        job_id = f"run-{self._runs}"
+        self._send({"op": "run", "id": job_id, "argv": list(argv)})
+        while True:
+            event = self._next()
+            if event is None:
+                self.close()
+                raise AgentError(f"agent went away during {job_id}, see {AGENT_LOG}")
+            kind = event.get("event")
+            if kind == "log":
+                on_log(event["line"])
+            elif kind == "done" and event.get("id") == job_id:
+                return event["exit"]
+            elif kind == "error":
+                raise AgentError(event.get("error"))
+
+    def ping(self) -> dict:
+        self.connect()
+        self._send({"op": "ping"})
+        return self._next() or {}
+
+    def shutdown(self, stop_server: bool = False) -> bool:
+        """Stop the agent (and the vLLM server it left running). False if none was running."""
+        if not self.connect(start=False):
+            return False
+        self._send({"op": "shutdown", "stop_server": stop_server})
+        bye = self._next()
+        self.close()
+        return bool(bye and bye.get("event") == "bye")
+
+    def close(self) -> None:
+        """Detach; a daemon keeps running for the next client."""
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+
+def attribute_energy(t_trace, power_w, t_start, t_end) -> np.ndarray:
+    """Energy (J) of each request, from a power trace and request intervals on the same clock.
+
+    Power is linearly interpolated between samples and integrated with the trapezoid
+    rule. Whenever k requests are in flight, each one is charged 1/k of the energy of
+    that stretch; time with no request in flight is not charged to anyone.
+    """
+    t_trace = np.asarray(t_trace, dtype=float)
+    power_w = np.asarray(power_w, dtype=float)
+    t_start = np.asarray(t_start, dtype=float)
+    t_end = np.maximum(np.asarray(t_end, dtype=float), t_start)
+    if t_trace.size == 0 or t_start.size == 0:
+        return np.zeros(t_start.size)
+
+    # Cut the timeline at every sample and every request boundary
+    bounds = np.unique(np.concatenate([t_trace, t_start, t_end]))
+    p = np.interp(bounds, t_trace, power_w)
+    seg_energy = 0.5 * (p[1:] + p[:-1]) * np.diff(bounds)
+
+    # Requests in flight during each segment [bounds[i], bounds[i + 1])
+    left = bounds[:-1]
+    active = (np.searchsorted(np.sort(t_start), left, side="right")
+              - np.searchsorted(np.sort(t_end), left, side="right"))
+    share = np.where(active > 0, seg_energy / np.maximum(active, 1), 0.0)
+
+    # A request spans a contiguous run of segments, so its energy is a difference of prefix sums
+    cum = np.concatenate([[0.0], np.cumsum(share)])
+    i0 = np.searchsorted(bounds, t_start)
+    i1 = np.searchsorted(bounds, t_end)
+    return cum[i1] - cum[i0]
+
+
+def energy_histogram(energy_j, bins: int = 20) -> dict:
+    counts, edges = np.histogram(energy_j, bins=bins)
+    return {
+        "bin_edges_J": [round(float(e), 4) for e in edges],
+        "counts": counts.tolist(),
+    }
+
+
+def _energy_summary(energy, node_energy=None, bins: int = 20) -> dict:
+    summary = {}
+    if node_energy is not None:
+        summary["request_energy_node_mean_J"] = round(float(node_energy.mean()), 4)
+    p50, p99 = np.percentile(energy, [50, 99])
+    return {
+        **summary,
+        "attributed_energy_J": round(float(energy.sum()), 3),
+        "request_energy_mean_J": round(float(energy.mean()), 4),
+        "request_energy_p50_J": round(float(p50), 4),
+        "request_energy_p99_J": round(float(p99), 4),
+        "request_energy_max_J": round(float(energy.max()), 4),
+        "request_energy_histogram": energy_histogram(energy, bins=bins),
+    }
+
+
+def attribute_runs(results_files: list, trace_csv: str, bins: int = 20, host_columns=()) -> list:
+    """attribute_run for several results files sharing one power trace (co-located servers).
+
+    Requests of all files are attributed together, so energy of a stretch where requests
+    of two servers overlap is split between them. Returns one summary per file ({} if empty).
+    """
+    host_columns = list(host_columns)
+    trace = pd.read_csv(trace_csv, usecols=["t_local_s", "power_W", *host_columns])
+    frames = [pd.read_csv(path) for path in results_files]
+    if trace.empty or all(f.empty for f in frames):
+        return [{} for _ in results_files]
+
+    responses = pd.concat(frames, ignore_index=True)
+    energy = attribute_energy(trace["t_local_s"], trace["power_W"],
+                              responses["t_send_s"], responses["t_end_s"])
+    node_energy = None
+    if host_columns:
+        node_power = trace["power_W"] + trace[host_columns].sum(axis=1)
+        node_energy = attribute_energy(trace["t_local_s"], node_power,
+                                       responses["t_send_s"], responses["t_end_s"])
+
+    summaries = []
+    offset = 0
+    for path, frame in zip(results_files, frames):
+        part = slice(offset, offset + len(frame))
+        offset += len(frame)
+        if frame.empty:
+            summaries.append({})
+            continue
+        frame["energy_J"] = np.round(energy[part], 4)
+        if node_energy is not None:
+            frame["energy_node_J"] = np.round(node_energy[part], 4)
+        frame.to_csv(path, index=False)
+        summaries.append(_energy_summary(energy[part], None if node_energy is None else node_energy[part], bins))
+    return summaries
+
+
+def attribute_run(results_file: str, trace_csv: str, bins: int = 20, host_columns=()) -> dict:
+    """Add an energy_J column to query_responses.csv and summarise the per-request energy.
+
+    With `host_columns` (RAPL power columns of the trace) an energy_node_J column with
+    the whole-node (GPU + host) share of each request is added as well.
+    """
+    return attribute_runs([results_file], trace_csv, bins=bins, host_columns=host_columns)[0]
@@ -0,0 +1,191 @@
+"""Background, batched writer for per-request results and power traces.
+
+Callers hand records to BatchWriter.write(), which only puts them on a queue; a
+writer thread formats them and appends them in bulk once `flush_items` records are
+queued or `flush_s` seconds have passed. A path ending in .gz is written as a series of
+complete gzip members, one per flush. Each flush is a single write() of whole lines
+(or one whole member), so a run that is killed leaves a file whose every flushed
+batch is readable: gzip/pandas read it as-is, and open_text() also tolerates a
+truncated last member.
+"""
+import csv
+import io
+import os
+import queue
+import threading
+import time
+import zlib
+
+FORMATS = ("csv", "csv.gz")
+_STOP = object()
+
+
+def with_format(path: str, fmt: str = "csv") -> str:
+    """path (a .csv name) with the extension of a result format: x.csv -> x.csv.gz for csv.gz."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown result format {fmt!r}, expected one of {FORMATS}")
+    base = path[:-3] if path.endswith(".gz") else path
+    return f"{base}.gz" if fmt == "csv.gz" else base
+
+
+def find_file(path: str) -> str:
+    """path itself or its .gz variant, whichever exists (path if neither does)."""
+    for candidate in (path, f"{path}.gz"):
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+
+class _GzipPrefix(io.RawIOBase):
+    """Decompresses concatenated gzip members, ending quietly at a truncated last member.
+
+    Of a truncated member only the complete lines are returned, so a reader never sees
+    half a row.
+    """
+
+    def __init__(self, path: str, chunk_bytes: int = 1 << 20):
+        self._fh = open(path, "rb")
+        self._chunk_bytes = chunk_bytes
+        self._inflate = zlib.decompressobj(wbits=31)
+        self._out = b""
+        self._tail = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        while not self._out:
+            data = self._inflate.unused_data or self._fh.read(self._chunk_bytes)
+            if not data:
+                return 0
+            if self._inflate.eof:
+                self._inflate = zlib.decompressobj(wbits=31)
+            try:
+                out = self._tail + self._inflate.decompress(data)
+            except zlib.error:
+                return 0
+            if self._inflate.eof:
+                self._out, self._tail = out, b""
+            else:
+                # Hold a partial line back until its member turns out to be complete
+                cut = out.rfind(b"\n") + 1
+                self._out, self._tail = out[:cut], out[cut:]
+        n = min(len(buf), len(self._out))
+        buf[:n] = self._out[:n]
+        self._out = self._out[n:]
+        return n
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+def open_text(path: str):
+    """Open a result file (plain or .gz) for reading text; a killed run's file reads up to its last flush."""
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(io.BufferedReader(_GzipPrefix(path)), encoding="utf-8", newline="")
+    return open(path, newline="", encoding="utf-8")
+
+
+def render_records(records: list, columns: list) -> str:
+    out = io.StringIO()
+    csv.DictWriter(out, fieldnames=columns, restval="", extrasaction="ignore").writerows(records)
+    return out.getvalue()
+
+
+class BatchWriter:
+    """Queue-fed CSV writer that flushes on a size or time threshold from its own thread.
+
+    Records are dicts; the columns are `columns`, or the keys of the first record. With
+    `render` the records are opaque items and render(items) returns their CSV lines (the
+    header is then `columns`). fsync=True also syncs every batch to disk.
+    """
+
+    def __init__(self, path: str, columns=None, render=None, flush_items: int = 1000, flush_s: float = 1.0,
+                 fsync: bool = False):
+        self.path = path
+        self.columns = list(columns) if columns else None
+        self.render = render
+        self.flush_items = flush_items
+        self.flush_s = flush_s
+        self.fsync = fsync
+        self.compress = path.endswith(".gz")
+        self.items = 0
+        self.batches = 0
+        self.error = None
+        self._header_written = False
+        self._queue = queue.SimpleQueue()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self._thr = threading.Thread(target=self._loop, name=f"writer:{os.path.basename(path)}", daemon=True)
+        self._thr.start()
+
+    def write(self, item) -> None:
+        """Queue one record; never blocks on I/O."""
+        self._queue.put(item)
+
+    def close(self) -> None:
+        """Write everything still queued and close the file. Raises if the writer thread failed."""
+        if self._thr is None:
+            return
+        self._queue.put(_STOP)
+        self._thr.join()
+        self._thr = None
+        os.close(self._fd)
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _loop(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_s
+        done = False
+        while not done:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    done = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if batch and (done or len(batch) >= self.flush_items or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_s
+        if not self._header_written and self.columns:
+            self._flush([])
+
+    def _flush(self, batch: list) -> None:
+        if self.error:
+            return
+        try:
+            text = ""
+            if not self._header_written:
+                if self.columns is None:
+                    self.columns = list(batch[0]) if batch else []
+                text = ",".join(self.columns) + "\n" if self.columns else ""
+                self._header_written = True
+            text += self.render(batch) if self.render else render_records(batch, self.columns)
+            data = text.encode("utf-8")
+            if self.compress:
+                gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+                data = gz.compress(data) + gz.flush()
+            # One write per batch: a kill between batches never leaves half a line or member
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+            if self.fsync:
+                os.fsync(self._fd)
+            self.items += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.error = e
+            print(f"❌ Writing {self.path} failed: {e}")
@@ -1,20 +1,32 @@
+import argparse
+import itertools
+import signal
 import subprocess
 import sys
 import time
 import os
 import uuid
 import requests
-import pandas as pd
+import numpy as np
 import json
+from contextlib import contextmanager
 
 from energy import EnergyMonitor
-from utils import append_csv, now_tag, get_workload_size
+from attribution import attribute_run
+from live_metrics import LiveMetrics, start_metrics_server
+from batch_writer import BatchWriter, FORMATS, with_format
+from utils import now_tag
+from loadgen import (get_session, run_closed_loop, run_open_loop, poisson_arrival_stream, replay_offsets,
+                     Reservoir, latency_summary, throughput)
+from workloads import WorkloadSource, is_synthetic
 import vllm_manager
 
+OPEN_LOOP_MAX_IN_FLIGHT = 256
+
 
 def cleanup_processes():
     print("🧹 Cleaning up vLLM processes...")
-    subprocess.run('pkill -f "vllm serve" || true', shell=True)
+    stop_server()
     subprocess.run('pkill -f "nvidia-smi" || true', shell=True)
     print("✅ Process cleanup complete.")
 
@@ -28,13 +40,143 @@ def cleanup_everything():
     print("✅ Complete cleanup done.")
 
 
-def benchmark_setup(llm):
-    """Setup the benchmark environment on the server."""
+SERVER_STATE = os.path.expanduser("~/.quanti_server.json")
+SERVER_LOG = os.path.expanduser("~/.quanti_vllm.log")
+
+
+def _load_server_state():
+    try:
+        with open(SERVER_STATE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+
+
+def _server_healthy(port: int = 8000) -> bool:
+    try:
+        return requests.get(f"http://localhost:{port}/health", timeout=2).ok
+    except requests.exceptions.RequestException:
+        return False
+
+
+def warm_server_available(llm: str, vllm_args: str) -> bool:
+    """True if the server(s) of an earlier run are still up with exactly this model and serve arguments."""
+    state = _load_server_state()
+    return (state is not None
+            and state.get("llm") == llm
+            and state.get("args") == vllm_args
+            and all(_pid_alive(s.get("pid")) and _server_healthy(s.get("port", 8000))
+                    for s in state.get("instances", [state])))
+
+
+def stop_server():
+    """Stop the vLLM server and forget the warm-server state."""
+    subprocess.run('pkill -f "vllm serve" || true', shell=True)
+    if os.path.exists(SERVER_STATE):
+        os.remove(SERVER_STATE)
+
+
+# vLLM log lines that open/close the startup phases we can't see from outside the process
+VLLM_LOG_MARKS = (
+    ("weights_start", "starting to load model"),
+    ("weights_end", "model loading took"),
+    ("cuda_graphs_start", "capturing cudagraph"),
+    ("cuda_graphs_start", "capturing cuda graph"),
+    ("cuda_graphs_end", "graph capturing finished"),
+)
+STARTUP_TIMEOUT_S = 600
+READY_POLL_MIN_S = 0.25
+READY_POLL_MAX_S = 5.0
+
+
+def _no_mark(name):
+    pass
+
+
+def wait_until_ready(proc, port: int, timeout_s: float, mark=_no_mark, log_path: str = SERVER_LOG) -> bool:
+    """Poll until the server answers /health, its process dies, or timeout_s passes.
+
+    Polls quickly while the server log is moving and backs off while it is quiet. Log
+    lines announcing weight loading and CUDA graph capture are turned into marks, so
+    those phases are timed to the resolution of the poll.
+    """
+    deadline = time.monotonic() + timeout_s
+    delay = READY_POLL_MIN_S
+    seen = set()
+    with open(log_path, errors="replace") as log:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                print(f"❌ vLLM process died with return code: {proc.returncode} (log: {log_path})")
+                return False
+
+            new = log.read().lower()
+            if new and "spawn" not in seen:
+                seen.add("spawn")
+                mark("spawn_end")
+            for name, needle in VLLM_LOG_MARKS:
+                if name not in seen and needle in new:
+                    seen.add(name)
+                    mark(name)
+
+            if _server_healthy(port):
+                return True
+            delay = READY_POLL_MIN_S if new else min(delay * 1.5, READY_POLL_MAX_S)
+            time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+    return False
+
+
+def effective_serve_config(llm: str, serve_params: dict = None) -> dict:
+    """Serve parameters a run uses: explicit ones, else the alias' saved recommendation or defaults."""
+    config = vllm_manager.serve_config(llm)
+    config.update({k: v for k, v in (serve_params or {}).items() if v is not None})
+    return config
+
+
+def benchmark_setup(llm, warm: bool = False, mark=_no_mark, startup_timeout_s: float = STARTUP_TIMEOUT_S,
+                    serve_params: dict = None):
+    """Setup the benchmark environment on the server.
+
+    Returns "warm" when warm=True and the server of a previous run can be reused as-is,
+    "cold" after a fresh install and launch, or False on failure. Every phase is
+    bracketed by mark("<phase>_start") / mark("<phase>_end") calls.
+    """
     print("🔧 Setting up benchmark environment...")
+    vllm_args = vllm_manager.cmd_serve_model(llm, port=8000, **effective_serve_config(llm, serve_params))
+
+    if warm and warm_server_available(llm, vllm_args):
+        print(f"  ♨️ Reusing warm vLLM server for model {llm}")
+        return "warm"
 
+    if not prepare_launch(mark):
+        return False
+
+    # ------ Launch vLLM server ------
+    print(f"  🚀 Launching vLLM server for model {llm}...")
+    proc = launch_server(vllm_args, 8000, startup_timeout_s, mark)
+    if proc is None:
+        return False
+
+    print("  ✅ vLLM server is born! Time to party.")
+    with open(SERVER_STATE, "w") as f:
+        json.dump({"llm": llm, "args": vllm_args, "pid": proc.pid, "port": 8000}, f)
+    return "cold"
+
+
+def prepare_launch(mark=_no_mark) -> bool:
+    """Install the requirements and stop every running vLLM server before a launch."""
     # ----- Install requirements -----
     print("  📦 Installing requirements...")
+    mark("install_start")
     result = subprocess.run("pip install -r requirements.txt", shell=True, capture_output=True, text=True)
+    mark("install_end")
     if result.returncode != 0:
         print(f"❌ Failed to install requirements: {result.stderr}")
         return False
@@ -42,73 +184,151 @@ def benchmark_setup(llm):
 
     # ------ Clean up any existing vLLM processes ------
     print("  🔄 Stopping existing vLLM processes...")
-    subprocess.run('pkill -f "vllm serve" || true', shell=True)
+    mark("stop_previous_start")
+    stop_server()
     time.sleep(5)
+    mark("stop_previous_end")
     print("  ✅ Cleaned up existing processes")
+    return True
 
-    # ------ Launch vLLM server ------
-    print(f"  🚀 Launching vLLM server for model {llm}...")
-    vllm_args = vllm_manager.cmd_serve_model(llm, port=8000)
+
+def kill_session(proc, grace_s: float = 10.0):
+    """Stop a process started with start_new_session, with everything it spawned, and reap it."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:  # the whole group is gone already
+            break
+        try:
+            proc.wait(timeout=grace_s)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+    proc.wait()
+
+
+def launch_server(vllm_args: str, port: int, startup_timeout_s: float, mark=_no_mark, log_path: str = SERVER_LOG):
+    """Start `vllm serve vllm_args` and wait until it answers on port. Returns the process, or None."""
     full_cmd = f"vllm serve {vllm_args}"
 
+    # Own session + log file, so a warm server outlives this process and never blocks on a full pipe
+    mark("launch_start")
+    mark("spawn_start")
+    log = open(log_path, "w")
     proc = subprocess.Popen(
         full_cmd,
         shell=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
-        universal_newlines=True
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
     )
+    log.close()
 
-    print("  ⏳ Waiting for vLLM server to start...")
-    deadline = time.time() + 30  # max 30s to start
+    print(f"  ⏳ Waiting up to {startup_timeout_s:.0f}s for vLLM server to start...")
+    if not wait_until_ready(proc, port, startup_timeout_s, mark, log_path):
+        if proc.poll() is None:
+            print(f"❌ vLLM server failed to start within {startup_timeout_s:.0f}s (log: {log_path})")
+        kill_session(proc)
+        return None
+    mark("launch_end")
+    return proc
 
-    while time.time() < deadline:
-        if proc.poll() is not None:
-            print(f"❌ vLLM process died with return code: {proc.returncode}")
-            return False
 
-        try:
-            response = requests.get("http://localhost:8000/health", timeout=2)
-            if response.ok:
-                print("  ✅ vLLM server is born! Time to party.")
-                return True
-        except requests.exceptions.RequestException:
-            pass
-        time.sleep(3)
-
-    print("❌ vLLM server failed to start in time.")
-    return False
+def _usage_stats(usage) -> dict:
+    usage = usage or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+    }
 
 
-def query_llm(prompt: str, llm: str) -> str:
-    """Query the local vLLM server."""
+def query_llm(prompt: str, llm: str, session=None, max_tokens: int = 128, port: int = 8000):
+    """Query the local vLLM server. Returns (reply, token usage)."""
     payload = {
         "model": vllm_manager.models[llm],
         "prompt": prompt,
-        "max_tokens": 128,
+        "max_tokens": max_tokens,
         "temperature": 0.7
     }
 
     try:
-        response = requests.post("http://localhost:8000/v1/completions", json=payload, timeout=30)
+        http = session or requests
+        response = http.post(f"http://localhost:{port}/v1/completions", json=payload, timeout=30)
         response.raise_for_status()
-        return response.json()["choices"][0]["text"].strip()
+        body = response.json()
+        return body["choices"][0]["text"].strip(), _usage_stats(body.get("usage"))
     except Exception as e:
-        return f"❌ Error querying LLM: {e}"
+        return f"❌ Error querying LLM: {e}", _usage_stats(None)
+
 
+def query_llm_stream(prompt: str, llm: str, session=None, max_tokens: int = 128, port: int = 8000):
+    """Query the local vLLM server over SSE and time the token stream.
 
-def run_workload(llm: str, workload_file: str, monitor: EnergyMonitor, run_dir: str = None):
-    """ Execute the LLM workload and log results."""
+    Returns (reply, stats) where stats holds the token usage, time-to-first-token,
+    total decode time and the gaps between streamed chunks, all in seconds.
+    """
+    payload = {
+        "model": vllm_manager.models[llm],
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": 0.7,
+        "stream": True,
+        "stream_options": {"include_usage": True}
+    }
+
+    usage = None
+    pieces = []
+    token_times = []
+    try:
+        http = session or requests
+        t_start = time.monotonic()
+        with http.post(f"http://localhost:{port}/v1/completions", json=payload, timeout=30,
+                       stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                text = choices[0].get("text", "") if choices else ""
+                if text:
+                    token_times.append(time.monotonic())
+                    pieces.append(text)
+        reply = "".join(pieces).strip()
+    except Exception as e:
+        reply = f"❌ Error querying LLM: {e}"
+
+    gaps = np.diff(token_times) if len(token_times) > 1 else np.array([])
+    stats = {
+        **_usage_stats(usage),
+        "ttft_s": round(token_times[0] - t_start, 6) if token_times else None,
+        "decode_s": round(token_times[-1] - token_times[0], 6) if token_times else None,
+        "n_chunks": len(token_times),
+        "itl_mean_s": round(float(gaps.mean()), 6) if gaps.size else None,
+        "itl_s": ";".join(f"{g:.6f}" for g in gaps),
+    }
+    return reply, stats
+
+
+def run_workload(llm: str, workload_file: str, monitor: EnergyMonitor, run_dir: str = None, concurrency: int = 1,
+                 arrival: str = "closed", qps: float = None, replay_column: str = None, seed: int = None,
+                 stream: bool = False, results_format: str = "csv", port: int = 8000):
+    """ Execute the LLM workload and log results.
+
+    arrival="closed" keeps `concurrency` requests in flight; "poisson" and "replay" are
+    open-loop modes that send at a target `qps` or at the times in `replay_column`.
+    stream=True reads replies as SSE and adds per-token timings to each row.
+    Rows are written in batches by a background BatchWriter, as CSV or gzipped CSV.
+    """
     print(f"📝 Running workload file {workload_file} with model {llm}...")
 
-    # Load workload
+    # Stream the workload: prompts are read (or generated) chunk by chunk as they are sent
     try:
-        df = pd.read_csv(workload_file)
-        if 'text' not in df.columns:
-            print("❌ Workload CSV must contain a 'text' column.")
-            return False
+        source = WorkloadSource(workload_file, extra_columns=[replay_column] if arrival == "replay" else ())
     except Exception as e:
         print(f"❌ Failed to read workload file: {e}")
         return False
@@ -116,34 +336,214 @@ def run_workload(llm: str, workload_file: str, monitor: EnergyMonitor, run_dir:
     # Choose output location based on run_dir
     if run_dir:
         os.makedirs(os.path.join(run_dir, "detailed"), exist_ok=True)
-        results_file = os.path.join(run_dir, "detailed", "query_responses.csv")
+        results_file = with_format(os.path.join(run_dir, "detailed", "query_responses.csv"), results_format)
     else:
         os.makedirs("results", exist_ok=True)
-        results_file = f"results/results_{llm}_{now_tag()}.csv"
+        results_file = with_format(f"results/results_{llm}_{now_tag()}.csv", results_format)
+    writer = BatchWriter(results_file)
+
+    # Reservoirs keep latency statistics exact for normal runs and bounded for huge ones
+    latencies = Reservoir()
+    queue_delays = Reservoir()
+    ttfts = Reservoir()
+    itls = Reservoir()
+    tokens = {"prompt_tokens": 0, "completion_tokens": 0}
+    total = f"/{source.size}" if source.size else ""
+    last_arrival = [0.0]
+
+    def on_result(i, request, result, timing):
+        reply, stats = result
+        writer.write({"idx": i, "prompt": request["text"], "reply": reply, **timing, **stats})
+        latencies.add(timing["latency_s"])
+        queue_delays.add(timing["queue_delay_s"])
+        for key in tokens:
+            tokens[key] += stats.get(key) or 0
+        if stats.get("ttft_s") is not None:
+            ttfts.add(stats["ttft_s"])
+        if stats.get("itl_s"):
+            itls.extend(float(g) for g in stats["itl_s"].split(";"))
+        if i % 10 == 0:
+            print(f"  [{i}{total}] processed")
 
-    print(f"🏃 Processing {len(df)} prompts...")
+    live = getattr(monitor, "live", None)
 
+    def on_complete(i, request, result, timing):
+        # Called as each reply lands, not in workload order, so the live windows never stall
+        live.record_request(timing["t_end_s"], timing["latency_s"], result[1].get("completion_tokens"))
+
+    def send(request):
+        query = query_llm_stream if stream else query_llm
+        return query(request["text"], llm, session=get_session(), max_tokens=request["max_tokens"], port=port)
+
+    # Request timings share the monitor's clock so they line up with energy_trace.csv
+    origin = getattr(monitor, "t0", None)
+    offered_qps = None
     start_time = time.time()
-    for i, prompt in enumerate(df['text'], 1):
-        reply = query_llm(prompt, llm)
-        append_csv(results_file, i, prompt, reply)
-        if i % 10 == 0:
-            print(f"  [{i}/{len(df)}] processed")
+    try:
+        if arrival == "closed":
+            print(f"🏃 Processing {source.size or 'all'} prompts with {concurrency} in flight...")
+            n_prompts = run_closed_loop(enumerate(source, 1), send, concurrency=concurrency, on_result=on_result,
+                                        origin=origin, on_complete=on_complete if live else None)
+        else:
+            requests_iter = iter(source)
+            if arrival == "poisson":
+                offsets = poisson_arrival_stream(qps, seed=seed)
+                print(f"🏃 Processing {source.size or 'all'} prompts open-loop (poisson, offered {qps:.2f} req/s)...")
+            else:
+                # tee only buffers the one request between reading its timestamp and sending it
+                requests_iter, stamps = itertools.tee(requests_iter)
+                offsets = replay_offsets(req[replay_column] for req in stamps)
+                print(f"🏃 Processing {source.size or 'all'} prompts open-loop (replay of '{replay_column}')...")
+
+            def arrivals():
+                for i, (request, t) in enumerate(zip(requests_iter, offsets), 1):
+                    last_arrival[0] = t
+                    yield i, request, t
+
+            n_prompts = run_open_loop(arrivals(), send, max_in_flight=max(concurrency, OPEN_LOOP_MAX_IN_FLIGHT),
+                                      on_result=on_result, origin=origin, on_complete=on_complete if live else None)
+            offered_qps = qps if arrival == "poisson" else throughput(n_prompts, last_arrival[0])
+    finally:
+        # Rows still queued are written here, after the timed window
+        writer.close()
 
     end_time = time.time()
     duration = end_time - start_time
     print(f"✅ Workload completed in {duration:.2f}s")
     print(f"📁 Results saved to: {results_file}")
 
-    return {
+    results = {
         "results_file": results_file,
         "workload_duration_s": round(duration, 2),
-        "n_prompts": len(df),
-        "workload_size": get_workload_size(workload_file)
+        "n_prompts": n_prompts,
+        "workload_size": str(n_prompts if source.size is None else source.size),
+        "arrival": arrival,
+        "concurrency": concurrency,
+        "requests_per_s": round(throughput(n_prompts, duration), 3),
+        **tokens,
+        "prefill_tok_per_s": round(throughput(tokens["prompt_tokens"], duration), 2),
+        "decode_tok_per_s": round(throughput(tokens["completion_tokens"], duration), 2),
+        **latency_summary(latencies),
+        **latency_summary(queue_delays, prefix="queue_delay"),
+        "stream": stream,
+        **latency_summary(ttfts, prefix="ttft"),
+        **latency_summary(itls, prefix="itl"),
     }
+    if offered_qps is not None:
+        results["offered_qps"] = round(offered_qps, 3)
+        results["achieved_qps"] = results["requests_per_s"]
+    return results
+
+
+def startup_phases(monitor: EnergyMonitor) -> dict:
+    """Cold-start cost for the summary: total plus a per-phase (seconds, Wh) breakdown."""
+    phases = monitor.phase_breakdown()
+    total = phases.pop("startup", {"s": 0.0, "Wh": 0.0})
+    return {"startup_s": total["s"], "startup_energy_Wh": total["Wh"], "startup_phases": phases}
+
+
+def token_energy(energy_wh: float, results: dict, suffix: str = "") -> dict:
+    """Normalise run energy by the tokens the server actually processed."""
+    energy_j = energy_wh * 3600.0
+    per_token = {}
+    for key, label in (("completion_tokens", "output"), ("prompt_tokens", "input")):
+        n = results.get(key) or 0
+        per_token[f"J_per_{label}_token{suffix}"] = round(energy_j / n, 4) if n else None
+    return per_token
+
+
+@contextmanager
+def metered_run(run_name: str, run_dir: str, setup, warm: bool = False, sampler: str = "auto",
+                sample_interval_ms: float = 100, rapl_root: str = None, metrics_port: int = 0,
+                idle_baseline_s: float = 0.0, results_format: str = "csv"):
+    """Run scaffolding shared by benchmark_main and colocate_main.
+
+    setup(mark) starts the server(s) under a startup monitor of its own, so the workload trace
+    keeps its meaning. Yields (server_start, startup phases, workload monitor), the monitor already
+    sampling, or None as monitor when setup failed. On exit the run releases everything it took,
+    however it ends, since an agent runs many jobs in one process; only --warm leaves the server(s)
+    behind for the next run.
+    """
+    startup_monitor = monitor = metrics_server = None
+    try:
+        print("1️⃣ Setting up environment...")
+        startup_monitor = EnergyMonitor(interval_ms=sample_interval_ms, run_name=f"{run_name}_startup",
+                                        output_dir=run_dir, sampler=sampler, rapl_root=rapl_root,
+                                        trace_name="startup_trace.csv", trace_format=results_format)
+        startup_monitor.start()
+        startup_monitor.mark("startup_start")
+        server_start = setup(startup_monitor.mark)
+        startup_monitor.mark("startup_end")
+        startup_monitor.stop()
+        startup = startup_phases(startup_monitor)
+        if not server_start:
+            print("❌ Setup failed")
+            if run_dir:
+                with open(os.path.join(run_dir, "startup.json"), "w") as f:
+                    json.dump(startup, f, indent=2)
+            yield server_start, startup, None
+            return
+
+        monitor = EnergyMonitor(interval_ms=sample_interval_ms, run_name=run_name, output_dir=run_dir, sampler=sampler,
+                                rapl_root=rapl_root, trace_format=results_format)
+        if metrics_port:
+            monitor.live = LiveMetrics(clock=monitor.clock)
+            metrics_server = start_metrics_server(monitor.live, metrics_port)
+
+        print("2️⃣ Starting energy monitoring...")
+        monitor.start()
+        if idle_baseline_s > 0:
+            monitor.measure_idle(idle_baseline_s)
+        yield server_start, startup, monitor
+    finally:
+        for m in (startup_monitor, monitor):
+            if m is not None:
+                m.halt()
+        if metrics_server:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        if not warm:
+            stop_server()
+
+
+def print_summary(title: str, summary: dict, lines: list, files: list):
+    """End-of-run banner: the run's own lines, then the energy figures and output files every run reports."""
+    print("\n" + "=" * 60)
+    print(f"🎉 {title} COMPLETED SUCCESSFULLY!")
+    print("=" * 60)
+    for line in lines:
+        print(line)
+    print(f"♨️  Server start: {summary['server_start']}")
+    print(f"⏱️  Startup: {summary['startup_s']:.1f}s, {summary['startup_energy_Wh']:.4f}Wh")
+    print(f"⏱️  Duration: {summary['workload_duration_s']:.2f}s")
+    print(f"⚡ Avg Power: {summary['avg_power_W']:.2f}W")
+    print(f"🔋 Total Energy: {summary['energy_Wh']:.4f}Wh")
+    if "energy_node_gross_Wh" in summary:
+        print(f"🖧  Node Energy (GPU + CPU/DRAM): {summary['energy_node_gross_Wh']:.4f}Wh "
+              f"(host {summary['energy_host_gross_Wh']:.4f}Wh)")
+    if "energy_net_Wh" in summary:
+        print(f"😴 Idle Baseline: {summary['idle_power_W']:.2f}W "
+              f"({summary['energy_idle_Wh']:.4f}Wh, net {summary['energy_net_Wh']:.4f}Wh)")
+    print(f"🔤 Tokens in/out: {summary['prompt_tokens']} / {summary['completion_tokens']} "
+          f"({summary['decode_tok_per_s']:.1f} out tok/s)")
+    if summary["J_per_output_token"] is not None:
+        print(f"🪙 Energy per output token: {summary['J_per_output_token']:.4f}J")
+    print(f"🖥️  Avg GPU Util: {summary['avg_util_pct']:.1f}%")
+    print(f"💾 Avg GPU Mem: {summary['avg_mem_MiB']:.0f}MiB")
+    print("=" * 60)
+    print("📋 Output Files:")
+    for label, path in files:
+        print(f"  {label}: {path}")
+    print("=" * 60)
 
 
-def benchmark_main(llm: str, workload: str, output_dir: str = None):
+def benchmark_main(llm: str, workload: str, output_dir: str = None, concurrency: int = 1,
+                   arrival: str = "closed", qps: float = None, replay_column: str = None, seed: int = None,
+                   stream: bool = False, idle_baseline_s: float = 0.0, sampler: str = "auto",
+                   sample_interval_ms: float = 100, rapl_root: str = None, metrics_port: int = 0,
+                   warm: bool = False, run_number: int = None,
+                   startup_timeout_s: float = STARTUP_TIMEOUT_S, serve_params: dict = None,
+                   results_format: str = "csv"):
     """Main benchmark function - runs entirely on server with energy monitoring."""
     print(f"🎯 Starting benchmark: {llm} on {workload}")
 
@@ -152,7 +552,7 @@ def benchmark_main(llm: str, workload: str, output_dir: str = None):
         print(f"Supported models: {list(vllm_manager.models.keys())}")
         return False
 
-    if not os.path.exists(workload):
+    if not is_synthetic(workload) and not os.path.exists(workload):
         print(f"❌ Workload file does not exist: {workload}")
         return False
 
@@ -163,85 +563,165 @@ def benchmark_main(llm: str, workload: str, output_dir: str = None):
         run_dir = output_dir
         print(f"📁 Using output directory as-is: {run_dir}")
 
-    # Setup environment
-    print("1️⃣ Setting up environment...")
-    if not benchmark_setup(llm):
-        print("❌ Setup failed")
-        return False
-
-    # Initialize energy monitoring with unique run name
     run_name = f"{llm}_{now_tag()}_{uuid.uuid4().hex[:6]}"
-    if run_dir:
-        monitor = EnergyMonitor(interval_ms=100, run_name=run_name, output_dir=run_dir)
-    else:
-        monitor = EnergyMonitor(interval_ms=100, run_name=run_name)
-
-    print("2️⃣ Starting energy monitoring...")
-    monitor.start()
-
-    print("3️⃣ Running workload...")
-    results = run_workload(llm, workload, monitor, run_dir)
+    serve = effective_serve_config(llm, serve_params)
 
-    if results is None:
-        print("❌ Workload execution failed")
-        monitor.stop()
-        return False
-
-    print("4️⃣ Stopping energy monitoring...")
-    energy_summary = monitor.stop(
-        meta={
-            "llm": llm,
-            "workload": workload,
-            **results
-        }
-    )
+    def setup(mark):
+        return benchmark_setup(llm, warm=warm, mark=mark, startup_timeout_s=startup_timeout_s, serve_params=serve)
 
-    # Save a simple summary file alongside other outputs if run_dir is set
-    if run_dir:
-        report = os.path.join(run_dir, "summary.json")
-    else:
-        report = f"benchmark_report_{run_name}.json"
-
-    with open(report, "w") as f:
-        json.dump(energy_summary, f, indent=2)
+    with metered_run(run_name, run_dir, setup, warm=warm, sampler=sampler, sample_interval_ms=sample_interval_ms,
+                     rapl_root=rapl_root, metrics_port=metrics_port, idle_baseline_s=idle_baseline_s,
+                     results_format=results_format) as (server_start, startup, monitor):
+        if monitor is None:
+            return False
 
-    print("\n" + "=" * 60)
-    print("🎉 BENCHMARK COMPLETED SUCCESSFULLY!")
-    print("=" * 60)
-    print(f"📊 Model: {llm}")
-    print(f"📁 Workload: {workload}")
-    print(f"⏱️  Duration: {results['workload_duration_s']:.2f}s")
-    print(f"⚡ Avg Power: {energy_summary['avg_power_W']:.2f}W")
-    print(f"🔋 Total Energy: {energy_summary['energy_Wh']:.4f}Wh")
-    print(f"🖥️  Avg GPU Util: {energy_summary['avg_util_pct']:.1f}%")
-    print(f"💾 Avg GPU Mem: {energy_summary['avg_mem_MiB']:.0f}MiB")
-    print("=" * 60)
-    print("📋 Output Files:")
-    print(f"  📊 Benchmark Report: {report}")
-    print(f"  📈 Query Results: {results['results_file']}")
-    print(f"  ⚡ Energy Trace: {energy_summary['trace_csv']}")
-    print("=" * 60)
+        print("3️⃣ Running workload...")
+        monitor.mark("workload_start")
+        results = run_workload(llm, workload, monitor, run_dir, concurrency=concurrency,
+                               arrival=arrival, qps=qps, replay_column=replay_column, seed=seed, stream=stream,
+                               results_format=results_format)
+        monitor.mark("workload_end")
 
-    return True
+        if not results:
+            print("❌ Workload execution failed")
+            return False
 
+        print("4️⃣ Stopping energy monitoring...")
+        energy_summary = monitor.stop(
+            meta={
+                "llm": llm,
+                "workload": workload,
+                "server_start": server_start,
+                "run_number": run_number,
+                **serve,
+                **startup,
+                **results
+            }
+        )
+        energy_summary.update(token_energy(energy_summary["energy_Wh"], results))
+        if "energy_net_Wh" in energy_summary:
+            energy_summary.update(token_energy(energy_summary["energy_net_Wh"], results, suffix="_net"))
 
-if __name__ == "__main__":
+        try:
+            host_columns = [f"rapl_{name}_W" for name in monitor.rapl.host_domains] if monitor.rapl else []
+            energy_summary.update(attribute_run(results["results_file"], energy_summary["trace_csv"],
+                                                host_columns=host_columns))
+        except Exception as e:
+            print(f"⚠️ Per-request energy attribution failed: {e}")
+
+        # Save a simple summary file alongside other outputs if run_dir is set
+        if run_dir:
+            report = os.path.join(run_dir, "summary.json")
+        else:
+            report = f"benchmark_report_{run_name}.json"
+
+        with open(report, "w") as f:
+            json.dump(energy_summary, f, indent=2)
+
+        lines = [f"📊 Model: {llm}", f"📁 Workload: {workload}"]
+        if arrival == "closed":
+            lines.append(f"🔀 Concurrency: {concurrency}")
+        else:
+            lines.append(f"🔀 Arrivals: {arrival} (offered {results['offered_qps']} req/s, "
+                         f"achieved {results['achieved_qps']} req/s)")
+        if "latency_p50_s" in results:
+            lines.append(f"⏳ Latency p50/p99: {results['latency_p50_s']:.3f}s / {results['latency_p99_s']:.3f}s")
+        if "ttft_p50_s" in results:
+            lines.append(f"🥇 TTFT p50/p99: {results['ttft_p50_s']:.3f}s / {results['ttft_p99_s']:.3f}s")
+        print_summary("BENCHMARK", energy_summary, lines,
+                      [("📊 Benchmark Report", report), ("📈 Query Results", results["results_file"]),
+                       ("⚡ Energy Trace", energy_summary["trace_csv"])])
+        return True
+
+
+def parse_benchmark_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py",
+        description=f"Run a workload against a local vLLM server. Available models: {list(vllm_manager.models.keys())}"
+    )
+    parser.add_argument("llm", help="Model alias, or several comma-separated ones to co-locate on one GPU")
+    parser.add_argument("workload")
+    parser.add_argument("output_dir", nargs="?", default=None)
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Requests kept in flight by the load generator (default: 1)")
+    parser.add_argument("--arrival", choices=["closed", "poisson", "replay"], default="closed",
+                        help="closed-loop replay, or open-loop Poisson / trace-replay arrivals (default: closed)")
+    parser.add_argument("--qps", type=float, default=None,
+                        help="Target request rate for --arrival poisson")
+    parser.add_argument("--replay-column", default=None,
+                        help="Workload column with arrival timestamps for --arrival replay")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the Poisson arrival process")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream completions and record TTFT and inter-token latency")
+    parser.add_argument("--idle-baseline-s", type=float, default=0.0,
+                        help="Sample the idle GPU for this many seconds before the workload (default: off)")
+    parser.add_argument("--sampler", default="auto",
+                        help="Power sampler: auto, nvml, nvidia-smi or replay:<trace.csv> (default: auto)")
+    parser.add_argument("--sample-interval-ms", type=float, default=100,
+                        help="Power sampling interval (default: 100)")
+    parser.add_argument("--rapl", nargs="?", const="/sys/class/powercap", default=None, metavar="ROOT",
+                        help="Also sample CPU/DRAM power from RAPL (powercap root, default: /sys/class/powercap)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve live metrics on localhost:PORT/metrics while the run is going (default: off)")
+    parser.add_argument("--warm", action="store_true",
+                        help="Reuse a running vLLM server with the same model and serve arguments")
+    parser.add_argument("--startup-timeout-s", type=float, default=STARTUP_TIMEOUT_S,
+                        help=f"Give up if vLLM is not ready after this many seconds (default: {STARTUP_TIMEOUT_S})")
+    parser.add_argument("--max-num-seqs", type=int, default=None,
+                        help="vLLM --max-num-seqs (default: the model's saved recommendation, else 32)")
+    parser.add_argument("--max-model-len", type=int, default=None,
+                        help="vLLM --max-model-len (default: the model's saved recommendation, else 2048)")
+    parser.add_argument("--gpu-memory-utilization", type=float, default=None,
+                        help="vLLM --gpu-memory-utilization (default: the model's saved recommendation, else 0.85)")
+    parser.add_argument("--run-number", type=int, default=None,
+                        help="Number of this run in its model/workload cell, reserved by the client's run catalog")
+    parser.add_argument("--results-format", choices=FORMATS, default="csv",
+                        help="Format of query_responses and the energy traces; csv.gz writes gzip members (default: csv)")
+    parser.add_argument("--ports", type=lambda s: [int(p) for p in s.split(",") if p], default=None,
+                        help="Co-location: comma-separated port of every instance (default: 8000, 8001, ...)")
+    parser.add_argument("--memory-fractions", type=lambda s: [float(f) for f in s.split(",") if f], default=None,
+                        help="Co-location: comma-separated --gpu-memory-utilization of every instance "
+                             "(default: --gpu-memory-utilization or 0.85, split evenly)")
+    args = parser.parse_args(argv)
+    if (args.ports or args.memory_fractions) and "," not in args.llm:
+        parser.error("--ports and --memory-fractions need a comma-separated list of models")
+    if args.arrival == "poisson" and not args.qps:
+        parser.error("--arrival poisson requires --qps")
+    if args.arrival == "replay" and not args.replay_column:
+        parser.error("--arrival replay requires --replay-column")
+    return args
+
+
+def main(argv=None) -> int:
+    """benchmark.py's command line; also the entry point of agent.py jobs. Returns the exit status."""
     try:
-        if len(sys.argv) < 3:
-            print("Usage: python benchmark.py <llm_model> <workload_file> [output_dir]")
-            print(f"Available models: {list(vllm_manager.models.keys())}")
-            sys.exit(1)
-
-        llm_model = sys.argv[1]
-        workload_file = sys.argv[2]
-        output_dir = sys.argv[3] if len(sys.argv) > 3 else None
-
-        success = benchmark_main(llm_model, workload_file, output_dir)
-        sys.exit(0 if success else 1)
+        args = parse_benchmark_args(argv)
+
+        options = dict(concurrency=args.concurrency, arrival=args.arrival, qps=args.qps,
+                       replay_column=args.replay_column, seed=args.seed, stream=args.stream,
+                       idle_baseline_s=args.idle_baseline_s, sampler=args.sampler,
+                       sample_interval_ms=args.sample_interval_ms, rapl_root=args.rapl,
+                       metrics_port=args.metrics_port, warm=args.warm, run_number=args.run_number,
+                       startup_timeout_s=args.startup_timeout_s,
+                       serve_params={"max_num_seqs": args.max_num_seqs, "max_len": args.max_model_len,
+                                     "gpu_memory_utilization": args.gpu_memory_utilization},
+                       results_format=args.results_format)
+        if "," in args.llm:
+            from colocate import colocate_main
+            success = colocate_main(args.llm.split(","), args.workload, args.output_dir, ports=args.ports,
+                                    memory_fractions=args.memory_fractions, **options)
+        else:
+            success = benchmark_main(args.llm, args.workload, args.output_dir, **options)
+        return 0 if success else 1
 
     except KeyboardInterrupt:
         print("\n⚠️ Benchmark interrupted by user")
-        sys.exit(1)
+        return 1
     except Exception as e:
         print(f"\n❌ Benchmark failed with error: {e}")
-        sys.exit(1)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""SQLite catalog of benchmark runs.
+
+Usage: python3 -m Quanti.catalog rebuild <outputs_dir> [--catalog FILE]
+       python3 -m Quanti.catalog cells [--min-runs 30] [--catalog FILE]
+       python3 -m Quanti.catalog metric <name> [--catalog FILE]
+
+One row per run with its metadata, plus every numeric summary.json value in a
+(run, key, value) table, so cross-run questions are a query instead of a walk over
+every summary.json. Run numbers are handed out inside a write transaction, so
+concurrent runs never get the same number.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+CATALOG_FILE = "data/catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    workload TEXT NOT NULL,
+    run_number INTEGER NOT NULL,
+    run_dir TEXT UNIQUE,
+    host TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    created TEXT NOT NULL,
+    finished TEXT,
+    summary TEXT,
+    UNIQUE (model, workload, run_number)
+);
+CREATE INDEX IF NOT EXISTS runs_cell ON runs (model, workload, status);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, key)
+);
+CREATE INDEX IF NOT EXISTS metrics_key ON metrics (key);
+"""
+
+RESERVED, DONE, FAILED = "reserved", "done", "failed"
+
+
+def workload_name(workload: str) -> str:
+    """Catalog key of a workload: data/input/llm_workload_100.csv -> llm_workload_100.
+
+    Synthetic specs become a path-safe label, e.g. synthetic_n_1000_seed_0.
+    """
+    workload = workload or ""
+    if workload.startswith("synthetic:"):
+        return re.sub(r"[^A-Za-z0-9.]+", "_", workload).strip("_")
+    return os.path.splitext(os.path.basename(workload))[0]
+
+
+def run_number_of(run_dir: str):
+    """Number encoded in an rNN_ run directory name, or None."""
+    m = re.match(r"r(\d+)_", os.path.basename(os.path.normpath(run_dir)))
+    return int(m.group(1)) if m else None
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class RunCatalog:
+    def __init__(self, path: str = CATALOG_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Several benchmark processes may write at once; wait for the lock instead of failing
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    def _next_number(self, model: str, workload: str) -> int:
+        row = self.conn.execute("SELECT MAX(run_number) FROM runs WHERE model = ? AND workload = ?",
+                                (model, workload)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def reserve(self, model: str, workload: str, host: str = None, number: int = None) -> tuple:
+        """Claim `number`, if given and still free, else the next run number of a model/workload cell.
+
+        Returns (run id, run number).
+        """
+        workload = workload_name(workload)
+        with self._transaction():
+            if number is None or self.conn.execute(
+                    "SELECT 1 FROM runs WHERE model = ? AND workload = ? AND run_number = ?",
+                    (model, workload, number)).fetchone():
+                number = self._next_number(model, workload)
+            cur = self.conn.execute(
+                "INSERT INTO runs (model, workload, run_number, host, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (model, workload, number, host, RESERVED, _now()))
+        return cur.lastrowid, number
+
+    def record(self, summary: dict, run_dir: str = None, run_id: int = None, host: str = None,
+               run_number: int = None) -> int:
+        """Store a finished run and its metrics in one transaction. Returns the run id.
+
+        Without run_id the run is matched on run_dir, so recording the same directory
+        again (e.g. after a redo) replaces its row instead of adding a second one.
+        """
+        model = summary.get("llm") or summary.get("model") or "unknown"
+        workload = workload_name(summary.get("workload"))
+        metrics = [(k, float(v)) for k, v in summary.items()
+                   if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        with self._transaction():
+            if run_dir is not None:
+                row = self.conn.execute("SELECT id FROM runs WHERE run_dir = ?", (run_dir,)).fetchone()
+                if row and run_id is None:
+                    run_id = row[0]
+                elif row and row[0] != run_id:
+                    # The directory was redone under a new reservation; the old row is stale
+                    self.conn.execute("DELETE FROM runs WHERE id = ?", (row[0],))
+            if run_id is None:
+                if run_number is None or self.conn.execute(
+                        "SELECT 1 FROM runs WHERE model = ? AND workload = ? AND run_number = ?",
+                        (model, workload, run_number)).fetchone():
+                    run_number = self._next_number(model, workload)
+                run_id = self.conn.execute(
+                    "INSERT INTO runs (model, workload, run_number, status, created) VALUES (?, ?, ?, ?, ?)",
+                    (model, workload, run_number, RESERVED, _now())).lastrowid
+            self.conn.execute(
+                "UPDATE runs SET model = ?, workload = ?, run_dir = ?, host = COALESCE(?, host), status = ?, "
+                "error = NULL, finished = ?, summary = ? WHERE id = ?",
+                (model, workload, run_dir, host, DONE, _now(), json.dumps(summary), run_id))
+            self.conn.execute("DELETE FROM metrics WHERE run_id = ?", (run_id,))
+            self.conn.executemany("INSERT INTO metrics (run_id, key, value) VALUES (?, ?, ?)",
+                                  [(run_id, k, v) for k, v in metrics])
+        return run_id
+
+    def record_dir(self, run_dir: str, host: str = None, run_id: int = None) -> int:
+        """Record a run directory from its summary.json."""
+        with open(os.path.join(run_dir, "summary.json")) as f:
+            summary = json.load(f)
+        return self.record(summary, run_dir=run_dir, run_id=run_id, host=host, run_number=run_number_of(run_dir))
+
+    def fail(self, run_id: int, error: str) -> None:
+        with self._transaction():
+            self.conn.execute("UPDATE runs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                              (FAILED, error, _now(), run_id))
+
+    def rebuild(self, root: str) -> int:
+        """Backfill the catalog from every run directory under root. Returns the number of runs recorded."""
+        n = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            if "summary.json" not in filenames:
+                continue
+            try:
+                self.record_dir(dirpath)
+                n += 1
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {dirpath}: {e}")
+        return n
+
+    def cell_counts(self) -> list:
+        """(model, workload, finished runs) for every cell in the catalog."""
+        return self.conn.execute(
+            "SELECT model, workload, SUM(status = 'done') FROM runs GROUP BY model, workload "
+            "ORDER BY model, workload").fetchall()
+
+    def metric_by_model(self, key: str) -> list:
+        """(model, workload, runs, mean, min, max) of one summary metric over finished runs."""
+        return self.conn.execute(
+            "SELECT r.model, r.workload, COUNT(*), AVG(m.value), MIN(m.value), MAX(m.value) "
+            "FROM metrics m JOIN runs r ON r.id = m.run_id "
+            "WHERE m.key = ? AND r.status = 'done' GROUP BY r.model, r.workload ORDER BY r.model, r.workload",
+            (key,)).fetchall()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT; takes the write lock up front so read-then-insert is atomic."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def parse_catalog_args(argv=None):
+    parser = argparse.ArgumentParser(prog="catalog.py", description="SQLite catalog of benchmark runs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Backfill the catalog from existing run directories")
+    rebuild.add_argument("root", help="Directory holding run directories (e.g. exp1_data/data)")
+    cells = sub.add_parser("cells", help="Finished runs per model/workload cell")
+    cells.add_argument("--min-runs", type=int, default=None, help="Only list cells with fewer finished runs")
+    metric = sub.add_parser("metric", help="Mean/min/max of a summary metric per cell")
+    metric.add_argument("key", help="summary.json key, e.g. energy_Wh or J_per_output_token")
+    for p in (rebuild, cells, metric):
+        p.add_argument("--catalog", default=CATALOG_FILE, help=f"Catalog file (default: {CATALOG_FILE})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_catalog_args(argv)
+    catalog = RunCatalog(args.catalog)
+    try:
+        if args.command == "rebuild":
+            n = catalog.rebuild(args.root)
+            print(f"🗂️ Recorded {n} run(s) from {args.root} in {args.catalog}")
+        elif args.command == "cells":
+            for model, workload, done in catalog.cell_counts():
+                if args.min_runs is None or done < args.min_runs:
+                    print(f"{model:24s} {workload:24s} {done}")
+        else:
+            rows = catalog.metric_by_model(args.key)
+            if not rows:
+                print(f"📭 No finished runs report {args.key}")
+            for model, workload, n, mean, lo, hi in rows:
+                print(f"{model:24s} {workload:24s} n={n:<3d} mean={mean:.4f} min={lo:.4f} max={hi:.4f}")
+    finally:
+        catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
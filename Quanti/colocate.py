@@ -0,0 +1,213 @@
+"""Co-located benchmarking: several vLLM instances sharing one GPU.
+
+Usage: python3 benchmark.py Llama-3-8B-AWQ,Granite-8B-AWQ <workload> [output_dir]
+                            [--ports 8000,8001] [--memory-fractions 0.42,0.42] [benchmark.py options]
+
+Each instance gets its own port and its own --gpu-memory-utilization fraction (by default
+the run's budget, --gpu-memory-utilization or 0.85, split evenly). The instances are
+launched one after the other, so each one profiles memory with the earlier ones already
+resident. Then every instance gets the whole workload from its own load generator, all
+at the same time. One monitor meters the shared GPU. summary.json reports the combined
+energy per output token, and its `instances` list holds each instance's throughput,
+latency and share of the energy. Shares are attributed request by request, so time
+with nothing in flight is not charged to any instance.
+"""
+import json
+import os
+import threading
+import uuid
+
+import vllm_manager
+from attribution import attribute_runs
+from benchmark import (SERVER_STATE, STARTUP_TIMEOUT_S, _no_mark, effective_serve_config, launch_server,
+                       metered_run, prepare_launch, print_summary, run_workload, token_energy,
+                       warm_server_available)
+from energy import EnergyMonitor
+from loadgen import throughput
+from utils import now_tag
+from workloads import is_synthetic
+
+FIRST_PORT = 8000
+# Per-instance counts summed into the run's totals
+INSTANCE_TOTALS = ("prompt_tokens", "completion_tokens", "n_prompts")
+
+
+def colocation_plan(llms: list, ports: list = None, memory_fractions: list = None, serve_params: dict = None) -> list:
+    """One {llm, port, serve, vllm_args} per instance. Raises ValueError on an impossible layout."""
+    n = len(llms)
+    unknown = [llm for llm in llms if llm not in vllm_manager.models]
+    if unknown:
+        raise ValueError(f"unsupported model(s) {unknown}, expected some of {list(vllm_manager.models)}")
+    ports = ports or [FIRST_PORT + i for i in range(n)]
+    if len(ports) != n or len(set(ports)) != n:
+        raise ValueError(f"need {n} distinct ports, got {ports}")
+    if not memory_fractions:
+        budget = (serve_params or {}).get("gpu_memory_utilization") \
+                 or vllm_manager.DEFAULT_SERVE_CONFIG["gpu_memory_utilization"]
+        memory_fractions = [round(budget / n, 3)] * n
+    if len(memory_fractions) != n or min(memory_fractions) <= 0 or sum(memory_fractions) > 1.0 + 1e-9:
+        raise ValueError(f"need {n} positive memory fractions summing to at most 1, got {memory_fractions}")
+
+    plan = []
+    for llm, port, fraction in zip(llms, ports, memory_fractions):
+        serve = effective_serve_config(llm, serve_params)
+        serve["gpu_memory_utilization"] = fraction
+        plan.append({"llm": llm, "port": port, "serve": serve,
+                     "vllm_args": vllm_manager.cmd_serve_model(llm, port=port, **serve)})
+    return plan
+
+
+def colocated_setup(plan: list, warm: bool = False, mark=_no_mark, startup_timeout_s: float = STARTUP_TIMEOUT_S):
+    """benchmark_setup for a co-location plan: "warm", "cold" or False."""
+    print("🔧 Setting up co-located benchmark environment...")
+    key = ",".join(inst["llm"] for inst in plan)
+    args = " | ".join(inst["vllm_args"] for inst in plan)
+    if warm and warm_server_available(key, args):
+        print(f"  ♨️ Reusing warm co-located vLLM servers for {key}")
+        return "warm"
+
+    if not prepare_launch(mark):
+        return False
+
+    # One after the other: vLLM sizes its KV cache from the memory it finds at startup
+    instances = []
+    for inst in plan:
+        tag = f"{inst['llm']}@{inst['port']}"
+        print(f"  🚀 Launching vLLM server for {tag} "
+              f"({inst['serve']['gpu_memory_utilization']:.0%} of GPU memory)...")
+        proc = launch_server(inst["vllm_args"], inst["port"], startup_timeout_s,
+                             mark=lambda name, tag=tag: mark(f"{tag}_{name}"),
+                             log_path=os.path.expanduser(f"~/.quanti_vllm_{inst['port']}.log"))
+        if proc is None:
+            return False
+        instances.append({"llm": inst["llm"], "args": inst["vllm_args"], "pid": proc.pid, "port": inst["port"]})
+
+    print(f"  ✅ {len(instances)} co-located vLLM servers are up.")
+    with open(SERVER_STATE, "w") as f:
+        json.dump({"llm": key, "args": args, "pid": instances[0]["pid"], "port": instances[0]["port"],
+                   "instances": instances}, f)
+    return "cold"
+
+
+def run_colocated(plan: list, workload: str, monitor: EnergyMonitor, run_dir: str, seed: int = None, **load) -> list:
+    """run_workload against every instance at once. Returns their results (False where one failed)."""
+    results = [False] * len(plan)
+
+    def drive(i, inst):
+        # Offset seeds so Poisson arrivals of the instances are independent
+        results[i] = run_workload(inst["llm"], workload, monitor,
+                                  os.path.join(run_dir, "instances", f"{inst['llm']}_{inst['port']}"),
+                                  seed=None if seed is None else seed + i, port=inst["port"], **load)
+
+    threads = [threading.Thread(target=drive, args=(i, inst), name=f"colocate:{inst['port']}")
+               for i, inst in enumerate(plan)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def instance_summary(inst: dict, results: dict, attribution: dict) -> dict:
+    energy_j = attribution.get("attributed_energy_J", 0.0)
+    summary = {"llm": inst["llm"], "port": inst["port"], **inst["serve"], **results,
+               "energy_attributed_Wh": round(energy_j / 3600.0, 4), **attribution}
+    summary.update(token_energy(energy_j / 3600.0, results, suffix="_attributed"))
+    return summary
+
+
+def colocate_main(llms: list, workload: str, output_dir: str = None, ports: list = None,
+                  memory_fractions: list = None, concurrency: int = 1, arrival: str = "closed", qps: float = None,
+                  replay_column: str = None, seed: int = None, stream: bool = False, idle_baseline_s: float = 0.0,
+                  sampler: str = "auto", sample_interval_ms: float = 100, rapl_root: str = None,
+                  metrics_port: int = 0, warm: bool = False, run_number: int = None,
+                  startup_timeout_s: float = STARTUP_TIMEOUT_S, serve_params: dict = None,
+                  results_format: str = "csv"):
+    """benchmark_main for several models served side by side on one GPU."""
+    key = ",".join(llms)
+    print(f"🎯 Starting co-located benchmark: {key} on {workload}")
+    try:
+        plan = colocation_plan(llms, ports, memory_fractions, serve_params)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+
+    if not is_synthetic(workload) and not os.path.exists(workload):
+        print(f"❌ Workload file does not exist: {workload}")
+        return False
+
+    run_name = f"colocated_{now_tag()}_{uuid.uuid4().hex[:6]}"
+    run_dir = output_dir or os.path.join("results", run_name)
+    os.makedirs(run_dir, exist_ok=True)
+    print(f"📁 Using output directory as-is: {run_dir}")
+
+    def setup(mark):
+        return colocated_setup(plan, warm=warm, mark=mark, startup_timeout_s=startup_timeout_s)
+
+    with metered_run(run_name, run_dir, setup, warm=warm, sampler=sampler, sample_interval_ms=sample_interval_ms,
+                     rapl_root=rapl_root, metrics_port=metrics_port, idle_baseline_s=idle_baseline_s,
+                     results_format=results_format) as (server_start, startup, monitor):
+        if monitor is None:
+            return False
+
+        print(f"3️⃣ Running workload against {len(plan)} co-located instances...")
+        monitor.mark("workload_start")
+        results = run_colocated(plan, workload, monitor, run_dir, seed=seed, concurrency=concurrency, arrival=arrival,
+                                qps=qps, replay_column=replay_column, stream=stream, results_format=results_format)
+        monitor.mark("workload_end")
+
+        if not all(results):
+            print("❌ Workload execution failed")
+            return False
+
+        duration = monitor.marks["workload_end"] - monitor.marks["workload_start"]
+        totals = {key: sum(r[key] for r in results) for key in INSTANCE_TOTALS}
+        print("4️⃣ Stopping energy monitoring...")
+        energy_summary = monitor.stop(
+            meta={
+                "llm": key,
+                "workload": workload,
+                "server_start": server_start,
+                "run_number": run_number,
+                "colocated": True,
+                "ports": [inst["port"] for inst in plan],
+                "memory_fractions": [inst["serve"]["gpu_memory_utilization"] for inst in plan],
+                **startup,
+                "workload_duration_s": round(duration, 2),
+                "arrival": arrival,
+                "concurrency": concurrency,
+                "stream": stream,
+                **totals,
+                "requests_per_s": round(throughput(totals["n_prompts"], duration), 3),
+                "prefill_tok_per_s": round(throughput(totals["prompt_tokens"], duration), 2),
+                "decode_tok_per_s": round(throughput(totals["completion_tokens"], duration), 2),
+            }
+        )
+        energy_summary.update(token_energy(energy_summary["energy_Wh"], totals))
+        if "energy_net_Wh" in energy_summary:
+            energy_summary.update(token_energy(energy_summary["energy_net_Wh"], totals, suffix="_net"))
+
+        try:
+            host_columns = [f"rapl_{name}_W" for name in monitor.rapl.host_domains] if monitor.rapl else []
+            attributions = attribute_runs([r["results_file"] for r in results], energy_summary["trace_csv"],
+                                          host_columns=host_columns)
+        except Exception as e:
+            print(f"⚠️ Per-request energy attribution failed: {e}")
+            attributions = [{} for _ in results]
+        energy_summary["instances"] = [instance_summary(inst, res, attr)
+                                       for inst, res, attr in zip(plan, results, attributions)]
+
+        report = os.path.join(run_dir, "summary.json")
+        with open(report, "w") as f:
+            json.dump(energy_summary, f, indent=2)
+
+        lines = [f"📁 Workload: {workload} (each instance)"]
+        for inst in energy_summary["instances"]:
+            share = inst.get("J_per_output_token_attributed")
+            lines.append(f"  📊 {inst['llm']}@{inst['port']} ({inst['gpu_memory_utilization']:.0%} mem): "
+                         f"{inst['requests_per_s']:.2f} req/s, {inst['decode_tok_per_s']:.1f} out tok/s, "
+                         f"p50/p99 {inst.get('latency_p50_s', 0):.3f}s / {inst.get('latency_p99_s', 0):.3f}s, "
+                         f"{inst['energy_attributed_Wh']:.4f}Wh" + (f" ({share:.4f}J/tok)" if share is not None else ""))
+        print_summary("CO-LOCATED BENCHMARK", energy_summary, lines,
+                      [("📊 Benchmark Report", report), ("⚡ Energy Trace", energy_summary["trace_csv"])])
+        return True
@@ -1,14 +1,36 @@
-import csv
 import json
 import os
-import subprocess
 import threading
 import time
+import numpy as np
+from batch_writer import BatchWriter, with_format
+from samplers import Sampler, SampleRing, RaplSampler, TRACE_COLUMNS, make_sampler, format_trace_rows
 from utils import now_tag
 
 
+def integrate_energy_j(t, power_w, t_from=None, t_to=None) -> float:
+    """Trapezoidal energy (J) of a power trace, optionally clipped to [t_from, t_to].
+
+    Uses the actual sample timestamps, so uneven sample spacing is handled. Power at
+    the clip edges is linearly interpolated from the neighbouring samples.
+    """
+    t = np.asarray(t, dtype=float)
+    p = np.asarray(power_w, dtype=float)
+    if t.size < 2:
+        return 0.0
+    lo = t[0] if t_from is None else max(t_from, t[0])
+    hi = t[-1] if t_to is None else min(t_to, t[-1])
+    if hi <= lo:
+        return 0.0
+    inside = (t > lo) & (t < hi)
+    tt = np.concatenate([[lo], t[inside], [hi]])
+    pp = np.concatenate([[np.interp(lo, t, p)], p[inside], [np.interp(hi, t, p)]])
+    return float(np.sum(0.5 * (pp[1:] + pp[:-1]) * np.diff(tt)))
+
+
 class EnergyMonitor:
-    def __init__(self, interval_ms=100, run_name=None, output_dir=None):
+    def __init__(self, interval_ms=100, run_name=None, output_dir=None, sampler="nvidia-smi", ring_capacity=4096,
+                 rapl_root=None, trace_name="energy_trace.csv", trace_format="csv", flush_s=1.0):
         self.interval_ms = interval_ms
         self.run_name = run_name or now_tag()
         self.output_dir = output_dir
@@ -17,15 +39,28 @@ class EnergyMonitor:
             self.out_dir = output_dir
             self.detailed_dir = os.path.join(output_dir, "detailed")
             os.makedirs(self.detailed_dir, exist_ok=True)
-            self.trace_csv = os.path.join(self.detailed_dir, "energy_trace.csv")
+            self.trace_csv = with_format(os.path.join(self.detailed_dir, trace_name), trace_format)
             self.summary_json = os.path.join(output_dir, "energy_summary.json")
         else:
             self.out_dir = f"energy_traces"
             os.makedirs(self.out_dir, exist_ok=True)
-            self.trace_csv = os.path.join(self.out_dir, f"{self.run_name}_trace.csv")
+            self.trace_csv = with_format(os.path.join(self.out_dir, f"{self.run_name}_trace.csv"), trace_format)
             self.summary_json = os.path.join(self.out_dir, f"{self.run_name}_summary.json")
 
-        self._proc = None
+        self.sampler = sampler if isinstance(sampler, Sampler) else make_sampler(sampler, interval_ms)
+        self.rapl = None
+        if rapl_root:
+            try:
+                self.rapl = RaplSampler(rapl_root)
+            except Exception as e:
+                print(f"⚠️ RAPL unavailable ({e}), measuring GPU power only")
+        self.rapl_columns = [f"rapl_{name}_W" for name in self.rapl.domains] if self.rapl else []
+        self.trace_columns = TRACE_COLUMNS + self.rapl_columns
+        self.ring = SampleRing(ring_capacity, width=len(self.trace_columns))
+        self.flush_every = ring_capacity // 2
+        self.flush_s = flush_s
+        self.live = None  # optional live_metrics.LiveMetrics fed with every sample
+        self._writer = None
         self._thr = None
         self._stop = threading.Event()
         self._lock = threading.Lock()
@@ -40,93 +75,173 @@ class EnergyMonitor:
         self.avg_mem = 0.0
         self.t0 = None
         self.t1 = None
+        self.marks = {}
 
     def start(self):
-        """Start energy monitoring using nvidia-smi which is already surviving ok on the server."""
-        print(f"⚡ Starting energy monitoring (interval: {self.interval_ms}ms)")
-
-        q = "timestamp,power.draw,utilization.gpu,memory.used,memory.total"
-        cmd = f"nvidia-smi --query-gpu={q} --format=csv,noheader,nounits -lms {self.interval_ms}"
-
-        self._proc = subprocess.Popen(
-            cmd,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1
-        )
-
-        self.t0 = time.time()
-        f = open(self.trace_csv, "w", newline='', encoding='utf-8')
-        writer = csv.writer(f)
-        writer.writerow(["t_local_s", "timestamp", "power_W", "util_pct", "mem_used_MB", "mem_total_MB"])
+        """Start energy monitoring on the configured sampler backend (nvidia-smi is the safe fallback)."""
+        print(f"⚡ Starting energy monitoring ({self.sampler.name}, interval: {self.interval_ms}ms)")
+
+        self.t0 = time.monotonic()
+        # Formatting and writing happen on the writer thread, away from the sampling loop
+        self._writer = BatchWriter(self.trace_csv, columns=self.trace_columns,
+                                   render=lambda blocks: "".join(format_trace_rows(b) for b in blocks),
+                                   flush_items=1, flush_s=self.flush_s)
+        if self.rapl:
+            self.rapl.read()
 
         def monitoring_loop():
             """Thread to collect energy data which is happily running in the background."""
             tstart = self.t0
+            last_flush = 0.0
             try:
-                for line in self._proc.stdout:
-                    if self._stop.is_set():
-                        break
-
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    parts = [p.strip() for p in line.split(",")]
-                    if len(parts) < 5:
-                        continue
-
-                    tloc = time.time() - tstart
-                    try:
-                        power = float(parts[1])
-                        util = float(parts[2])
-                        mem_used = float(parts[3])
-                        mem_total = float(parts[4])
-                    except ValueError:
-                        continue
-
-                    writer.writerow([f"{tloc:.3f}", parts[0], f"{power:.1f}", f"{util:.1f}", f"{mem_used:.1f}", f"{mem_total:.1f}"])
-
-                    # Would be nice to also update the totals
+                for stamp, power, util, mem_used, mem_total in self.sampler.samples(self._stop):
+                    tloc = time.monotonic() - tstart
+                    host = list(self.rapl.read().values()) if self.rapl else []
                     with self._lock:
+                        self.ring.append((tloc, stamp, power, util, mem_used, mem_total, *host))
                         self.samples += 1
                         self.sum_power += power
                         self.sum_util += util
                         self.sum_mem += mem_used
+                        flush = self.ring.pending >= self.flush_every or tloc - last_flush >= self.flush_s
+                    if self.live:
+                        self.live.record_sample(tloc, power, util, mem_used)
+                    if flush:
+                        self._flush()
+                        last_flush = tloc
 
             except Exception as e:
                 print("❌ Error in energy monitoring thread:", e)
             finally:
-                f.flush()
-                f.close()
+                self._flush()
+                try:
+                    self._writer.close()
+                except Exception as e:
+                    print("❌ Error writing the energy trace:", e)
+                self.sampler.close()
 
         self._thr = threading.Thread(target=monitoring_loop, daemon=True)
         self._thr.start()
 
         print("✅ Energy monitoring started. We're logging to", self.trace_csv)
 
+    def _flush(self):
+        """Hand everything sampled since the last flush to the trace writer as one block."""
+        with self._lock:
+            rows = self.ring.drain()
+        if len(rows):
+            self._writer.write(rows)
+
+    def _load_trace(self) -> dict:
+        """Time and power columns of the flushed trace, keyed by column name."""
+        names = ["t_local_s", "power_W"] + self.rapl_columns
+        cols = tuple(self.trace_columns.index(n) for n in names)
+        try:
+            data = np.loadtxt(self.trace_csv, delimiter=",", skiprows=1, usecols=cols, ndmin=2)
+        except (OSError, ValueError):
+            data = np.zeros((0, len(names)))
+        return {name: data[:, i] for i, name in enumerate(names)}
+
+    def clock(self) -> float:
+        """Seconds since start() on the monotonic clock used for the t_local_s trace column."""
+        return time.monotonic() - self.t0 if self.t0 is not None else 0.0
+
+    def mark(self, name: str) -> float:
+        """Record a named point on the trace clock (e.g. workload_start)."""
+        self.marks[name] = self.clock()
+        return self.marks[name]
+
+    def measure_idle(self, window_s: float) -> None:
+        """Sample the loaded-but-idle GPU for `window_s` seconds before the workload starts."""
+        print(f"😴 Sampling idle baseline for {window_s:.1f}s...")
+        self.mark("idle_start")
+        time.sleep(window_s)
+        self.mark("idle_end")
+
+    def phase_breakdown(self) -> dict:
+        """Duration and energy of every <phase>_start/<phase>_end mark pair, in start order."""
+        trace = self._load_trace()
+        t, p = trace["t_local_s"], trace["power_W"]
+        phases = {}
+        starts = sorted((v, k[:-len("_start")]) for k, v in self.marks.items() if k.endswith("_start"))
+        for t_from, name in starts:
+            t_to = self.marks.get(f"{name}_end")
+            if t_to is None or t_to < t_from:
+                continue
+            phases[name] = {"s": round(t_to - t_from, 3),
+                            "Wh": round(integrate_energy_j(t, p, t_from, t_to) / 3600.0, 5)}
+        return phases
+
+    def _window_energy(self, t, p, suffix=""):
+        """Trace, gross, idle and net energy of one power column (see energy_breakdown)."""
+        trace_j = integrate_energy_j(t, p)
+        w0 = self.marks.get("workload_start")
+        w1 = self.marks.get("workload_end")
+        gross_j = integrate_energy_j(t, p, w0, w1) if w0 is not None and w1 is not None else trace_j
+        breakdown = {
+            f"energy{suffix}_trace_Wh": round(trace_j / 3600.0, 4),
+            f"energy{suffix}_gross_Wh": round(gross_j / 3600.0, 4),
+        }
+
+        i0 = self.marks.get("idle_start")
+        i1 = self.marks.get("idle_end")
+        # Only the part of the idle window actually covered by samples counts
+        idle_span = min(i1, t[-1]) - max(i0, t[0]) if i0 is not None and i1 is not None and t.size else 0.0
+        if idle_span > 0 and w0 is not None and w1 is not None:
+            idle_power = integrate_energy_j(t, p, i0, i1) / idle_span
+            idle_j = idle_power * (w1 - w0)
+            breakdown.update({
+                f"idle{suffix}_power_W": round(idle_power, 2),
+                f"energy{suffix}_idle_Wh": round(idle_j / 3600.0, 4),
+                f"energy{suffix}_net_Wh": round((gross_j - idle_j) / 3600.0, 4),
+            })
+        return breakdown
+
+    def energy_breakdown(self) -> dict:
+        """Gross, idle and net energy of the workload window, from the flushed trace.
+
+        Gross energy is integrated over [workload_start, workload_end] when those marks
+        exist (otherwise over the whole trace). The idle share is the mean idle-baseline
+        power times the workload duration, and net = gross - idle. With RAPL enabled the
+        same split is reported per host domain and for the whole node (GPU + host).
+        """
+        trace = self._load_trace()
+        t = trace["t_local_s"]
+        breakdown = self._window_energy(t, trace["power_W"])
+        i0, i1 = self.marks.get("idle_start"), self.marks.get("idle_end")
+        if "energy_net_Wh" in breakdown:
+            breakdown["idle_window_s"] = round(i1 - i0, 2)
+
+        if self.rapl:
+            for name in self.rapl.domains:
+                gross = self._window_energy(t, trace[f"rapl_{name}_W"], suffix=f"_rapl_{name}")
+                breakdown[f"energy_rapl_{name}_Wh"] = gross[f"energy_rapl_{name}_gross_Wh"]
+            host_p = sum(trace[f"rapl_{name}_W"] for name in self.rapl.host_domains)
+            if len(self.rapl.host_domains):
+                breakdown.update(self._window_energy(t, host_p, suffix="_host"))
+                breakdown.update(self._window_energy(t, trace["power_W"] + host_p, suffix="_node"))
+        return breakdown
+
+    def halt(self):
+        """Stop sampling without a summary, for runs that end early. A no-op once stop() has run."""
+        if self._thr is None or self._stop.is_set():
+            return
+        self._stop.set()
+        self.sampler.interrupt()
+        self._thr.join(timeout=10)
+
     def stop(self, meta=None, save_file=False):
         """Stop monitoring and return summary. If save_file=True, also write to self.summary_json."""
         self._stop.set()
 
-        # Terminate nvidia-smi process
-        if self._proc:
-            try:
-                self._proc.terminate()
-                self._proc.wait(timeout=5)
-            except:
-                try:
-                    self._proc.kill()
-                except:
-                    pass
+        # Unblock the sampler (terminates nvidia-smi if that is the backend)
+        self.sampler.interrupt()
 
         # Wait for monitoring thread
         if self._thr:
             self._thr.join(timeout=10)
 
-        self.t1 = time.time()
+        self.t1 = time.monotonic()
         duration_s = max(0.0, (self.t1 - self.t0) if self.t0 else 0.0)
 
         # Compute averages
@@ -140,7 +255,9 @@ class EnergyMonitor:
                 avg_util = 0.0
                 avg_mem = 0.0
 
-        energy_wh = (avg_power * duration_s) / 3600.0
+        # Trapezoidal integration over the sample timestamps, clipped to the workload window
+        breakdown = self.energy_breakdown()
+        energy_wh = breakdown["energy_gross_Wh"]
 
         # Build concise summary
         summary = {
@@ -152,6 +269,7 @@ class EnergyMonitor:
             "avg_util_pct": round(avg_util, 2),
             "avg_mem_MiB": round(avg_mem, 2),
             "energy_Wh": round(energy_wh, 4),
+            **breakdown,
             "trace_csv": self.trace_csv,
         }
 
@@ -168,6 +286,8 @@ class EnergyMonitor:
         print(f"   Samples: {self.samples}")
         print(f"   Avg Power: {avg_power:.2f}W")
         print(f"   Total Energy: {energy_wh:.4f}Wh")
+        if "energy_net_Wh" in breakdown:
+            print(f"   Idle / Net Energy: {breakdown['energy_idle_Wh']:.4f}Wh / {breakdown['energy_net_Wh']:.4f}Wh")
         if save_file:
             print(f"   Summary saved: {self.summary_json}")
         else:
@@ -176,21 +296,24 @@ class EnergyMonitor:
         return summary
 
     def get_current_stats(self):
-        """Get current monitoring statistics without stopping. Would be amazing to actually make this live-work :D."""
+        """Get current monitoring statistics without stopping; adds sliding-window stats when live metrics are attached."""
         with self._lock:
             if self.samples > 0:
-                return {
+                stats = {
                     "samples": self.samples,
                     "avg_power_W": round(self.sum_power / self.samples, 2),
                     "avg_util_pct": round(self.sum_util / self.samples, 2),
                     "avg_mem_MiB": round(self.sum_mem / self.samples, 2),
-                    "duration_s": round(time.time() - self.t0, 2) if self.t0 else 0
+                    "duration_s": round(self.clock(), 2) if self.t0 else 0
                 }
             else:
-                return {
+                stats = {
                     "samples": 0,
                     "avg_power_W": 0.0,
                     "avg_util_pct": 0.0,
                     "avg_mem_MiB": 0.0,
                     "duration_s": 0.0
                 }
+        if self.live:
+            stats["windows"] = self.live.snapshot()["windows"]
+        return stats
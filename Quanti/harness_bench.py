@@ -0,0 +1,213 @@
+"""Micro-benchmarks of the harness itself, on any CPU-only machine.
+
+Usage: python3 harness_bench.py [--suite loadgen,writers,monitor] [--concurrency 1,4,16,64,256]
+                                [--requests 2000] [--service-s 0.02] [--stream] [--mock-workers 2]
+                                [--reference-rps R] [--out harness_bench.json]
+
+loadgen  run_workload end to end (synthetic prompts, load generator, result writer,
+         latency reservoirs) against mock_server processes that answer every request in
+         exactly service_s. Reports achieved req/s against the ideal concurrency / service_s,
+         client CPU per request and the added latency (p50/p99 latency - service_s).
+writers  per-row open/append/close (the old append_csv) against BatchWriter: time on the
+         caller's thread and total CPU per row.
+monitor  EnergyMonitor fed by a synthetic sampler as fast as it can go: CPU per sample,
+         and what that costs at 100 ms and 10 ms sampling intervals.
+
+The mock runs in separate processes, so the CPU times are the client's own.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from batch_writer import BatchWriter
+from benchmark import run_workload
+from energy import EnergyMonitor
+from mock_server import start_workers
+from samplers import Sampler
+
+MOCK_PORT = 18_000
+ROW = {
+    "prompt": "Explain the trade-offs between energy efficiency and latency in LLM serving. " * 4,
+    "reply": "Energy per token falls with batch size while latency grows, because " * 15,
+    "t_arrival_s": 12.345678, "t_send_s": 12.345678, "t_end_s": 13.456789, "queue_delay_s": 0.0,
+    "latency_s": 1.111111, "prompt_tokens": 64, "completion_tokens": 128,
+}
+
+
+def _cpu() -> float:
+    return time.process_time()
+
+
+def _wait_ready(port: int, timeout_s: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://localhost:{port}/health", timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"mock server on port {port} did not come up")
+
+
+def bench_loadgen(concurrency: list, n_requests: int, service_s: float, stream: bool, workers: int,
+                  port: int = MOCK_PORT) -> list:
+    procs = start_workers(port, workers, ttft_s=service_s, prefill_tok_per_s=0, decode_tok_per_s=0,
+                          max_num_seqs=0)
+    tmp = tempfile.mkdtemp(prefix="harness_bench_")
+    rows = []
+    try:
+        _wait_ready(port)
+        for c in concurrency:
+            workload = f"synthetic:n={max(n_requests, 20 * c)},input=const:32,output=const:16,seed=0"
+            cpu0, t0 = _cpu(), time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                res = run_workload("Llama-3-8B", workload, None, os.path.join(tmp, f"c{c}"), concurrency=c,
+                                   stream=stream, port=port)
+            wall, cpu = time.perf_counter() - t0, _cpu() - cpu0
+            n = res["n_prompts"]
+            ideal = c / service_s if service_s else float("inf")
+            rows.append({
+                "concurrency": c,
+                "requests": n,
+                "req_per_s": round(n / wall, 1),
+                "ideal_req_per_s": round(ideal, 1),
+                "efficiency": round(n / wall / ideal, 3) if service_s else None,
+                "cpu_ms_per_req": round(1e3 * cpu / n, 3),
+                "cpu_util": round(cpu / wall, 3),
+                "added_p50_ms": round(1e3 * (res["latency_p50_s"] - service_s), 2),
+                "added_p99_ms": round(1e3 * (res["latency_p99_s"] - service_s), 2),
+            })
+            print(f"  c={c:<4d} {rows[-1]['req_per_s']:>8.1f} req/s (ideal {ideal:.0f})  "
+                  f"{rows[-1]['cpu_ms_per_req']:.3f} ms CPU/req  +{rows[-1]['added_p50_ms']:.2f} ms p50  "
+                  f"+{rows[-1]['added_p99_ms']:.2f} ms p99")
+    finally:
+        for p in procs:
+            p.terminate()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return rows
+
+
+def _append_row(path: str, row: dict) -> None:
+    """What utils.append_csv did for every reply: open, check, write one row, close."""
+    with open(path, "a", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        if fh.tell() == 0:
+            w.writerow(row.keys())
+        w.writerow(row.values())
+
+
+def bench_writers(n_rows: int = 20_000) -> list:
+    tmp = tempfile.mkdtemp(prefix="harness_bench_")
+    rows = []
+    try:
+        for name in ("append_csv", "BatchWriter csv", "BatchWriter csv.gz"):
+            path = os.path.join(tmp, "rows.csv.gz" if name.endswith("gz") else f"{name.split()[0]}.csv")
+            cpu0, t0 = _cpu(), time.perf_counter()
+            if name == "append_csv":
+                for i in range(n_rows):
+                    _append_row(path, {"idx": i, **ROW})
+                caller = time.perf_counter() - t0
+            else:
+                writer = BatchWriter(path)
+                for i in range(n_rows):
+                    writer.write({"idx": i, **ROW})
+                caller = time.perf_counter() - t0
+                writer.close()
+            cpu = _cpu() - cpu0
+            rows.append({"writer": name, "rows": n_rows, "caller_us_per_row": round(1e6 * caller / n_rows, 2),
+                         "cpu_us_per_row": round(1e6 * cpu / n_rows, 2), "bytes": os.path.getsize(path)})
+            print(f"  {name:20s} {rows[-1]['caller_us_per_row']:>7.2f} us/row on the caller  "
+                  f"{rows[-1]['cpu_us_per_row']:>7.2f} us CPU/row  {rows[-1]['bytes'] / 2**20:.1f} MiB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return rows
+
+
+class SyntheticSampler(Sampler):
+    """Constant readings as fast as the monitor takes them."""
+    name = "synthetic"
+
+    def samples(self, stop):
+        while not stop.is_set():
+            yield time.time(), 250.0, 90.0, 20_000.0, 81_920.0
+
+
+def bench_monitor(duration_s: float = 3.0) -> dict:
+    tmp = tempfile.mkdtemp(prefix="harness_bench_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor = EnergyMonitor(interval_ms=0, output_dir=tmp, sampler=SyntheticSampler(0))
+            cpu0 = _cpu()
+            monitor.start()
+            # Only the monitor thread works here; the main thread sleeps
+            threading.Event().wait(duration_s)
+            monitor.stop()
+            cpu = _cpu() - cpu0
+        cost = cpu / max(1, monitor.samples)
+        row = {"samples": monitor.samples, "samples_per_s": round(monitor.samples / duration_s),
+               "cpu_us_per_sample": round(1e6 * cost, 2),
+               "cpu_pct_at_100ms": round(100 * cost / 0.1, 4), "cpu_pct_at_10ms": round(100 * cost / 0.01, 4)}
+        print(f"  {row['samples_per_s']} samples/s max, {row['cpu_us_per_sample']:.2f} us CPU/sample: "
+              f"{row['cpu_pct_at_100ms']:.3f}% of a core at 100 ms, {row['cpu_pct_at_10ms']:.3f}% at 10 ms")
+        return row
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def parse_bench_args(argv=None):
+    parser = argparse.ArgumentParser(prog="harness_bench.py", description="Measure the harness' own overhead.")
+    parser.add_argument("--suite", default="loadgen,writers,monitor",
+                        help="Comma-separated suites to run (default: loadgen,writers,monitor)")
+    parser.add_argument("--concurrency", default="1,4,16,64,256",
+                        help="Client concurrency levels for the loadgen suite (default: 1,4,16,64,256)")
+    parser.add_argument("--requests", type=int, default=2000,
+                        help="Requests per level, at least 20 per in-flight slot (default: 2000)")
+    parser.add_argument("--service-s", type=float, default=0.02,
+                        help="Mock service time of every request (default: 0.02)")
+    parser.add_argument("--stream", action="store_true", help="Use streaming requests")
+    parser.add_argument("--mock-workers", type=int, default=2, help="Mock server processes (default: 2)")
+    parser.add_argument("--reference-rps", type=float, default=None,
+                        help="Request rate of the real server, to report the harness' headroom over it")
+    parser.add_argument("--out", default=None, help="Also write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_bench_args(argv)
+    suites = [s for s in args.suite.split(",") if s]
+    results = {"cpu_count": os.cpu_count(), "python": sys.version.split()[0]}
+    if "loadgen" in suites:
+        print(f"🏃 loadgen: {args.requests} requests per level, service time {args.service_s * 1e3:.0f} ms"
+              f"{', streaming' if args.stream else ''}")
+        results["loadgen"] = bench_loadgen([int(c) for c in args.concurrency.split(",")], args.requests,
+                                           args.service_s, args.stream, args.mock_workers)
+        peak = max(r["req_per_s"] for r in results["loadgen"])
+        print(f"📈 Harness peak: {peak:.1f} req/s")
+        if args.reference_rps:
+            print(f"   {peak / args.reference_rps:.0f}x the reference server's {args.reference_rps} req/s")
+    if "writers" in suites:
+        print("📝 writers:")
+        results["writers"] = bench_writers()
+    if "monitor" in suites:
+        print("⚡ monitor:")
+        results["monitor"] = bench_monitor()
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
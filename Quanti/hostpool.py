@@ -0,0 +1,175 @@
+"""Parallel dispatch of matrix runs over a pool of GPU hosts.
+
+Each host runs one benchmark at a time. Runs of the same model/workload cell stay on
+one GPU model, so results are never mixed across hardware, and a host that keeps
+failing is retired with its work handed to the others.
+"""
+import json
+import os
+import threading
+import time
+
+from Quanti.transport import make_transport
+
+
+class Host:
+    def __init__(self, spec: str):
+        self.spec = spec
+        self.transport = make_transport(spec)
+        self.gpu_model = None
+        self.failures = 0
+        self.retired = False
+        self.last_model = None
+
+    def __repr__(self):
+        return f"Host({self.spec!r}, gpu={self.gpu_model!r})"
+
+    def probe(self) -> str:
+        """Ask the host which GPU it has; 'unknown' if nvidia-smi is unavailable."""
+        result = self.transport.run("nvidia-smi --query-gpu=name --format=csv,noheader", timeout=60)
+        names = result.stdout.decode(errors="replace").strip().splitlines() if result.returncode == 0 else []
+        self.gpu_model = names[0].strip() if names else "unknown"
+        return self.gpu_model
+
+
+def cell_of(run: dict) -> tuple:
+    return run["model"], run["workload"]
+
+
+class HostPool:
+    """Hands runs to hosts in parallel.
+
+    `execute(run, host)` performs one run on one host and returns an error string
+    (empty on success); `on_result(run, host, error)` is called after every attempt.
+    A run that fails goes back to the queue until it used `max_attempts`; a host
+    retires after `max_host_failures` consecutive failures.
+    """
+
+    def __init__(self, hosts, execute, on_result=None, max_attempts: int = 3, max_host_failures: int = 3,
+                 cell_gpu: dict = None, skip=None):
+        self.hosts = list(hosts)
+        self.execute = execute
+        self.on_result = on_result
+        self.max_attempts = max_attempts
+        self.max_host_failures = max_host_failures
+        # skip(run) -> True drops a queued run without executing it (e.g. its cell already converged)
+        self.skip = skip
+        self.skipped = []
+        # (model, workload) -> GPU model the cell's finished runs were measured on
+        self.cell_gpu = dict(cell_gpu or {})
+        self._lock = threading.Lock()
+        self._pending = []
+        self._attempts = {}
+        self._in_flight = 0
+        self._cell_busy = {}
+        self._cell_done = {cell for cell in self.cell_gpu}
+        self._wake = threading.Condition(self._lock)
+        # on_result callbacks run one at a time, whichever worker finished
+        self._result_lock = threading.Lock()
+
+    def _take(self, host: Host):
+        """Next run this host may do, preferring the model it already has loaded."""
+        with self._wake:
+            while True:
+                if host.retired:
+                    return None
+                if self.skip:
+                    dropped = [r for r in self._pending if self.skip(r)]
+                    for r in dropped:
+                        self._pending.remove(r)
+                    self.skipped.extend(dropped)
+                allowed = [r for r in self._pending
+                           if self.cell_gpu.get(cell_of(r), host.gpu_model) == host.gpu_model]
+                if allowed:
+                    same_model = [r for r in allowed if r["model"] == host.last_model]
+                    run = (same_model or allowed)[0]
+                    self._pending.remove(run)
+                    self._in_flight += 1
+                    # Claim the cell now so its parallel repeats cannot start on another GPU model
+                    cell = cell_of(run)
+                    self.cell_gpu.setdefault(cell, host.gpu_model)
+                    self._cell_busy[cell] = self._cell_busy.get(cell, 0) + 1
+                    return run
+                if not self._pending and self._in_flight == 0:
+                    return None
+                if self._pending and self._in_flight == 0 and not self._other_host_can_take(host):
+                    return None
+                self._wake.wait(timeout=5)
+
+    def _other_host_can_take(self, host: Host) -> bool:
+        for other in self.hosts:
+            if other is host or other.retired:
+                continue
+            if any(self.cell_gpu.get(cell_of(r), other.gpu_model) == other.gpu_model for r in self._pending):
+                return True
+        return False
+
+    def _finish(self, host: Host, run: dict, error: str) -> None:
+        with self._wake:
+            self._in_flight -= 1
+            cell = cell_of(run)
+            self._cell_busy[cell] -= 1
+            key = run["key"]
+            self._attempts[key] = self._attempts.get(key, 0) + 1
+            if error:
+                host.failures += 1
+                if host.failures >= self.max_host_failures:
+                    host.retired = True
+                    print(f"🪦 Retiring {host.spec} after {host.failures} consecutive failures")
+                if self._attempts[key] < self.max_attempts:
+                    self._pending.append(run)
+                # A cell with nothing measured yet is free to move to other hardware
+                if cell not in self._cell_done and self._cell_busy[cell] == 0:
+                    self.cell_gpu.pop(cell, None)
+            else:
+                host.failures = 0
+                host.last_model = run["model"]
+                self._cell_done.add(cell)
+            self._wake.notify_all()
+
+    def _worker(self, host: Host) -> None:
+        while True:
+            run = self._take(host)
+            if run is None:
+                return
+            print(f"▶️ [{host.spec}] {run['key']}")
+            error = "interrupted"
+            try:
+                try:
+                    error = self.execute(run, host)
+                except Exception as e:
+                    error = f"{e.__class__.__name__}: {e}"
+                if error:
+                    print(f"⚠️ [{host.spec}] {run['key']} failed: {error}")
+                if self.on_result:
+                    with self._result_lock:
+                        self.on_result(run, host, error)
+            except Exception as e:
+                print(f"⚠️ [{host.spec}] Recording {run['key']} failed: {e.__class__.__name__}: {e}")
+            finally:
+                # Always release the run, or _take waits for it forever
+                self._finish(host, run, error)
+
+    def run(self, runs, attempts: dict = None) -> list:
+        """Dispatch `runs` and block until they are done or nobody can take them. Returns the leftovers."""
+        self._pending = list(runs)
+        self._attempts = dict(attempts or {})
+        for host in self.hosts:
+            if host.gpu_model is None:
+                host.probe()
+            print(f"🖥️ {host.spec}: {host.gpu_model}")
+
+        threads = [threading.Thread(target=self._worker, args=(h,), daemon=True) for h in self.hosts]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return list(self._pending)
+
+
+def write_host_info(run_dir: str, host: Host) -> None:
+    """Record where a run was measured, next to its summary."""
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "host.json"), "w") as f:
+        json.dump({"host": host.spec, "gpu_model": host.gpu_model,
+                   "finished": time.strftime("%Y-%m-%dT%H:%M:%S")}, f, indent=2)
@@ -0,0 +1,182 @@
+import heapq
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+WINDOWS_S = (1, 10, 60)
+# Log-spaced latency buckets from 1 ms to ~10 min
+LATENCY_EDGES_S = np.logspace(-3, np.log10(600), 80)
+
+
+class WindowedMean:
+    """Running sum/count over the last `window_s` seconds. Each sample is added and evicted once.
+
+    Samples are kept in a heap on their timestamp, so they may arrive out of order (requests
+    completing on several workers) and still leave the window on time.
+    """
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self._items = []
+        self.latest = float("-inf")
+        self.total = 0.0
+
+    def add(self, t: float, value: float) -> None:
+        heapq.heappush(self._items, (t, value))
+        self.total += value
+        self.latest = max(self.latest, t)
+        self.evict(self.latest)
+
+    def evict(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._items and self._items[0][0] < cutoff:
+            self.total -= heapq.heappop(self._items)[1]
+
+    @property
+    def count(self) -> int:
+        return len(self._items)
+
+    def mean(self):
+        return self.total / len(self._items) if self._items else None
+
+
+class WindowedHistogram:
+    """Fixed-bucket histogram over a sliding window; quantiles cost O(buckets), not O(samples)."""
+
+    def __init__(self, window_s: float, edges=LATENCY_EDGES_S):
+        self.window_s = window_s
+        self.edges = edges
+        self.counts = np.zeros(len(edges) + 1, dtype=np.int64)
+        self._items = []  # heap of (t, bucket), like WindowedMean
+        self.latest = float("-inf")
+
+    def add(self, t: float, value: float) -> None:
+        bucket = int(np.searchsorted(self.edges, value))
+        self.counts[bucket] += 1
+        heapq.heappush(self._items, (t, bucket))
+        self.latest = max(self.latest, t)
+        self.evict(self.latest)
+
+    def evict(self, now: float) -> None:
+        cutoff = now - self.window_s
+        while self._items and self._items[0][0] < cutoff:
+            self.counts[heapq.heappop(self._items)[1]] -= 1
+
+    @property
+    def count(self) -> int:
+        return len(self._items)
+
+    def quantile(self, q: float):
+        """Upper edge of the bucket holding the q-quantile."""
+        n = self.count
+        if n == 0:
+            return None
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q * n))
+        return float(self.edges[min(bucket, len(self.edges) - 1)])
+
+
+class LiveMetrics:
+    """Sliding-window power, utilisation, memory, throughput and latency for a running benchmark.
+
+    Samples and completions are timestamped with `clock` (the EnergyMonitor clock), so
+    they are windowed against the same timeline as the trace.
+    """
+
+    def __init__(self, clock=time.monotonic, windows=WINDOWS_S):
+        self.clock = clock
+        self.windows = windows
+        self._lock = threading.Lock()
+        self._gauges = {name: {w: WindowedMean(w) for w in windows}
+                        for name in ("power_W", "util_pct", "mem_used_MB")}
+        self._tokens = {w: WindowedMean(w) for w in windows}
+        self._latency = {w: WindowedHistogram(w) for w in windows}
+        self.requests_total = 0
+        self.samples_total = 0
+
+    def record_sample(self, t: float, power: float, util: float, mem_used: float) -> None:
+        with self._lock:
+            self.samples_total += 1
+            for name, value in (("power_W", power), ("util_pct", util), ("mem_used_MB", mem_used)):
+                for stat in self._gauges[name].values():
+                    stat.add(t, value)
+
+    def record_request(self, t_end: float, latency_s: float, completion_tokens: int = 0) -> None:
+        with self._lock:
+            self.requests_total += 1
+            for w in self.windows:
+                self._latency[w].add(t_end, latency_s)
+                self._tokens[w].add(t_end, completion_tokens or 0)
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        out = {"t_s": round(now, 3), "requests_total": self.requests_total, "samples_total": self.samples_total,
+               "windows": {}}
+        with self._lock:
+            for w in self.windows:
+                stats = {}
+                for name, per_window in self._gauges.items():
+                    per_window[w].evict(now)
+                    mean = per_window[w].mean()
+                    stats[f"{name}_avg"] = round(mean, 2) if mean is not None else None
+                hist = self._latency[w]
+                hist.evict(now)
+                self._tokens[w].evict(now)
+                # Early in the run a window is only as long as the run itself
+                span = min(w, now) if now > 0 else w
+                stats["requests_per_s"] = round(hist.count / span, 3)
+                stats["output_tok_per_s"] = round(self._tokens[w].total / span, 2)
+                for q in (0.5, 0.9, 0.99):
+                    value = hist.quantile(q)
+                    stats[f"latency_p{int(q * 100)}_s"] = round(value, 4) if value is not None else None
+                out["windows"][f"{w}s"] = stats
+        return out
+
+    def prometheus_text(self) -> str:
+        snap = self.snapshot()
+        lines = [
+            "# TYPE quanti_requests_total counter",
+            f"quanti_requests_total {snap['requests_total']}",
+            "# TYPE quanti_samples_total counter",
+            f"quanti_samples_total {snap['samples_total']}",
+        ]
+        for window, stats in snap["windows"].items():
+            for key, value in stats.items():
+                if value is None:
+                    continue
+                if key.startswith("latency_p"):
+                    q = "0." + key[len("latency_p"):-len("_s")]
+                    lines.append(f'quanti_latency_seconds{{window="{window}",quantile="{q}"}} {value}')
+                else:
+                    lines.append(f'quanti_{key}{{window="{window}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(live: LiveMetrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, ctype = json.dumps(live.snapshot()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = live.prometheus_text().encode(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📡 Live metrics on http://{host}:{port}/metrics (JSON: /metrics.json)")
+    return server
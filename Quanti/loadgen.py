@@ -0,0 +1,230 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """Keep-alive session owned by the calling worker thread."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+class _Sequencer:
+    """Hands results to `on_result` in submission order, whatever order they finish in."""
+
+    def __init__(self, on_result=None):
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.emitted = 0
+
+    def emit(self, pos, *item):
+        with self._lock:
+            self._pending[pos] = item
+            while self.emitted in self._pending:
+                ready = self._pending.pop(self.emitted)
+                self.emitted += 1
+                if self.on_result:
+                    self.on_result(*ready)
+
+
+def _timed_send(send, prompt, clock, origin, t_arrival=None):
+    t_send = clock() - origin
+    result = send(prompt)
+    t_end = clock() - origin
+    if t_arrival is None:
+        t_arrival = t_send
+    return result, {
+        "t_arrival_s": round(t_arrival, 6),
+        "t_send_s": round(t_send, 6),
+        "t_end_s": round(t_end, 6),
+        "queue_delay_s": round(max(0.0, t_send - t_arrival), 6),
+        "latency_s": round(t_end - t_arrival, 6),
+    }
+
+
+def run_closed_loop(prompts, send, concurrency: int = 1, on_result=None, clock=time.monotonic, origin=None,
+                    on_complete=None):
+    """Keep `concurrency` requests in flight until `prompts` is exhausted.
+
+    `prompts` yields (idx, prompt) pairs, `send(prompt)` performs one request and
+    `on_result(idx, prompt, result, timing)` is called in idx order, whatever order
+    the replies come back in. `on_complete`, with the same arguments, is called from
+    the worker as soon as its reply is in, for consumers (live metrics) that must not
+    wait behind a slow earlier request. Timings are seconds on `clock` since `origin`,
+    which defaults to the start of the call. Returns the number of prompts processed.
+    """
+    concurrency = max(1, int(concurrency))
+    source = iter(prompts)
+    source_lock = threading.Lock()
+    sequencer = _Sequencer(on_result)
+    state = {"next_pos": 0, "error": None}
+    origin = clock() if origin is None else origin
+
+    def take():
+        with source_lock:
+            if state["error"] is not None:
+                return None
+            try:
+                idx, prompt = next(source)
+            except StopIteration:
+                return None
+            pos = state["next_pos"]
+            state["next_pos"] += 1
+            return pos, idx, prompt
+
+    def worker():
+        try:
+            while True:
+                item = take()
+                if item is None:
+                    return
+                pos, idx, prompt = item
+                result, timing = _timed_send(send, prompt, clock, origin)
+                if on_complete:
+                    on_complete(idx, prompt, result, timing)
+                sequencer.emit(pos, idx, prompt, result, timing)
+        except Exception as e:
+            with source_lock:
+                state["error"] = e
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if state["error"] is not None:
+        raise state["error"]
+    return sequencer.emitted
+
+
+def run_open_loop(arrivals, send, max_in_flight: int = 256, on_result=None, clock=time.monotonic, origin=None,
+                  on_complete=None, sleep=time.sleep):
+    """Issue requests at their scheduled arrival times, independent of completions.
+
+    `arrivals` yields (idx, prompt, t_arrival_s) with non-decreasing offsets from the
+    start of the run. Requests that find all `max_in_flight` workers busy wait in the
+    executor queue, which shows up as queueing delay in their timing. Timings are
+    reported on `clock` since `origin`, and callbacks behave, like run_closed_loop;
+    `sleep` waits out the gap to the next arrival on that clock.
+    """
+    sequencer = _Sequencer(on_result)
+    errors = []
+    t0 = clock()
+    origin = t0 if origin is None else origin
+
+    def job(pos, idx, prompt, t_arrival):
+        try:
+            result, timing = _timed_send(send, prompt, clock, origin, t0 - origin + t_arrival)
+            if on_complete:
+                on_complete(idx, prompt, result, timing)
+            sequencer.emit(pos, idx, prompt, result, timing)
+        except Exception as e:
+            errors.append(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_in_flight))) as pool:
+        for pos, (idx, prompt, t_arrival) in enumerate(arrivals):
+            if errors:
+                break
+            delay = t_arrival - (clock() - t0)
+            if delay > 0:
+                sleep(delay)
+            pool.submit(job, pos, idx, prompt, t_arrival)
+
+    if errors:
+        raise errors[0]
+    return sequencer.emitted
+
+
+def poisson_arrival_stream(qps: float, seed: int = None):
+    """Endless arrival offsets (s) of a Poisson process with rate `qps`, first at 0; reproducible for a seed."""
+    rng = np.random.default_rng(seed)
+    t = 0.0
+    first = True
+    while True:
+        gaps = rng.exponential(1.0 / qps, size=4096)
+        if first:
+            gaps[0] = 0.0
+            first = False
+        for gap in gaps:
+            t += gap
+            yield t
+
+
+def replay_offsets(values):
+    """Arrival offsets (s) from a stream of epoch seconds or datetime strings, without buffering them."""
+    import pandas as pd
+
+    t0 = prev = None
+    for value in values:
+        t = float(value) if isinstance(value, (int, float, np.number)) else pd.Timestamp(value).timestamp()
+        if prev is not None and t < prev:
+            raise ValueError("replay column must be sorted by arrival time")
+        if t0 is None:
+            t0 = t
+        prev = t
+        yield t - t0
+
+
+class Reservoir:
+    """Uniform sample of at most `capacity` values from a stream (Algorithm R).
+
+    Exact while fewer than `capacity` values were added, so ordinary runs get exact
+    percentiles and multi-million-request runs keep bounded memory.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, seed: int = 0):
+        self.capacity = capacity
+        self.values = np.empty(min(capacity, 4096))
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, value: float) -> None:
+        if self.seen < self.capacity:
+            if self.seen == len(self.values):
+                self.values = np.resize(self.values, min(self.capacity, 2 * len(self.values)))
+            self.values[self.seen] = value
+        else:
+            j = self._rng.integers(0, self.seen + 1)
+            if j < self.capacity:
+                self.values[j] = value
+        self.seen += 1
+
+    def extend(self, values) -> None:
+        for v in values:
+            self.add(v)
+
+    def sample(self) -> np.ndarray:
+        return self.values[:min(self.seen, self.capacity)]
+
+
+def latency_summary(latencies, prefix: str = "latency") -> dict:
+    """p50/p90/p99/max of a latency sample, in seconds."""
+    lat = latencies.sample() if isinstance(latencies, Reservoir) else np.asarray(latencies, dtype=float)
+    if lat.size == 0:
+        return {}
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+    return {
+        f"{prefix}_p50_s": round(float(p50), 4),
+        f"{prefix}_p90_s": round(float(p90), 4),
+        f"{prefix}_p99_s": round(float(p99), 4),
+        f"{prefix}_max_s": round(float(lat.max()), 4),
+    }
+
+
+def throughput(n: int, duration_s: float) -> float:
+    return n / duration_s if duration_s > 0 else 0.0
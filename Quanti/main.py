@@ -1,5 +1,10 @@
+import shlex
 import sys
+from Quanti.agent_client import AgentClient
+from Quanti.retrieval import ResultRetriever
 from Quanti.uploader import upload_all_files
+from Quanti.transport import make_transport
+from Quanti.catalog import RunCatalog, run_number_of, workload_name
 from utils import *
 from ssh_manager import *
 
@@ -9,53 +14,122 @@ def main():
 
     print("🛠️ [0/4] Parsing input arguments...")
     args = parse_args(sys.argv[1:])
+    # One multiplexed SSH connection (or a local stand-in) carries every step of the run
+    transport = make_transport(args.host)
+
+    if args.teardown:
+        if AgentClient(transport).shutdown(stop_server=True):
+            print(f"🤖 Benchmark agent on {transport.host} stopped")
+        stop_remote_server(transport)
+        cleanup_server(transport)
+        return
+
     os.makedirs(args.output_dir, exist_ok=True)
-    print(f"✅ Input parsed: LLM={args.llm}, Workload={args.workload}")
+    # Set once every result file is verified against its remote checksum; gates remote cleanup
+    retrieved = False
+    # Catalog row reserved for this run, and why it is not (yet) done
+    run_id = None
+    failure = "interrupted"
+    print(f"✅ Input parsed: LLM={args.llm}, Workload={args.workload}, Concurrency={args.concurrency}, Host={args.host}")
 
     try:
         print("📡 [1/4] Setting up server...")
-        upload_all_files()
+        changed = upload_all_files(transport)
+        agent = AgentClient(transport) if args.agent else None
+        # The agent imported the old code; the next run starts a fresh one
+        if agent and any(path.endswith(".py") for path in changed) and agent.shutdown():
+            print("  🤖 Code changed, restarted the benchmark agent")
         print("✅ Server setup complete.")
 
         print("⚡ [2/4] Executing benchmark on server...")
-        workload_basename = os.path.basename(args.workload)
-        cmd = f"""ssh glg1 'cd ~/Quanti && source ~/vllm-env/bin/activate && python3 benchmark.py {args.llm} data/input/{workload_basename} {args.output_dir}'"""
+        # Numbered here: the host's ~/Quanti, and anything kept in it, is gone after a cold run
+        catalog = RunCatalog(args.catalog)
+        run_id, run_number = catalog.reserve(args.llm, args.workload, host=args.host,
+                                             number=run_number_of(args.output_dir))
+        catalog.close()
+        print(f"🗂️ Run {run_number} of {args.llm} / {workload_name(args.workload)} reserved in {args.catalog}")
+        # Synthetic specs are generated on the server; files were synced to data/input
+        if args.workload.startswith("synthetic:"):
+            remote_workload = quote(args.workload)
+        else:
+            remote_workload = f"data/input/{os.path.basename(args.workload)}"
+        bench_args = f"{args.llm} {remote_workload} {args.output_dir} {benchmark_flags(args)} --run-number {run_number}"
+        cmd = ("cd ~/Quanti && if [ -f ~/vllm-env/bin/activate ]; then source ~/vllm-env/bin/activate; fi && "
+               f"python3 benchmark.py {bench_args}")
 
-        print(f"📝 Executing: {cmd}")
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        # Leftovers of an earlier attempt of this run would be retrieved as part of it
+        transport.run(f"rm -rf ~/Quanti/{quote(args.output_dir)}")
+        print(f"📝 Executing on {transport.host}{' (agent)' if agent else ''}: {cmd}")
+        # Result files stream back while the benchmark is running
+        retriever = ResultRetriever(transport, f"~/Quanti/{args.output_dir}", args.output_dir,
+                                    interval_s=args.fetch_interval_s)
+        retriever.start()
+        try:
+            if agent:
+                # Output streams back line by line instead of arriving after the run
+                returncode = agent.run(shlex.split(bench_args), on_log=lambda line: print(f"  │ {line}"))
+                agent.close()
+                output = errors = ""
+            else:
+                result = transport.run(cmd)
+                returncode = result.returncode
+                output, errors = result.stdout.decode(errors="replace"), result.stderr.decode(errors="replace")
+        finally:
+            print("📥 [3/4] Retrieving the rest of the results...")
+            unverified = retriever.finish()
+        retrieved = not unverified
+        if unverified:
+            print(f"⚠️ Not verified against the server: {', '.join(unverified)}")
 
-        if result.returncode == 0:
+        if returncode == 0:
             print("✅ Benchmark completed successfully")
-            print("📤 Server output:")
-            print(result.stdout)
-            print("📥 [3/4] Downloading results...")
-            print(f"  📥 Downloading structured results to {args.output_dir}...")
-
-            os.makedirs(args.output_dir, exist_ok=True)
-
-            download_cmd = f"scp -O -r 'glg1:~/Quanti/{args.output_dir}/*' {args.output_dir}/"
-            result = subprocess.run(download_cmd, shell=True, capture_output=True, text=True)
+            if output:
+                print("📤 Server output:")
+                print(output)
 
-            if result.returncode == 0:
-                print(f"✅ Results downloaded to {args.output_dir}/")
+            if retrieved:
+                print(f"✅ Results retrieved and verified in {args.output_dir}/")
+                catalog = RunCatalog(args.catalog)
+                catalog.record_dir(args.output_dir, host=args.host, run_id=run_id)
+                catalog.close()
+                failure = None
+                print(f"  🗂️ Recorded in {args.catalog}")
                 print("  📋 Downloaded files:")
-                subprocess.run(f"find {args.output_dir} -name '*.json' -o -name '*.csv' | head -10", shell=True)
+                subprocess.run(f"find {args.output_dir} -name '*.json' -o -name '*.csv*' | head -10", shell=True)
             else:
-                print(f"⚠️ Structured download failed: {result.stderr}")
+                failure = "results not verified"
                 print("Check server output above for details")
+                sys.exit(1)
+        else:
+            failure = f"benchmark exited with {returncode}"
+            print(f"❌ Benchmark failed on server (exit {returncode}):")
+            print(output)
+            print(errors)
+            sys.exit(1)
 
     except KeyboardInterrupt:
         print("\n⚠️ Benchmark interrupted by user")
-        cleanup_server()
         sys.exit(130)
 
     except Exception as e:
+        failure = f"{type(e).__name__}: {e}"
         print(f"\n❌ Benchmark failed with error: {e}")
-        cleanup_server()
         sys.exit(1)
 
     finally:
-        cleanup_server()
+        if run_id is not None and failure:
+            catalog = RunCatalog(args.catalog)
+            catalog.fail(run_id, failure)
+            catalog.close()
+        # Warm runs leave the files and the loaded model in place for the next repeat, and the
+        # agent runs from ~/Quanti, so it only loses the run's outputs.
+        # Nothing is removed unless every result file made it back intact.
+        if not retrieved:
+            print(f"⚠️ Keeping ~/Quanti on {transport.host}: results were not retrieved and verified")
+        elif args.agent:
+            transport.run(f"rm -rf ~/Quanti/{quote(args.output_dir)}")
+        elif not args.warm:
+            cleanup_server(transport)
 
 
 if __name__ == "__main__":
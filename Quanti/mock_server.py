@@ -0,0 +1,203 @@
+"""Mock OpenAI-compatible completions server, so the client side can run without a GPU.
+
+Usage: python3 mock_server.py [--port 8000] [--ttft-s 0.05] [--decode-tok-per-s 60] [--max-num-seqs 32]
+                              [--prefill-tok-per-s 5000] [--batch-slowdown 0] [--jitter 0] [--workers 1]
+
+Serves /health, /v1/models and /v1/completions (plain and SSE streaming with usage).
+A request waits for one of max_num_seqs slots, then its first token arrives after
+ttft_s + prompt_tokens / prefill_tok_per_s and every further token 1 / decode_tok_per_s
+later, stretched by batch_slowdown per other active sequence. A rate of 0 means
+instant. jitter is the sigma of a lognormal factor on every delay. Prompt tokens are
+counted as words and the reply has max_tokens tokens.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_DEFAULTS = {
+    "ttft_s": 0.05,
+    "prefill_tok_per_s": 5_000.0,
+    "decode_tok_per_s": 60.0,
+    "max_num_seqs": 32,
+    "batch_slowdown": 0.0,
+    "jitter": 0.0,
+    "seed": None,
+}
+
+
+class MockModel:
+    """Latency and token-rate model shared by the handler threads of one server."""
+
+    def __init__(self, **params):
+        unknown = set(params) - set(MOCK_DEFAULTS)
+        if unknown:
+            raise ValueError(f"unknown mock parameters {sorted(unknown)}")
+        self.params = {**MOCK_DEFAULTS, **params}
+        seqs = self.params["max_num_seqs"]
+        self.slots = threading.BoundedSemaphore(seqs) if seqs else None
+        self.rng = random.Random(self.params["seed"])
+        self._lock = threading.Lock()
+        self.active = 0
+        self.requests = 0
+        self.completion_tokens = 0
+
+    def _noise(self) -> float:
+        sigma = self.params["jitter"]
+        if not sigma:
+            return 1.0
+        with self._lock:
+            return self.rng.lognormvariate(0.0, sigma)
+
+    def first_token_delay(self, prompt_tokens: int) -> float:
+        prefill = self.params["prefill_tok_per_s"]
+        return (self.params["ttft_s"] + (prompt_tokens / prefill if prefill else 0.0)) * self._noise()
+
+    def token_gap(self) -> float:
+        rate = self.params["decode_tok_per_s"]
+        if not rate:
+            return 0.0
+        return (1.0 + self.params["batch_slowdown"] * max(0, self.active - 1)) / rate * self._noise()
+
+    def __enter__(self):
+        if self.slots:
+            self.slots.acquire()
+        with self._lock:
+            self.active += 1
+            self.requests += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self.active -= 1
+        if self.slots:
+            self.slots.release()
+        return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle on, delayed ACKs add ~40 ms to each reply
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, body: dict, status: int = 200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._json({})
+        elif self.path == "/v1/models":
+            self._json({"object": "list", "data": [{"id": self.server.model_id, "object": "model"}]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/v1/completions":
+            self._json({"error": "not found"}, 404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt_tokens = len(str(body.get("prompt", "")).split())
+        n_out = max(0, int(body.get("max_tokens") or 16))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": n_out,
+                 "total_tokens": prompt_tokens + n_out}
+        model = self.server.model
+
+        with model:
+            time.sleep(model.first_token_delay(prompt_tokens))
+            if body.get("stream"):
+                self._stream(n_out, usage, bool((body.get("stream_options") or {}).get("include_usage")))
+            else:
+                time.sleep(sum(model.token_gap() for _ in range(max(0, n_out - 1))))
+                self._json({"object": "text_completion", "model": body.get("model"),
+                            "choices": [{"index": 0, "text": " tok" * n_out, "finish_reason": "length"}],
+                            "usage": usage})
+        with model._lock:
+            model.completion_tokens += n_out
+
+    def _stream(self, n_out: int, usage: dict, include_usage: bool):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        for i in range(n_out):
+            if i:
+                time.sleep(self.server.model.token_gap())
+            event(json.dumps({"choices": [{"index": 0, "text": " tok", "finish_reason": None}]}))
+        if include_usage:
+            event(json.dumps({"choices": [], "usage": usage}))
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_port = True  # several worker processes may share one port (Linux SO_REUSEPORT)
+
+    def __init__(self, port: int = 8000, host: str = "127.0.0.1", model_id: str = "mock", **params):
+        self.model = MockModel(**params)
+        self.model_id = model_id
+        super().__init__((host, port), MockHandler)
+
+
+def serve_in_thread(port: int = 8000, **params) -> MockServer:
+    """Start a mock server on a background thread; stop it with server.shutdown()."""
+    server = MockServer(port, **params)
+    threading.Thread(target=server.serve_forever, name=f"mock:{port}", daemon=True).start()
+    return server
+
+
+def _serve_forever(port: int, params: dict):
+    MockServer(port, **params).serve_forever()
+
+
+def start_workers(port: int, workers: int = 1, **params) -> list:
+    """Serve from `workers` separate processes sharing the port. Returns the processes."""
+    procs = [multiprocessing.Process(target=_serve_forever, args=(port, params), daemon=True)
+             for _ in range(max(1, workers))]
+    for p in procs:
+        p.start()
+    return procs
+
+
+def parse_mock_args(argv=None):
+    parser = argparse.ArgumentParser(prog="mock_server.py", description="Mock OpenAI-compatible completions server.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--host", default="127.0.0.1")
+    for name, default in MOCK_DEFAULTS.items():
+        kind = int if name in ("max_num_seqs", "seed") else float
+        parser.add_argument(f"--{name.replace('_', '-')}", type=kind, default=default,
+                            help=f"(default: {default})")
+    parser.add_argument("--workers", type=int, default=1, help="Server processes sharing the port (default: 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_mock_args(argv)
+    params = {name: getattr(args, name) for name in MOCK_DEFAULTS}
+    print(f"🧪 Mock completions server on {args.host}:{args.port} ({args.workers} worker(s)): {params}")
+    if args.workers > 1:
+        for p in start_workers(args.port, args.workers, **params):
+            p.join()
+    else:
+        MockServer(args.port, args.host, **params).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Regression gate: compare new runs against the baseline runs of the same model and workload.
+
+Usage: python3 -m Quanti.regression <run_dir_or_root> [...] [--baseline exp1_data/data | FILE.sqlite]
+                                    [--alpha 0.01] [--min-effect 0.05] [--metrics energy_Wh,...]
+                                    [--report regression.json]
+
+For every metric both sides report, a one-sided Mann-Whitney U test asks whether the
+new runs are worse than the baseline distribution (exact for small samples, by
+permutation when they have ties, normal approximation otherwise). A metric regresses
+when the test is significant at alpha (Bonferroni-corrected over the metrics of a
+cell) and the median moved the wrong way by more than --min-effect, so large
+baselines can't flag noise-sized shifts.
+With too few new or baseline runs even a complete separation is not significant at
+the corrected alpha; such metrics are reported as untestable along with the number of
+new runs that would be needed, instead of passing.
+Baseline runs only count when their load settings (concurrency, arrival, stream)
+match the new runs. energy_Wh is the trapezoid over the workload window; summaries
+written before that (average power x monitor duration, no energy_gross_Wh) have it
+recomputed from their stored energy trace, or lose their energy metrics if the trace is gone. Printed shifts are positive when the new runs are worse.
+Exit status: 0 no regression, 1 regression, 2 nothing to compare, 3 too few runs to decide.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import sqlite3
+import sys
+from statistics import NormalDist, median
+
+import numpy as np
+import pandas as pd
+
+from Quanti.batch_writer import find_file
+from Quanti.catalog import workload_name
+from energy import integrate_energy_j
+
+DEFAULT_BASELINE = "exp1_data/data"
+
+# +1: higher is worse, -1: lower is worse
+METRICS = {
+    "energy_Wh": 1,
+    "J_per_output_token": 1,
+    "workload_duration_s": 1,
+    "requests_per_s": -1,
+    "decode_tok_per_s": -1,
+    "latency_p50_s": 1,
+    "latency_p90_s": 1,
+    "latency_p99_s": 1,
+    "ttft_p99_s": 1,
+}
+# Load settings a baseline run must share with the new runs; older summaries predate the keys
+CONTEXT_DEFAULTS = {"concurrency": 1, "arrival": "closed", "stream": False}
+# Exact U distribution up to this many (new x baseline) pairs
+EXACT_MAX_PAIRS = 2_500
+# With ties, exact permutation test up to this many ways to pick the new runs from the pool
+EXACT_MAX_SPLITS = 200_000
+
+
+def find_summaries(root: str) -> list:
+    """(run_dir, summary) of root itself or of every run directory below it."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if "summary.json" in filenames:
+            try:
+                with open(os.path.join(dirpath, "summary.json")) as f:
+                    found.append((os.path.realpath(dirpath), json.load(f)))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {dirpath}: {e}")
+    return found
+
+
+def catalog_summaries(path: str) -> list:
+    """(run_dir, summary) of every finished run recorded in a run catalog."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT run_dir, summary FROM runs WHERE status = 'done' AND summary IS NOT NULL")
+        return [(os.path.realpath(d) if d else None, json.loads(s)) for d, s in rows]
+    finally:
+        conn.close()
+
+
+def load_baseline(source: str) -> list:
+    return catalog_summaries(source) if source.endswith(".sqlite") else find_summaries(source)
+
+
+def window_energy_wh(run_dir: str, summary: dict):
+    """Energy of a legacy summary's workload window, integrated from its trace; None without one.
+
+    The monitor of those runs started right before the workload, so the window is
+    [0, workload_duration_s] on the trace's clock.
+    """
+    trace = find_file(os.path.join(run_dir, "detailed", "energy_trace.csv")) if run_dir else None
+    if not trace or not os.path.exists(trace) or not summary.get("workload_duration_s"):
+        return None
+    df = pd.read_csv(trace, usecols=["t_local_s", "power_W"])
+    return integrate_energy_j(df["t_local_s"], df["power_W"], 0.0, summary["workload_duration_s"]) / 3600.0
+
+
+def run_metrics(summary: dict, run_dir: str = None) -> dict:
+    """The gated metrics of one run, on today's definitions.
+
+    Throughput is derived for summaries that predate requests_per_s, and legacy energy
+    (average power x monitor duration) is replaced by the workload-window integral.
+    """
+    values = {k: summary[k] for k in METRICS if isinstance(summary.get(k), (int, float))}
+    if "requests_per_s" not in values and summary.get("n_prompts") and summary.get("workload_duration_s"):
+        values["requests_per_s"] = summary["n_prompts"] / summary["workload_duration_s"]
+    if "energy_Wh" in values and "energy_gross_Wh" not in summary:
+        legacy = values.pop("energy_Wh")
+        per_token = values.pop("J_per_output_token", None)
+        energy = window_energy_wh(run_dir, summary)
+        if energy is None:
+            print(f"⚠️ {run_dir}: legacy energy_Wh without a trace to recompute it from, not compared")
+        else:
+            values["energy_Wh"] = energy
+            if per_token is not None and legacy:
+                values["J_per_output_token"] = per_token * energy / legacy
+    return values
+
+
+def cell_key(summary: dict) -> tuple:
+    context = tuple(summary.get(k, v) for k, v in CONTEXT_DEFAULTS.items())
+    return (summary.get("llm") or summary.get("model"), workload_name(summary.get("workload")), *context)
+
+
+def u_statistic(x, y) -> float:
+    """Mann-Whitney U of x over y: pairs with x > y, ties counting one half."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return float((x[:, None] > y[None, :]).sum() + 0.5 * (x[:, None] == y[None, :]).sum())
+
+
+def u_distribution(m: int, n: int) -> np.ndarray:
+    """Null counts of U = 0..m*n for samples of sizes m and n (Gaussian binomial coefficients)."""
+    size = m * n + 1
+    # rows[k] holds the coefficients of [N choose k]_q while N grows to m + n
+    rows = [np.zeros(size) for _ in range(m + 1)]
+    rows[0][0] = 1.0
+    for total in range(1, m + n + 1):
+        for k in range(min(total, m), 0, -1):
+            shifted = np.zeros(size)
+            if k <= total - 1:
+                shifted[k:] = rows[k][:size - k]
+            rows[k] = rows[k - 1] + shifted
+    return rows[m]
+
+
+def midranks(values: np.ndarray) -> np.ndarray:
+    """1-based ranks, tied values sharing the mean of their ranks."""
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    upper = np.cumsum(counts)
+    return ((upper - counts + 1 + upper) / 2.0)[inverse]
+
+
+def permutation_p(pooled: np.ndarray, m: int, u: float) -> float:
+    """Exact P(U >= u) over every way of drawing m of the pooled values as the new sample."""
+    ranks = midranks(pooled)
+    splits = np.array(list(itertools.combinations(range(len(pooled)), m)))
+    u_null = ranks[splits].sum(axis=1) - m * (m + 1) / 2.0
+    return float((u_null >= u - 1e-9).mean())
+
+
+def mann_whitney_greater(x, y) -> float:
+    """One-sided p-value that x is stochastically greater than y."""
+    m, n = len(x), len(y)
+    u = u_statistic(x, y)
+    pooled = np.concatenate([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+    _, ties = np.unique(pooled, return_counts=True)
+    if m * n <= EXACT_MAX_PAIRS and (ties == 1).all():
+        counts = u_distribution(m, n)
+        return float(counts[int(round(u)):].sum() / counts.sum())
+    # The normal approximation is far off for a handful of runs, e.g. repeats that tie each other
+    if math.comb(m + n, m) <= EXACT_MAX_SPLITS:
+        return permutation_p(pooled, m, u)
+    total = m + n
+    tie_term = float((ties ** 3 - ties).sum()) / (total * (total - 1))
+    sd = (m * n / 12.0 * ((total + 1) - tie_term)) ** 0.5
+    if sd == 0:
+        return 1.0
+    z = (u - m * n / 2.0 - 0.5) / sd
+    return 1.0 - NormalDist().cdf(z)
+
+
+def min_p_value(m: int, n: int) -> float:
+    """Smallest p mann_whitney_greater can return for m new and n baseline runs: every new run worse."""
+    return mann_whitney_greater(np.arange(n, n + m), np.arange(n))
+
+
+def runs_needed(n: int, alpha: float, limit: int = 100) -> int:
+    """Fewest new runs against n baseline runs whose best case is significant at alpha (None above limit)."""
+    return next((m for m in range(1, limit + 1) if min_p_value(m, n) < alpha), None)
+
+
+def compare_metric(new: list, base: list, worse: int) -> dict:
+    """Test and effect size of one metric; values are flipped so larger always means worse."""
+    new_w = [v * worse for v in new]
+    base_w = [v * worse for v in base]
+    med_new, med_base = median(new), median(base)
+    shift = (med_new - med_base) * worse / abs(med_base) if med_base else 0.0
+    return {
+        "n_new": len(new),
+        "n_baseline": len(base),
+        "median_new": round(med_new, 6),
+        "median_baseline": round(med_base, 6),
+        "rel_shift": round(shift, 6),  # > 0: worse
+        "rank_biserial": round(2 * u_statistic(new_w, base_w) / (len(new) * len(base)) - 1, 4),
+        "p_value": mann_whitney_greater(new_w, base_w),
+    }
+
+
+def check(new_runs: list, baseline: list, alpha: float = 0.01, min_effect: float = 0.05, metrics=None) -> list:
+    """One result per (cell, metric); a result regresses when significant and larger than min_effect."""
+    metrics = metrics or list(METRICS)
+    new_dirs = {d for d, _ in new_runs}
+    base_by_cell = {}
+    for run_dir, summary in baseline:
+        # A new run that also sits in the baseline tree must not be compared with itself
+        if run_dir not in new_dirs:
+            base_by_cell.setdefault(cell_key(summary), []).append(run_metrics(summary, run_dir))
+    new_by_cell = {}
+    for run_dir, summary in new_runs:
+        new_by_cell.setdefault(cell_key(summary), []).append(run_metrics(summary, run_dir))
+
+    results = []
+    for cell, runs in sorted(new_by_cell.items(), key=lambda kv: str(kv[0])):
+        base = base_by_cell.get(cell, [])
+        if not base:
+            print(f"⚠️ No baseline runs for {cell[0]} / {cell[1]} "
+                  f"({', '.join(f'{k}={v}' for k, v in zip(CONTEXT_DEFAULTS, cell[2:]))})")
+            continue
+        tested = []
+        for metric in metrics:
+            new_vals = [r[metric] for r in runs if metric in r]
+            base_vals = [r[metric] for r in base if metric in r]
+            if new_vals and base_vals:
+                tested.append({"model": cell[0], "workload": cell[1], "metric": metric,
+                               **compare_metric(new_vals, base_vals, METRICS[metric])})
+        for result in tested:
+            result["alpha"] = alpha / len(tested)
+            # No outcome of this many runs could reach alpha, so a pass here would mean nothing
+            result["testable"] = min_p_value(result["n_new"], result["n_baseline"]) < result["alpha"]
+            if not result["testable"]:
+                result["runs_needed"] = runs_needed(result["n_baseline"], result["alpha"])
+            result["regression"] = (result["testable"] and result["p_value"] < result["alpha"]
+                                    and result["rel_shift"] > min_effect)
+        results.extend(tested)
+    return results
+
+
+def parse_regression_args(argv=None):
+    parser = argparse.ArgumentParser(prog="regression.py",
+                                     description="Flag new runs that are significantly worse than the baseline.")
+    parser.add_argument("runs", nargs="+", help="New run directories, or directories holding them")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help=f"Baseline run directories or a run catalog .sqlite (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--alpha", type=float, default=0.01,
+                        help="Significance level per cell, split over its metrics (default: 0.01)")
+    parser.add_argument("--min-effect", type=float, default=0.05,
+                        help="Relative median shift a regression must exceed (default: 0.05)")
+    parser.add_argument("--metrics", type=lambda s: [m for m in s.split(",") if m], default=None,
+                        help=f"Comma-separated metrics to gate on (default: {','.join(METRICS)})")
+    parser.add_argument("--report", default=None, help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    unknown = [m for m in args.metrics or [] if m not in METRICS]
+    if unknown:
+        parser.error(f"unknown metric(s) {unknown}, expected some of {list(METRICS)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_regression_args(argv)
+    new_runs = [run for root in args.runs for run in find_summaries(root)]
+    baseline = load_baseline(args.baseline)
+    print(f"🔎 {len(new_runs)} new run(s) against {len(baseline)} baseline run(s) from {args.baseline}")
+    results = check(new_runs, baseline, args.alpha, args.min_effect, args.metrics)
+
+    for r in results:
+        mark = "❌" if r["regression"] else "✅" if r["testable"] else "❔"
+        print(f"  {mark} {r['model']:16s} {r['workload']:20s} {r['metric']:20s} "
+              f"{r['median_baseline']:>12.4f} -> {r['median_new']:<12.4f} {r['rel_shift']:+8.2%}  "
+              f"p={r['p_value']:.2g} (n={r['n_new']} vs {r['n_baseline']})")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"alpha": args.alpha, "min_effect": args.min_effect, "baseline": args.baseline,
+                       "results": results}, f, indent=2)
+
+    if not results:
+        print("❌ Nothing to compare: no new run has baseline runs of the same model, workload and load")
+        return 2
+    regressions = [r for r in results if r["regression"]]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): " + ", ".join(
+            f"{r['model']}/{r['workload']} {r['metric']}" for r in regressions))
+        return 1
+    untestable = [r for r in results if not r["testable"]]
+    if untestable:
+        for r in untestable:
+            needed = f"needs {r['runs_needed']} new runs" if r["runs_needed"] else "needs more baseline runs"
+            print(f"  ❔ {r['model']}/{r['workload']} {r['metric']}: {r['n_new']} new vs {r['n_baseline']} "
+                  f"baseline run(s) can't reach alpha={r['alpha']:.2g} ({needed})")
+        print(f"❌ Insufficient runs: {len(untestable)} metric(s) could not have failed the gate")
+        return 3
+    print("✅ No significant regression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Incremental retrieval of a run's output directory while the benchmark is still running.
+
+A ResultRetriever polls the remote directory over any transport (SSH, or the local
+stand-in) and fetches the bytes each file gained since the last poll, gzip-compressed
+on the wire. Result files only grow while a run is going, so by the time the benchmark
+exits little is left to transfer. finish() does a last pass and then compares the
+sha256 of every local file with the remote one, refetching whole files that were
+rewritten; only a verified retrieval should let the caller clean up the remote side.
+"""
+import gzip
+import json
+import os
+import shlex
+import threading
+import zlib
+
+from Quanti.transport import remote_quote
+from Quanti.uploader import file_digest
+
+CHECKSUMS = "checksums.json"
+
+
+class ResultRetriever:
+    def __init__(self, transport, remote_dir: str, local_dir: str, interval_s: float = 10.0):
+        self.transport = transport
+        self.remote_dir = remote_dir
+        self.local_dir = local_dir
+        self.interval_s = interval_s
+        self.fetched = {}  # relative path -> bytes held locally
+        self.wire_bytes = 0
+        self.file_bytes = 0
+        self._stop = threading.Event()
+        self._thr = None
+
+    def _remote(self, cmd: str) -> bytes:
+        result = self.transport.run(f"cd {remote_quote(self.remote_dir)} && {cmd}")
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors="replace").strip() or f"exit {result.returncode}")
+        return result.stdout
+
+    def listing(self) -> dict:
+        """{relative path: size} of every file in the remote directory ({} until it exists)."""
+        d = remote_quote(self.remote_dir)
+        result = self.transport.run(f"if [ -d {d} ]; then cd {d} && find . -type f -printf '%P\\t%s\\n'; fi")
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors="replace").strip() or f"exit {result.returncode}")
+        out = result.stdout
+        files = {}
+        for line in out.decode(errors="replace").splitlines():
+            path, _, size = line.rpartition("\t")
+            if path:
+                files[path] = int(size)
+        return files
+
+    def checksums(self, paths: list) -> dict:
+        """{relative path: sha256} of remote files."""
+        if not paths:
+            return {}
+        out = self._remote("sha256sum -- " + " ".join(shlex.quote(p) for p in paths))
+        sums = {}
+        for line in out.decode(errors="replace").splitlines():
+            digest, _, path = line.partition("  ")
+            sums[path] = digest
+        return sums
+
+    def fetch(self, path: str, offset: int, size: int) -> None:
+        """Bring bytes [offset, size) of a remote file into the local copy."""
+        compress = not path.endswith(".gz")
+        cmd = f"tail -c +{offset + 1} {shlex.quote(path)} | head -c {size - offset}"
+        data = self._remote(f"{cmd} | gzip -1" if compress else cmd)
+        self.wire_bytes += len(data)
+        if compress:
+            try:
+                data = gzip.decompress(data)
+            except (OSError, EOFError, zlib.error) as e:
+                raise RuntimeError(f"corrupt transfer of {path}: {e}")
+        if len(data) != size - offset:
+            raise RuntimeError(f"short read of {path}: {len(data)} of {size - offset} bytes")
+
+        local = os.path.join(self.local_dir, path)
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        with open(local, "r+b" if offset else "wb") as fh:
+            fh.truncate(offset)
+            fh.seek(offset)
+            fh.write(data)
+        self.fetched[path] = size
+        self.file_bytes += len(data)
+
+    def sync(self) -> int:
+        """Fetch what changed since the last call. Returns the number of files touched."""
+        touched = 0
+        for path, size in sorted(self.listing().items()):
+            have = self.fetched.get(path, 0)
+            if size == have and path in self.fetched:
+                continue
+            # A file that shrank was rewritten, not appended to
+            try:
+                self.fetch(path, have if size > have else 0, size)
+                touched += 1
+            except RuntimeError as e:
+                print(f"  ⚠️ Could not fetch {path} yet: {e}")
+        return touched
+
+    def start(self) -> None:
+        def loop():
+            while not self._stop.wait(self.interval_s):
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"  ⚠️ Incremental retrieval poll failed: {e}")
+
+        if self.interval_s > 0:
+            self._thr = threading.Thread(target=loop, name="retriever", daemon=True)
+            self._thr.start()
+
+    def finish(self, retries: int = 2) -> list:
+        """Final pass plus checksum verification. Returns the paths that could not be verified."""
+        self._stop.set()
+        if self._thr:
+            self._thr.join()
+        self.sync()
+        remote = self.listing()
+        for path in set(self.fetched) - set(remote):
+            # Temporary files that were fetched mid-run and are gone now
+            self.fetched.pop(path)
+            try:
+                os.remove(os.path.join(self.local_dir, path))
+            except OSError:
+                pass
+
+        sums = self.checksums(sorted(remote))
+        bad = []
+        for path, size in sorted(remote.items()):
+            local = os.path.join(self.local_dir, path)
+            for attempt in range(retries + 1):
+                if os.path.exists(local) and file_digest(local) == sums.get(path):
+                    break
+                if attempt < retries:
+                    # Same size but different content (rewritten in place): take the whole file again
+                    try:
+                        self.fetch(path, 0, size)
+                    except RuntimeError as e:
+                        print(f"  ⚠️ Refetching {path} failed: {e}")
+            else:
+                bad.append(path)
+
+        if not bad and remote:
+            with open(os.path.join(self.local_dir, CHECKSUMS), "w") as f:
+                json.dump(sums, f, indent=1, sort_keys=True)
+        print(f"  📥 Retrieved {len(remote)} file(s): {self.file_bytes / 2**20:.2f} MiB "
+              f"in {self.wire_bytes / 2**20:.2f} MiB over the wire")
+        return bad
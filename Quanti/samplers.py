@@ -0,0 +1,284 @@
+import csv
+import glob
+import os
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+
+from batch_writer import open_text
+
+TRACE_COLUMNS = ["t_local_s", "timestamp", "power_W", "util_pct", "mem_used_MB", "mem_total_MB"]
+SMI_TIME_FORMAT = "%Y/%m/%d %H:%M:%S.%f"
+
+
+class Sampler:
+    """GPU power source for EnergyMonitor.
+
+    samples(stop) yields (epoch_s, power_W, util_pct, mem_used_MB, mem_total_MB) until
+    `stop` is set or the source runs dry. interrupt() may be called from another
+    thread to unblock it; close() releases the backend once sampling has ended.
+    """
+    name = "base"
+
+    def __init__(self, interval_ms: float = 100):
+        self.interval_ms = interval_ms
+
+    def samples(self, stop):
+        raise NotImplementedError
+
+    def interrupt(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class NvidiaSmiSampler(Sampler):
+    """Parses the text stream of `nvidia-smi -lms`. Works everywhere the driver does."""
+    name = "nvidia-smi"
+
+    def __init__(self, interval_ms: float = 100):
+        super().__init__(interval_ms)
+        self._proc = None
+
+    def samples(self, stop):
+        q = "timestamp,power.draw,utilization.gpu,memory.used,memory.total"
+        cmd = f"nvidia-smi --query-gpu={q} --format=csv,noheader,nounits -lms {int(self.interval_ms)}"
+        self._proc = subprocess.Popen(
+            cmd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+
+        for line in self._proc.stdout:
+            if stop.is_set():
+                break
+
+            parts = [p.strip() for p in line.strip().split(",")]
+            if len(parts) < 5:
+                continue
+
+            try:
+                stamp = datetime.strptime(parts[0], SMI_TIME_FORMAT).timestamp()
+            except ValueError:
+                stamp = time.time()
+            try:
+                yield stamp, float(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])
+            except ValueError:
+                continue
+
+    def interrupt(self):
+        if self._proc:
+            try:
+                self._proc.terminate()
+                self._proc.wait(timeout=5)
+            except Exception:
+                try:
+                    self._proc.kill()
+                except Exception:
+                    pass
+
+
+class NvmlSampler(Sampler):
+    """Polls the driver directly through NVML, fast enough for sub-10 ms intervals."""
+    name = "nvml"
+
+    def __init__(self, interval_ms: float = 10, device_index: int = 0):
+        super().__init__(interval_ms)
+        import pynvml  # shipped with vLLM as nvidia-ml-py
+
+        self._nvml = pynvml
+        pynvml.nvmlInit()
+        self._handle = pynvml.nvmlDeviceGetHandleByIndex(device_index)
+
+    def samples(self, stop):
+        nvml = self._nvml
+        period = self.interval_ms / 1000.0
+        next_tick = time.monotonic()
+        while not stop.is_set():
+            power = nvml.nvmlDeviceGetPowerUsage(self._handle) / 1000.0
+            util = nvml.nvmlDeviceGetUtilizationRates(self._handle).gpu
+            mem = nvml.nvmlDeviceGetMemoryInfo(self._handle)
+            yield time.time(), power, float(util), mem.used / 2**20, mem.total / 2**20
+
+            # Sleep to the next tick rather than for a fixed period, so jitter doesn't accumulate
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                stop.wait(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def close(self):
+        try:
+            self._nvml.nvmlShutdown()
+        except Exception:
+            pass
+
+
+class ReplaySampler(Sampler):
+    """Replays a recorded energy_trace.csv, so the monitor can run on machines without a GPU.
+
+    speed=1 keeps the recorded spacing, larger values replay faster and speed=0 emits
+    every sample immediately.
+    """
+    name = "replay"
+
+    def __init__(self, trace_csv: str, speed: float = 1.0, loop: bool = False):
+        super().__init__(0)
+        self.trace_csv = trace_csv
+        self.speed = speed
+        self.loop = loop
+
+    def _rows(self):
+        with open_text(self.trace_csv) as fh:
+            for row in csv.DictReader(fh):
+                yield (float(row["t_local_s"]), float(row["power_W"]), float(row["util_pct"]),
+                       float(row["mem_used_MB"]), float(row["mem_total_MB"]))
+
+    def samples(self, stop):
+        while True:
+            t_first = None
+            t_wall = time.monotonic()
+            for t_rec, power, util, mem_used, mem_total in self._rows():
+                if stop.is_set():
+                    return
+                if t_first is None:
+                    t_first = t_rec
+                if self.speed > 0:
+                    delay = t_wall + (t_rec - t_first) / self.speed - time.monotonic()
+                    if delay > 0:
+                        stop.wait(delay)
+                yield time.time(), power, util, mem_used, mem_total
+            if not self.loop:
+                return
+
+
+class RaplSampler:
+    """CPU package / DRAM energy from the Linux powercap (RAPL) sysfs counters.
+
+    Unlike the GPU samplers this one is read on demand: EnergyMonitor calls read()
+    next to every GPU sample. Counters are cumulative microjoules that wrap at
+    max_energy_range_uj, so deltas are wrap-corrected. `root` can point at a fake
+    tree with the same layout for testing.
+    """
+
+    def __init__(self, root: str = "/sys/class/powercap"):
+        self.root = root
+        self.domains = {}
+        for zone in sorted(glob.glob(os.path.join(root, "intel-rapl:*"))):
+            try:
+                name = _read_text(os.path.join(zone, "name"))
+                max_range = int(_read_text(os.path.join(zone, "max_energy_range_uj")))
+                int(_read_text(os.path.join(zone, "energy_uj")))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping RAPL zone {zone}: {e}")
+                continue
+            # Sub-zones (intel-rapl:0:2) are named after their parent package
+            parts = os.path.basename(zone).split(":")
+            if len(parts) > 2:
+                parent = _read_text(os.path.join(root, ":".join(parts[:2]), "name"))
+                name = f"{parent}_{name}"
+            self.domains[name] = {
+                "path": os.path.join(zone, "energy_uj"),
+                "max_range": max_range,
+                "top_level": len(parts) == 2,
+            }
+        if not self.domains:
+            raise RuntimeError(f"No readable RAPL zones under {root}")
+        self._last = {}
+        self._last_t = None
+
+    @property
+    def host_domains(self) -> list:
+        """Domains that don't overlap: top-level packages plus DRAM sub-zones (psys would double count)."""
+        return [name for name, d in self.domains.items()
+                if (d["top_level"] and not name.startswith("psys")) or name.endswith("dram")]
+
+    def read(self) -> dict:
+        """Average power (W) of each domain since the previous read; zeros on the first read."""
+        now = time.monotonic()
+        dt = now - self._last_t if self._last_t is not None else 0.0
+        power = {}
+        for name, d in self.domains.items():
+            try:
+                cur = int(_read_text(d["path"]))
+            except (OSError, ValueError):
+                power[name] = 0.0
+                continue
+            prev = self._last.get(name, cur)
+            delta = cur - prev if cur >= prev else cur + d["max_range"] - prev
+            self._last[name] = cur
+            power[name] = delta / 1e6 / dt if dt > 0 else 0.0
+        self._last_t = now
+        return power
+
+
+def _read_text(path: str) -> str:
+    with open(path) as fh:
+        return fh.read().strip()
+
+
+def make_sampler(spec: str = "auto", interval_ms: float = 100) -> Sampler:
+    """Build a sampler from a CLI spec: auto, nvml, nvidia-smi or replay:<trace.csv>."""
+    if spec.startswith("replay:"):
+        return ReplaySampler(spec[len("replay:"):])
+    if spec == "nvidia-smi":
+        return NvidiaSmiSampler(interval_ms)
+    if spec == "nvml":
+        return NvmlSampler(interval_ms)
+    if spec == "auto":
+        try:
+            return NvmlSampler(interval_ms)
+        except Exception as e:
+            print(f"⚠️ NVML unavailable ({e}), falling back to nvidia-smi")
+            return NvidiaSmiSampler(interval_ms)
+    raise ValueError(f"Unknown sampler: {spec}")
+
+
+class SampleRing:
+    """Preallocated ring of numeric samples, drained to the trace file in bulk.
+
+    Rows are (t_local_s, epoch_s, power_W, util_pct, mem_used_MB, mem_total_MB),
+    followed by one power column per extra (e.g. RAPL) domain. The monitor drains
+    it before it fills, so no sample is overwritten unwritten.
+    """
+
+    def __init__(self, capacity: int = 4096, width: int = 6):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, width), dtype=np.float64)
+        self.count = 0
+        self.flushed = 0
+
+    @property
+    def pending(self) -> int:
+        return self.count - self.flushed
+
+    def append(self, row) -> None:
+        self.data[self.count % self.capacity] = row
+        self.count += 1
+
+    def _span(self, start: int, stop: int) -> np.ndarray:
+        idx = np.arange(start, stop) % self.capacity
+        return self.data[idx]
+
+    def drain(self) -> np.ndarray:
+        """Rows appended since the previous drain, oldest first."""
+        rows = self._span(self.flushed, self.count)
+        self.flushed = self.count
+        return rows
+
+
+def format_trace_rows(rows: np.ndarray) -> str:
+    """Render drained ring rows as energy_trace.csv lines."""
+    lines = []
+    for t_loc, stamp, power, util, mem_used, mem_total, *extra in rows:
+        ts = datetime.fromtimestamp(stamp).strftime(SMI_TIME_FORMAT)[:-3]
+        tail = "".join(f",{x:.2f}" for x in extra)
+        lines.append(f"{t_loc:.3f},{ts},{power:.1f},{util:.1f},{mem_used:.1f},{mem_total:.1f}{tail}\n")
+    return "".join(lines)
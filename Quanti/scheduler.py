@@ -0,0 +1,420 @@
+"""Resumable runner for the experiment matrix (models x workloads x repeats).
+
+Usage: python3 -m Quanti.scheduler <matrix.json> [--warm] [--agent] [--status] [--hosts glg1,glg2] [--adaptive]
+
+The matrix file declares what to run; progress is kept in a state file next to the
+outputs so an interrupted sweep picks up exactly where it stopped. In adaptive mode a
+cell stops early once its repeats pin energy and duration down to the target precision.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from statistics import NormalDist, mean, stdev
+
+from Quanti.batch_writer import find_file, open_text
+from Quanti.catalog import workload_name
+from Quanti.hostpool import Host, HostPool, cell_of, write_host_info
+
+QUANTI_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PENDING, DONE, FAILED, SKIPPED = "pending", "done", "failed", "skipped"
+
+ADAPTIVE_DEFAULTS = {
+    "metrics": ["energy_Wh", "duration_s"],
+    "confidence": 0.95,
+    # Stop when the CI half-width is within this fraction of the mean for every metric
+    "rel_half_width": 0.01,
+    "min_repeats": 5,
+    # Flag cells whose coefficient of variation exceeds this
+    "max_cv": 0.05,
+}
+
+
+def load_matrix(path: str) -> dict:
+    with open(path) as f:
+        matrix = json.load(f)
+    for key in ("models", "workloads", "repeats"):
+        if key not in matrix:
+            raise ValueError(f"matrix file {path} is missing '{key}'")
+    matrix.setdefault("output_dir", "data/outputs")
+    matrix.setdefault("args", [])
+    matrix.setdefault("max_attempts", 3)
+    if matrix.get("adaptive") is not None:
+        matrix["adaptive"] = {**ADAPTIVE_DEFAULTS, **(matrix["adaptive"] or {})}
+    return matrix
+
+
+def t_quantile(p: float, df: int) -> float:
+    """Student-t quantile from the normal one via the Cornish-Fisher expansion (no scipy needed)."""
+    z = NormalDist().inv_cdf(p)
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    g4 = (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df ** 2 + g3 / df ** 3 + g4 / df ** 4
+
+
+def cell_verdict(values: dict, cfg: dict) -> dict:
+    """Whether a cell's finished repeats meet the adaptive stopping rule.
+
+    `values` maps metric name -> list of per-run values. A cell converges once it has
+    min_repeats runs and every metric's confidence interval is narrow enough; it is
+    flagged when any metric varies more than max_cv.
+    """
+    n = min((len(v) for v in values.values()), default=0)
+    verdict = {"n": n, "converged": False, "high_variance": False, "metrics": {}}
+    if n < 2:
+        return verdict
+    t = t_quantile(0.5 + cfg["confidence"] / 2, n - 1)
+    narrow = True
+    for metric, vals in values.items():
+        m, sd = mean(vals), stdev(vals)
+        rel = t * sd / n ** 0.5 / abs(m) if m else float("inf")
+        cv = sd / abs(m) if m else float("inf")
+        verdict["metrics"][metric] = {"mean": round(m, 6), "rel_half_width": round(rel, 6), "cv": round(cv, 6)}
+        narrow &= rel <= cfg["rel_half_width"]
+        # A handful of runs gives a noisy CV, so only judge variance from min_repeats on
+        verdict["high_variance"] |= cv > cfg["max_cv"] and n >= cfg["min_repeats"]
+    verdict["converged"] = narrow and n >= cfg["min_repeats"]
+    return verdict
+
+
+def run_dir_for(output_dir: str, model: str, workload: str, repeat: int) -> str:
+    """Same layout exp1.sh always used: <out>/<model>_<wl>/rNN_<model>_<wl>."""
+    wl_name = workload_name(workload)
+    return os.path.join(output_dir, f"{model}_{wl_name}", f"r{repeat:02d}_{model}_{wl_name}")
+
+
+def expand_matrix(matrix: dict) -> list:
+    """All runs of the matrix, grouped by model so each model is loaded once per sweep."""
+    runs = []
+    for model in matrix["models"]:
+        for workload in matrix["workloads"]:
+            for r in range(matrix["repeats"]):
+                runs.append({
+                    "key": f"{model}|{workload}|{r}",
+                    "model": model,
+                    "workload": workload,
+                    "repeat": r,
+                    "run_dir": run_dir_for(matrix["output_dir"], model, workload, r),
+                })
+    return runs
+
+
+def validate_run_dir(run_dir: str) -> str:
+    """Empty string if run_dir holds a usable run, otherwise the reason it doesn't."""
+    summary = os.path.join(run_dir, "summary.json")
+    trace = find_file(os.path.join(run_dir, "detailed", "energy_trace.csv"))
+    try:
+        with open(summary) as f:
+            json.load(f)
+    except (OSError, ValueError) as e:
+        return f"bad summary.json ({e.__class__.__name__})"
+    try:
+        with open_text(trace) as f:
+            f.readline()
+            if not f.readline():
+                return "energy_trace.csv has no samples"
+    except OSError:
+        return "missing energy_trace.csv"
+    return ""
+
+
+class RunState:
+    """Persistent done/failed/pending record per run, rewritten atomically after every change."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.runs = {}
+        self.cells = {}
+        # Pool workers update runs concurrently; a save must not see a half-applied update
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            self.runs = saved.get("runs", {})
+            self.cells = saved.get("cells", {})
+
+    def get(self, key: str) -> dict:
+        return self.runs.setdefault(key, {"status": PENDING, "attempts": 0})
+
+    def update(self, key: str, **fields) -> None:
+        with self._lock:
+            self.get(key).update(fields, updated=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            self.save()
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            # A temp file of its own, so a save from another process cannot replace it under us
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"runs": self.runs, "cells": self.cells}, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def counts(self, keys) -> dict:
+        out = {PENDING: 0, DONE: 0, FAILED: 0, SKIPPED: 0}
+        for key in keys:
+            out[self.get(key)["status"]] += 1
+        return out
+
+
+def reconcile(runs: list, state: RunState) -> None:
+    """Trust the disk over the state file: valid run dirs are done, invalid 'done' runs are redone."""
+    for run in runs:
+        entry = state.get(run["key"])
+        problem = validate_run_dir(run["run_dir"])
+        if not problem and entry["status"] != DONE:
+            entry.update(status=DONE, run_dir=run["run_dir"])
+        elif problem and entry["status"] == DONE:
+            entry.update(status=PENDING, last_error=problem)
+    state.save()
+
+
+def cell_key(run: dict) -> str:
+    return f"{run['model']}|{run['workload']}"
+
+
+def update_cell(runs: list, state: RunState, cfg: dict, key: str) -> dict:
+    """Recompute the stopping verdict of one cell from the summaries of its finished runs."""
+    values = {metric: [] for metric in cfg["metrics"]}
+    for run in runs:
+        if cell_key(run) != key or state.get(run["key"])["status"] != DONE:
+            continue
+        try:
+            with open(os.path.join(QUANTI_DIR, run["run_dir"], "summary.json")) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if all(isinstance(summary.get(metric), (int, float)) for metric in values):
+            for metric in values:
+                values[metric].append(float(summary[metric]))
+
+    verdict = cell_verdict(values, cfg)
+    previous = state.cells.get(key, {})
+    state.cells[key] = verdict
+    state.save()
+    if verdict["converged"] and not previous.get("converged"):
+        print(f"🎯 {key} converged after {verdict['n']} repeats")
+    if verdict["high_variance"] and not previous.get("high_variance"):
+        print(f"⚠️ {key} has unexpectedly high variance: {verdict['metrics']}")
+    return verdict
+
+
+def is_converged(state: RunState, run: dict) -> bool:
+    return state.cells.get(cell_key(run), {}).get("converged", False)
+
+
+def needs_run(state: RunState, run: dict, max_attempts: int) -> bool:
+    entry = state.get(run["key"])
+    return entry["status"] not in (DONE, SKIPPED) and entry["attempts"] < max_attempts
+
+
+def main_command(run: dict, extra_args: list) -> list:
+    return [sys.executable, "-m", "Quanti.main", run["model"], run["workload"],
+            "--output-dir", run["run_dir"], *extra_args]
+
+
+def execute_local(run: dict, extra_args: list) -> str:
+    """Run one cell through Quanti.main, as exp1.sh did. Returns an error string, empty on success."""
+    # Leftovers of an earlier failed attempt must not be mistaken for this run's output
+    shutil.rmtree(os.path.join(QUANTI_DIR, run["run_dir"]), ignore_errors=True)
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(QUANTI_DIR)}
+    result = subprocess.run(main_command(run, extra_args), cwd=QUANTI_DIR, env=env)
+    if result.returncode != 0:
+        return f"main.py exited with {result.returncode}"
+    return validate_run_dir(os.path.join(QUANTI_DIR, run["run_dir"]))
+
+
+def execute_on_host(run: dict, host, extra_args: list) -> str:
+    """Run one cell on a pool host; Quanti.main pulls the results back when the run ends."""
+    error = execute_local(run, [*extra_args, "--host", host.spec])
+    if not error:
+        write_host_info(os.path.join(QUANTI_DIR, run["run_dir"]), host)
+    return error
+
+
+def run_matrix_on_hosts(matrix: dict, state: RunState, hosts: list, extra_args=()) -> dict:
+    """Spread the pending runs over several hosts, one run per host at a time."""
+    runs = expand_matrix(matrix)
+    args = list(matrix["args"]) + list(extra_args)
+    max_attempts = matrix["max_attempts"]
+    adaptive = matrix.get("adaptive")
+    todo = [r for r in runs if needs_run(state, r, max_attempts)]
+    # Lowest repeats first, so every cell reaches min_repeats before any cell runs long
+    if adaptive:
+        todo.sort(key=lambda r: r["repeat"])
+
+    # Cells that already have finished runs stay on the GPU model they were measured on
+    cell_gpu = {}
+    for run in runs:
+        entry = state.get(run["key"])
+        if entry["status"] == DONE and entry.get("gpu_model"):
+            cell_gpu.setdefault(cell_of(run), entry["gpu_model"])
+
+    def on_result(run, host, error):
+        entry = state.get(run["key"])
+        fields = dict(attempts=entry["attempts"] + 1, host=host.spec, gpu_model=host.gpu_model)
+        if error:
+            state.update(run["key"], status=FAILED, last_error=error, **fields)
+        else:
+            state.update(run["key"], status=DONE, run_dir=run["run_dir"], **fields)
+            if adaptive:
+                update_cell(runs, state, adaptive, cell_key(run))
+
+    skip = (lambda run: is_converged(state, run)) if adaptive else None
+    pool = HostPool([Host(spec) for spec in hosts], lambda run, host: execute_on_host(run, host, args),
+                    on_result=on_result, max_attempts=max_attempts, cell_gpu=cell_gpu, skip=skip)
+    leftover = pool.run(todo, attempts={r["key"]: state.get(r["key"])["attempts"] for r in todo})
+    for run in pool.skipped:
+        state.update(run["key"], status=SKIPPED)
+    if leftover:
+        print(f"⚠️ {len(leftover)} run(s) could not be placed on any remaining host")
+    return state.counts(r["key"] for r in runs)
+
+
+def run_matrix(matrix: dict, state: RunState, execute=execute_local, extra_args=()) -> dict:
+    """Run every pending cell, retrying failures up to max_attempts while their model is still loaded."""
+    runs = expand_matrix(matrix)
+    args = list(matrix["args"]) + list(extra_args)
+    max_attempts = matrix["max_attempts"]
+    adaptive = matrix.get("adaptive")
+
+    for model in matrix["models"]:
+        group = [r for r in runs if r["model"] == model]
+        while True:
+            todo = [r for r in group if needs_run(state, r, max_attempts)]
+            if not todo:
+                break
+            for run in todo:
+                if adaptive and is_converged(state, run):
+                    state.update(run["key"], status=SKIPPED)
+                    continue
+                entry = state.get(run["key"])
+                print(f"▶️ {run['key']} (attempt {entry['attempts'] + 1}/{max_attempts})")
+                error = execute(run, args)
+                if error:
+                    print(f"⚠️ {run['key']} failed: {error}")
+                    state.update(run["key"], status=FAILED, attempts=entry["attempts"] + 1, last_error=error)
+                else:
+                    state.update(run["key"], status=DONE, attempts=entry["attempts"] + 1, run_dir=run["run_dir"])
+                    if adaptive:
+                        update_cell(runs, state, adaptive, cell_key(run))
+
+    return state.counts(r["key"] for r in runs)
+
+
+def print_status(matrix: dict, state: RunState) -> None:
+    runs = expand_matrix(matrix)
+    print(f"📊 {state.counts(r['key'] for r in runs)}")
+    for run in runs:
+        entry = state.get(run["key"])
+        if entry["status"] not in (DONE, SKIPPED):
+            print(f"  {entry['status']:8s} {run['key']} attempts={entry['attempts']} {entry.get('last_error', '')}")
+    for key, verdict in sorted(state.cells.items()):
+        flags = ("converged " if verdict["converged"] else "") + ("HIGH-VARIANCE" if verdict["high_variance"] else "")
+        widths = ", ".join(f"{m} ±{v['rel_half_width'] * 100:.2f}%" for m, v in verdict["metrics"].items())
+        print(f"  🎯 {key} n={verdict['n']} {widths} {flags}")
+
+
+def parse_scheduler_args(argv=None):
+    parser = argparse.ArgumentParser(prog="scheduler.py", description="Resumable experiment-matrix runner.")
+    parser.add_argument("matrix", help="JSON file with models, workloads, repeats and optional args/output_dir")
+    parser.add_argument("--state", default=None,
+                        help="State file (default: <output_dir>/.scheduler_state.json)")
+    parser.add_argument("--warm", action="store_true",
+                        help="Keep each model loaded across its runs and tear the server down at the end")
+    parser.add_argument("--agent", action="store_true",
+                        help="Run through the persistent benchmark agent on each host and stop it at the end")
+    parser.add_argument("--status", action="store_true", help="Only print progress and the runs still to do")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Give runs that used up their attempts in an earlier sweep a fresh budget")
+    parser.add_argument("--hosts", default=None,
+                        help="Comma-separated GPU hosts to spread runs over (SSH hosts or local:<dir>); "
+                             "default: the single host Quanti.main uses")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Stop a cell once its confidence intervals are narrow enough (settings: the "
+                             "matrix's 'adaptive' block; 'repeats' becomes the maximum)")
+    parser.add_argument("--rel-half-width", type=float, default=None,
+                        help=f"Adaptive target: CI half-width as a fraction of the mean "
+                             f"(default: {ADAPTIVE_DEFAULTS['rel_half_width']})")
+    parser.add_argument("--min-repeats", type=int, default=None,
+                        help=f"Adaptive minimum repeats per cell (default: {ADAPTIVE_DEFAULTS['min_repeats']})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_scheduler_args(argv)
+    matrix = load_matrix(args.matrix)
+    if args.adaptive or args.rel_half_width is not None or args.min_repeats is not None:
+        matrix["adaptive"] = dict(matrix.get("adaptive") or ADAPTIVE_DEFAULTS)
+        if args.rel_half_width is not None:
+            matrix["adaptive"]["rel_half_width"] = args.rel_half_width
+        if args.min_repeats is not None:
+            matrix["adaptive"]["min_repeats"] = args.min_repeats
+    # Paths in the matrix are relative to the Quanti directory, like exp1.sh
+    state_path = args.state or os.path.join(QUANTI_DIR, matrix["output_dir"], ".scheduler_state.json")
+    state = RunState(state_path)
+
+    cwd = os.getcwd()
+    os.chdir(QUANTI_DIR)
+    try:
+        reconcile(expand_matrix(matrix), state)
+    finally:
+        os.chdir(cwd)
+
+    if args.retry_failed:
+        for entry in state.runs.values():
+            if entry["status"] == FAILED:
+                entry["attempts"] = 0
+        state.save()
+
+    state.cells.clear()
+    if matrix.get("adaptive"):
+        runs = expand_matrix(matrix)
+        for key in sorted({cell_key(r) for r in runs}):
+            update_cell(runs, state, matrix["adaptive"], key)
+
+    if args.status:
+        print_status(matrix, state)
+        return 0
+
+    # Skips are decided afresh each sweep: a tighter target or a non-adaptive sweep resumes those runs
+    for entry in state.runs.values():
+        if entry["status"] == SKIPPED:
+            entry["status"] = PENDING
+    state.save()
+
+    extra = (["--warm"] if args.warm else []) + (["--agent"] if args.agent else [])
+    hosts = [h.strip() for h in args.hosts.split(",") if h.strip()] if args.hosts else []
+    try:
+        if hosts:
+            counts = run_matrix_on_hosts(matrix, state, hosts, extra_args=extra)
+        else:
+            counts = run_matrix(matrix, state, extra_args=extra)
+    finally:
+        if args.warm or args.agent:
+            env = {**os.environ, "PYTHONPATH": os.path.dirname(QUANTI_DIR)}
+            for host in hosts or [None]:
+                teardown = [sys.executable, "-m", "Quanti.main", "--teardown"]
+                if host:
+                    teardown += ["--host", host]
+                subprocess.run(teardown, cwd=QUANTI_DIR, env=env)
+
+    print(f"🏁 Matrix finished: {counts}")
+    return 0 if counts[FAILED] == 0 and counts[PENDING] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,10 +10,13 @@ from Quanti.utils import quote
 ssh = 'ssh glg1'
 
 
-def ssh_and_launch(llm: str, port: int = 8000) -> str:
+def ssh_and_launch(llm: str, port: int = 8000, host: str = "glg1", serve_params: dict = None) -> str:
+    """Serve `llm` on `host`; serve parameters not given in serve_params come from vllm_manager.serve_config."""
+    ssh = f"ssh {host}"
     subprocess.run(f"{ssh} 'pkill -f \"vllm serve\" || true'", shell=True,
                    check=False)
-    remote = "source ~/vllm-env/bin/activate && " + vllm_manager.cmd_serve_model(llm, gpu_memory_utilization=0.60, port=port)
+    serve = {k: v for k, v in (serve_params or {}).items() if v is not None}
+    remote = "source ~/vllm-env/bin/activate && vllm serve " + vllm_manager.cmd_serve_model(llm, port=port, **serve)
     proc = subprocess.Popen(
         f"{ssh} {quote(remote)}",
         shell=True,
@@ -0,0 +1,231 @@
+"""Serve-parameter sweep and autotuner.
+
+Usage: python3 -m Quanti.sweep <model> [--workload W] [--max-num-seqs 8,16,32,64]
+                               [--gpu-memory-utilization 0.6,0.85] [--max-model-len 2048]
+                               [--concurrency 1,8,32] [--latency-slo-s S] [--no-save]
+
+Runs the model once per grid point through Quanti.main and reports the Pareto front of
+energy per output token, decode throughput and p99 latency. Points are visited in grid
+order, and a point is skipped when the step that led to it along some axis was clearly
+dominated, or when the previous value failed on an axis where more means more memory.
+The serve parameters of the best point on the front are saved as the alias'
+recommendation in serve_configs.json, which later runs pick up as their serve defaults.
+Its client concurrency is a property of the load, not the server, so it is only
+reported in pareto.json.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from Quanti import vllm_manager
+from Quanti.catalog import workload_name
+from Quanti.scheduler import QUANTI_DIR, execute_local, validate_run_dir
+
+AXES = ("gpu_memory_utilization", "max_len", "max_num_seqs", "concurrency")
+FLAGS = {
+    "gpu_memory_utilization": "--gpu-memory-utilization",
+    "max_len": "--max-model-len",
+    "max_num_seqs": "--max-num-seqs",
+    "concurrency": "--concurrency",
+}
+# +1: lower is better, -1: higher is better
+OBJECTIVES = {"J_per_output_token": 1, "decode_tok_per_s": -1, "latency_p99_s": 1}
+# Axes where a failure at one value (usually OOM at startup) means every larger value fails too
+GROWS_MEMORY = ("max_len", "max_num_seqs", "concurrency")
+
+OK, FAILED, PRUNED = "ok", "failed", "pruned"
+
+
+def point_key(point: dict) -> str:
+    return (f"gmu{point['gpu_memory_utilization']}_len{point['max_len']}"
+            f"_seqs{point['max_num_seqs']}_c{point['concurrency']}")
+
+
+def grid(axes: dict) -> list:
+    """Every combination of the axis values, last axis (concurrency) varying fastest."""
+    values = [sorted(axes[a]) for a in AXES]
+    return [dict(zip(AXES, combo)) for combo in itertools.product(*values)]
+
+
+def dominates(a: dict, b: dict, margin: float = 0.0) -> bool:
+    """True if a is at least as good as b on every objective and better on one.
+
+    With margin > 0 differences within that relative margin count as ties, so b is
+    "clearly dominated": nowhere better than a beyond noise and clearly worse somewhere
+    (e.g. more concurrency past saturation: same throughput, higher latency).
+    """
+    better = False
+    for name, sign in OBJECTIVES.items():
+        va, vb = a.get(name), b.get(name)
+        if va is None or vb is None:
+            return False
+        gap = (vb - va) * sign / max(abs(vb), 1e-12)
+        if gap < -margin:
+            return False
+        better |= gap > margin
+    return better
+
+
+def complete(point: dict) -> bool:
+    """Measured, with a value for every objective (J_per_output_token is None without output tokens)."""
+    return point["status"] == OK and all(point.get(name) is not None for name in OBJECTIVES)
+
+
+def pareto_front(points: list) -> list:
+    ok = [p for p in points if complete(p)]
+    return [p for p in ok if not any(dominates(q, p) for q in ok if q is not p)]
+
+
+def prune_reason(point: dict, results: dict, axes: dict, margin: float) -> tuple:
+    """(axis, reason) why `point` need not be measured, given the points before it in grid order.
+
+    The reason is empty when the point should run.
+    """
+    for axis in AXES:
+        values = sorted(axes[axis])
+        i = values.index(point[axis])
+        if i == 0:
+            continue
+        prev = results.get(point_key({**point, axis: values[i - 1]}))
+        if prev is None:
+            continue
+        if prev["status"] == PRUNED and prev.get("pruned_axis") == axis:
+            return axis, f"{axis} pruned below {point[axis]}"
+        # A smaller config that failed, or was skipped because of a failure, won't fit with more memory use
+        if axis in GROWS_MEMORY and (prev["status"] == FAILED or prev.get("after_failure")):
+            return axis, f"{axis}={values[i - 1]} already failed"
+        if i >= 2:
+            prev2 = results.get(point_key({**point, axis: values[i - 2]}))
+            if prev2 and prev2["status"] == OK and prev["status"] == OK and dominates(prev2, prev, margin):
+                return axis, f"raising {axis} to {values[i - 1]} was clearly dominated"
+    return None, ""
+
+
+def measure(summary: dict) -> dict:
+    return {name: summary.get(name) for name in (*OBJECTIVES, "energy_Wh", "requests_per_s", "latency_p50_s")}
+
+
+def recommend(front: list, latency_slo_s: float = None) -> dict:
+    """Lowest energy per token on the front, among points meeting the latency SLO if one is given."""
+    eligible = [p for p in front if latency_slo_s is None or (p["latency_p99_s"] or 0) <= latency_slo_s]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda p: p["J_per_output_token"])
+
+
+def run_sweep(model: str, workload: str, axes: dict, out_dir: str, extra_args=(), margin: float = 0.05,
+              execute=execute_local) -> list:
+    """Measure the grid (minus pruned points); finished points on disk are reused, so a sweep resumes."""
+    results = {}
+    for point in grid(axes):
+        key = point_key(point)
+        run = {"key": f"{model}|{key}", "model": model, "workload": workload,
+               "run_dir": os.path.join(out_dir, key)}
+        axis, reason = prune_reason(point, results, axes, margin)
+        if reason:
+            print(f"✂️ {key}: {reason}")
+            results[key] = {**point, "key": key, "status": PRUNED, "pruned_axis": axis, "reason": reason,
+                            "after_failure": reason.endswith("already failed")}
+            continue
+
+        run_dir = os.path.join(QUANTI_DIR, run["run_dir"])
+        error = validate_run_dir(run_dir)
+        if error:
+            print(f"▶️ {key}")
+            flags = [arg for a in AXES for arg in (FLAGS[a], str(point[a]))]
+            error = execute(run, [*flags, *extra_args])
+        if error:
+            print(f"⚠️ {key} failed: {error}")
+            results[key] = {**point, "key": key, "status": FAILED, "reason": error}
+            continue
+        with open(os.path.join(run_dir, "summary.json")) as f:
+            results[key] = {**point, "key": key, "status": OK, **measure(json.load(f))}
+    return list(results.values())
+
+
+def report(points: list, out_dir: str, latency_slo_s: float = None) -> dict:
+    """Write points.csv and pareto.json into out_dir and print the front. Returns the recommendation."""
+    os.makedirs(out_dir, exist_ok=True)
+    pd.DataFrame(points).to_csv(os.path.join(out_dir, "points.csv"), index=False)
+    front = sorted(pareto_front(points), key=lambda p: p["J_per_output_token"])
+    best = recommend(front, latency_slo_s)
+    with open(os.path.join(out_dir, "pareto.json"), "w") as f:
+        json.dump({"front": front, "recommended": best, "latency_slo_s": latency_slo_s}, f, indent=2)
+
+    n_ok = sum(p["status"] == OK for p in points)
+    n_pruned = sum(p["status"] == PRUNED for p in points)
+    n_incomplete = n_ok - sum(complete(p) for p in points)
+    print(f"📊 {n_ok} measured ({n_incomplete} without every metric), {n_pruned} pruned, "
+          f"{len(points) - n_ok - n_pruned} failed; Pareto front:")
+    for p in front:
+        star = "⭐" if p is best else "  "
+        print(f"  {star} {p['key']:32s} {p['J_per_output_token']:.4f} J/tok  "
+              f"{p['decode_tok_per_s']:.1f} tok/s  p99 {p['latency_p99_s']:.3f}s")
+    return best
+
+
+def _list_of(kind):
+    return lambda text: [kind(x) for x in text.split(",") if x.strip()]
+
+
+def parse_sweep_args(argv=None):
+    defaults = vllm_manager.DEFAULT_SERVE_CONFIG
+    parser = argparse.ArgumentParser(prog="sweep.py", description="Serve-parameter sweep and autotuner.")
+    parser.add_argument("llm", choices=list(vllm_manager.models))
+    parser.add_argument("--workload", default="data/input/llm_workload_100.csv")
+    parser.add_argument("--gpu-memory-utilization", type=_list_of(float),
+                        default=[defaults["gpu_memory_utilization"]], help="Comma-separated values")
+    parser.add_argument("--max-model-len", type=_list_of(int), default=[defaults["max_len"]],
+                        help="Comma-separated values")
+    parser.add_argument("--max-num-seqs", type=_list_of(int), default=[8, 16, 32, 64],
+                        help="Comma-separated values (default: 8,16,32,64)")
+    parser.add_argument("--concurrency", type=_list_of(int), default=[1],
+                        help="Client concurrency values to sweep as well (default: 1)")
+    parser.add_argument("--margin", type=float, default=0.05,
+                        help="Relative margin by which a step must lose on every objective to prune beyond it")
+    parser.add_argument("--latency-slo-s", type=float, default=None,
+                        help="Only recommend points whose p99 latency is within this bound")
+    parser.add_argument("--output-dir", default="data/sweeps", help="Sweep outputs, relative to Quanti/")
+    parser.add_argument("--host", default=None, help="GPU host passed to Quanti.main (default: its own)")
+    parser.add_argument("--no-save", action="store_true", help="Do not store the recommendation")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_sweep_args(argv)
+    axes = {"gpu_memory_utilization": args.gpu_memory_utilization, "max_len": args.max_model_len,
+            "max_num_seqs": args.max_num_seqs, "concurrency": args.concurrency}
+    wl_name = workload_name(args.workload)
+    out_dir = os.path.join(args.output_dir, f"{args.llm}_{wl_name}")
+    host = ["--host", args.host] if args.host else []
+
+    # Warm runs relaunch vLLM only when the serve arguments change, not per client concurrency
+    try:
+        points = run_sweep(args.llm, args.workload, axes, out_dir, extra_args=["--warm", *host], margin=args.margin)
+    finally:
+        env = {**os.environ, "PYTHONPATH": os.path.dirname(QUANTI_DIR)}
+        subprocess.run([sys.executable, "-m", "Quanti.main", "--teardown", *host], cwd=QUANTI_DIR, env=env)
+
+    best = report(points, os.path.join(QUANTI_DIR, out_dir), args.latency_slo_s)
+    if best is None:
+        print("❌ No point qualifies for a recommendation")
+        return 1
+    if not args.no_save:
+        vllm_manager.save_recommendation(args.llm, {
+            **{k: best[k] for k in vllm_manager.DEFAULT_SERVE_CONFIG},
+            **{name: best[name] for name in OBJECTIVES},
+            "workload": args.workload,
+            "swept": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+        print(f"💾 Saved recommendation for {args.llm} to {vllm_manager.SERVE_CONFIG_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Columnar store that consolidates the traces of every run for analysis.
+
+Usage: python3 -m Quanti.trace_store ingest <outputs_dir> [--store DIR]
+       python3 -m Quanti.trace_store ls [--store DIR]
+
+Each ingest appends one compressed NumPy chunk holding the energy trace samples and
+the numeric per-request columns of the runs that are new (or changed) since the last
+ingest, so nothing already stored is rewritten. manifest.json lists the runs and which
+chunk holds them; loaders open only the chunks of the runs they are asked for.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from Quanti.batch_writer import find_file
+from Quanti.catalog import workload_name
+
+MANIFEST = "manifest.json"
+DEFAULT_STORE = "data/trace_store"
+
+TRACE_CSV = os.path.join("detailed", "energy_trace.csv")
+RESPONSES_CSV = os.path.join("detailed", "query_responses.csv")
+TABLES = ("trace", "requests")
+TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S.%f"
+
+
+def find_run_dirs(root: str) -> list:
+    """Every directory under root that holds a finished run (summary.json plus a trace)."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        if "summary.json" in filenames and os.path.exists(find_file(os.path.join(dirpath, TRACE_CSV))):
+            found.append(dirpath)
+    return found
+
+
+def run_fingerprint(run_dir: str) -> list:
+    """Size and mtime of the files a run is ingested from; changes when a run is redone."""
+    out = []
+    for name in ("summary.json", TRACE_CSV, RESPONSES_CSV):
+        try:
+            st = os.stat(find_file(os.path.join(run_dir, name)))
+            out.append([st.st_size, st.st_mtime_ns])
+        except OSError:
+            out.append(None)
+    return out
+
+
+def _repeat_of(run_dir: str) -> int:
+    m = re.match(r"r(\d+)_", os.path.basename(os.path.normpath(run_dir)))
+    return int(m.group(1)) if m else -1
+
+
+def read_run(run_dir: str) -> tuple:
+    """(catalog entry, {table: {column: array}}) for one run directory."""
+    with open(os.path.join(run_dir, "summary.json")) as f:
+        summary = json.load(f)
+
+    trace = pd.read_csv(find_file(os.path.join(run_dir, TRACE_CSV)))
+    if "timestamp" in trace:
+        stamps = pd.to_datetime(trace.pop("timestamp"), format=TIMESTAMP_FORMAT, errors="coerce")
+        # Independent of the datetime unit pandas picks (ns before 2.0, often us after)
+        trace["t_epoch_s"] = (stamps - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+    tables = {"trace": trace.select_dtypes("number")}
+
+    responses_csv = find_file(os.path.join(run_dir, RESPONSES_CSV))
+    requests = pd.read_csv(responses_csv) if os.path.exists(responses_csv) else pd.DataFrame()
+    tables["requests"] = requests.select_dtypes("number")
+
+    entry = {
+        "model": summary.get("llm"),
+        "workload": workload_name(summary.get("workload")),
+        "repeat": _repeat_of(run_dir),
+        "n_trace": len(tables["trace"]),
+        "n_requests": len(tables["requests"]),
+        # Scalars of summary.json, so whole-matrix bar charts need no per-run file at all
+        "summary": {k: v for k, v in summary.items() if isinstance(v, (int, float)) and not isinstance(v, bool)},
+    }
+    columns = {name: {c: df[c].to_numpy(dtype=np.float64) for c in df.columns} for name, df in tables.items()}
+    return entry, columns
+
+
+class TraceStore:
+    """Chunked columnar archive of run traces, keyed by model, workload, repeat and sample time."""
+
+    def __init__(self, path: str = DEFAULT_STORE):
+        self.path = path
+        self.manifest = {"runs": {}, "chunks": [], "next_run_id": 0}
+        manifest = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                self.manifest = json.load(f)
+
+    def _save_manifest(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, f"{MANIFEST}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def ingest(self, root: str) -> list:
+        """Append the runs under root that are not in the store yet (or changed). Returns their keys."""
+        runs = self.manifest["runs"]
+        todo = []
+        for run_dir in find_run_dirs(root):
+            key = os.path.relpath(run_dir, root)
+            fingerprint = run_fingerprint(run_dir)
+            if key not in runs or runs[key]["fingerprint"] != fingerprint:
+                todo.append((key, run_dir, fingerprint))
+        if not todo:
+            return []
+
+        parts = {table: {} for table in TABLES}
+        entries = {}
+        for key, run_dir, fingerprint in todo:
+            try:
+                entry, columns = read_run(run_dir)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping {key}: {e}")
+                continue
+            run_id = self.manifest["next_run_id"]
+            self.manifest["next_run_id"] += 1
+            entries[key] = {**entry, "run_id": run_id, "run_dir": run_dir, "fingerprint": fingerprint}
+            for table in TABLES:
+                for col, values in columns[table].items():
+                    parts[table].setdefault(col, {})[run_id] = values
+
+        if not entries:
+            return []
+        chunk = f"chunk-{len(self.manifest['chunks']):05d}.npz"
+        arrays = {}
+        for table in TABLES:
+            sizes = [(e["run_id"], _n_rows(e, table)) for e in entries.values()]
+            arrays[f"{table}.run_id"] = np.concatenate(
+                [np.full(n, run_id, dtype=np.int32) for run_id, n in sizes])
+            for col, by_run in parts[table].items():
+                # Columns a run lacks (no RAPL, no streaming) are NaN for that run's rows
+                arrays[f"{table}.{col}"] = np.concatenate(
+                    [by_run.get(run_id, np.full(n, np.nan)) for run_id, n in sizes])
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, f"{chunk}.tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, os.path.join(self.path, chunk))
+
+        for key, entry in entries.items():
+            entry["chunk"] = chunk
+            runs[key] = entry
+        self.manifest["chunks"].append(chunk)
+        self.manifest["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._save_manifest()
+        return list(entries)
+
+    def runs(self, model=None, workload=None) -> pd.DataFrame:
+        """Catalog of stored runs, one row per run with its summary.json scalars as columns."""
+        rows = []
+        for key, e in self.manifest["runs"].items():
+            rows.append({"key": key, "run_id": e["run_id"], "model": e["model"], "workload": e["workload"],
+                         "repeat": e["repeat"], "n_trace": e["n_trace"], "n_requests": e["n_requests"],
+                         **e["summary"]})
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        return df[_matches(df, model, workload)].sort_values(["model", "workload", "repeat"]).reset_index(drop=True)
+
+    def load(self, table: str = "trace", model=None, workload=None, run_ids=None, columns=None) -> dict:
+        """Concatenated column arrays of `table` ('trace' or 'requests') for the selected runs.
+
+        The result always has a run_id column; join it against runs() for model/workload.
+        Rows of one run are contiguous and in sample order.
+        """
+        if table not in TABLES:
+            raise ValueError(f"unknown table {table!r}, expected one of {TABLES}")
+        catalog = self.runs(model, workload)
+        wanted = set(catalog["run_id"]) if not catalog.empty else set()
+        if run_ids is not None:
+            wanted &= set(run_ids)
+        chunks = sorted({e["chunk"] for e in self.manifest["runs"].values() if e["run_id"] in wanted})
+
+        pieces = []
+        for chunk in chunks:
+            with np.load(os.path.join(self.path, chunk)) as npz:
+                ids = npz[f"{table}.run_id"]
+                mask = np.isin(ids, list(wanted))
+                if not mask.any():
+                    continue
+                prefix = f"{table}."
+                names = [k[len(prefix):] for k in npz.files if k.startswith(prefix)]
+                if columns is not None:
+                    names = ["run_id", *[c for c in columns if c != "run_id"]]
+                pieces.append({c: (npz[prefix + c][mask] if prefix + c in npz.files
+                                   else np.full(int(mask.sum()), np.nan)) for c in names})
+
+        if not pieces:
+            return {c: np.zeros(0) for c in ["run_id", *(columns or [])]}
+        names = list(dict.fromkeys(c for p in pieces for c in p))
+        return {c: np.concatenate([p.get(c, np.full(len(p["run_id"]), np.nan)) for p in pieces]) for c in names}
+
+    def load_frame(self, table: str = "trace", **selection) -> pd.DataFrame:
+        """load() as a DataFrame with model, workload and repeat joined in."""
+        df = pd.DataFrame(self.load(table, **selection))
+        catalog = self.runs()
+        if df.empty or catalog.empty:
+            return df
+        return df.merge(catalog[["run_id", "model", "workload", "repeat"]], on="run_id", how="left")
+
+
+def _n_rows(entry: dict, table: str) -> int:
+    return entry["n_trace"] if table == "trace" else entry["n_requests"]
+
+
+def _matches(df: pd.DataFrame, model, workload) -> pd.Series:
+    mask = pd.Series(True, index=df.index)
+    if model is not None:
+        mask &= df["model"].isin([model] if isinstance(model, str) else list(model))
+    if workload is not None:
+        mask &= df["workload"].isin([workload] if isinstance(workload, str) else list(workload))
+    return mask
+
+
+def parse_store_args(argv=None):
+    parser = argparse.ArgumentParser(prog="trace_store.py", description="Consolidated columnar store of run traces.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="Append new or changed runs found under a directory")
+    ingest.add_argument("root", help="Directory holding run directories (e.g. data/outputs)")
+    ls = sub.add_parser("ls", help="List the stored runs")
+    for p in (ingest, ls):
+        p.add_argument("--store", default=DEFAULT_STORE, help=f"Store directory (default: {DEFAULT_STORE})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_store_args(argv)
+    store = TraceStore(args.store)
+    if args.command == "ingest":
+        t0 = time.perf_counter()
+        added = store.ingest(args.root)
+        print(f"📦 Ingested {len(added)} run(s) into {args.store} in {time.perf_counter() - t0:.1f}s "
+              f"({len(store.manifest['runs'])} stored)")
+    else:
+        catalog = store.runs()
+        if catalog.empty:
+            print(f"📭 {args.store} holds no runs")
+        else:
+            print(catalog[["model", "workload", "repeat", "n_trace", "n_requests"]].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
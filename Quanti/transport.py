@@ -0,0 +1,78 @@
+import os
+import shlex
+import subprocess
+
+
+class SshTransport:
+    """Runs commands on a remote host over one multiplexed SSH connection.
+
+    The first command opens a master connection (ControlMaster) that later commands,
+    including ones from other processes, reuse for ControlPersist seconds, so they
+    skip the handshake through the jump host.
+    """
+
+    def __init__(self, host: str = "glg1", persist_s: int = 600):
+        self.host = host
+        self.ssh_opts = [
+            "-o", "ControlMaster=auto",
+            "-o", "ControlPath=~/.ssh/cm-quanti-%r@%h:%p",
+            "-o", f"ControlPersist={persist_s}",
+        ]
+
+    def __repr__(self):
+        return f"SshTransport({self.host!r})"
+
+    def run(self, cmd: str, input: bytes = None, timeout: float = None) -> subprocess.CompletedProcess:
+        """Run a shell command remotely; stdout/stderr come back as bytes."""
+        return subprocess.run(["ssh", *self.ssh_opts, self.host, cmd],
+                              input=input, capture_output=True, timeout=timeout)
+
+    def popen(self, cmd: str, **kwargs) -> subprocess.Popen:
+        """Start a long-running remote command with pipes attached."""
+        return subprocess.Popen(["ssh", *self.ssh_opts, self.host, cmd], **kwargs)
+
+    def close(self):
+        subprocess.run(["ssh", *self.ssh_opts, "-O", "exit", self.host], capture_output=True)
+
+
+class LocalTransport:
+    """Stand-in for a remote host: commands run locally with HOME pointing at `root`.
+
+    Remote paths such as ~/Quanti therefore land in `root`, which makes uploads,
+    downloads and dispatch testable on one machine without SSH.
+    """
+
+    def __init__(self, root: str, host: str = "local"):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.host = host
+        os.makedirs(self.root, exist_ok=True)
+
+    def __repr__(self):
+        return f"LocalTransport({self.root!r})"
+
+    def _env(self):
+        return {**os.environ, "HOME": self.root}
+
+    def run(self, cmd: str, input: bytes = None, timeout: float = None) -> subprocess.CompletedProcess:
+        return subprocess.run(["bash", "-c", cmd], input=input, capture_output=True, timeout=timeout,
+                              cwd=self.root, env=self._env())
+
+    def popen(self, cmd: str, **kwargs) -> subprocess.Popen:
+        return subprocess.Popen(["bash", "-c", cmd], cwd=self.root, env=self._env(), **kwargs)
+
+    def close(self):
+        pass
+
+
+def make_transport(spec: str):
+    """Transport from a host spec: `local:<dir>` for a LocalTransport, anything else is an SSH host."""
+    if spec.startswith("local:"):
+        return LocalTransport(spec[len("local:"):])
+    return SshTransport(spec)
+
+
+def remote_quote(path: str) -> str:
+    """Quote a remote path but keep a leading ~/ expandable by the remote shell."""
+    if path.startswith("~/"):
+        return "~/" + shlex.quote(path[2:])
+    return shlex.quote(path)
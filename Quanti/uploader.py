@@ -1,46 +1,117 @@
 # upload the benchmarking script and data files to the server
-import sys, os, pandas as pd, numpy as np
-import subprocess
-from Quanti.utils import now_tag
-from ssh_manager import *
-
-
-def upload_all_files():
-    """Upload all benchmarking scripts and data files to the server."""
-    # Create necessary directories on remote server - everything in Quanti
-    subprocess.run("ssh glg1 'mkdir -p ~/Quanti ~/Quanti/data/input ~/Quanti/data/results'", shell=True)
-
-    files_to_upload = {
-        "benchmark.py": "Quanti/benchmark.py",
-        "vllm_manager.py": "Quanti/vllm_manager.py",
-        "utils.py": "Quanti/utils.py",
-        "energy.py": "Quanti/energy.py",
-        "requirements.txt": "Quanti/requirements.txt"  # Also put in Quanti
-    }
-
-    data_files = [
-        "data/input/llm_workload_10.csv",
-        "data/input/llm_workload_100.csv",
-        "data/input/llm_workload_1000.csv"
-    ]
-
-    # Upload script files
-    for local_file, remote_file in files_to_upload.items():
-        print(f"Checking: {local_file} - Exists: {os.path.exists(local_file)}")
-        if os.path.exists(local_file):
-            print(f" 📤 Uploading  {local_file} -> {remote_file}")
-            result = subprocess.run(f"scp -O {local_file} glg1:~/{remote_file}", shell=True, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"❌ Failed to upload {local_file}: {result.stderr.strip()}")
-                sys.exit(1)
-
-    # Upload data files to Quanti/data/input/
-
-    for local_file in data_files:
-        if os.path.exists(local_file):
-            remote_file = f"~/Quanti/data/input/{os.path.basename(local_file)}"  # Put in Quanti folder
-            print(f"  📤 {local_file} → {remote_file}")
-            result = subprocess.run(f"scp -O {local_file} glg1:{remote_file}", shell=True, capture_output=True, text=True)
-            if result.returncode != 0:
-                print(f"❌ Failed to upload {local_file}: {result.stderr.strip()}")
-                sys.exit(1)
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+
+from Quanti.transport import SshTransport
+
+MANIFEST = ".quanti_manifest.json"
+# Uploaded files live here on the host, outside the ~/Quanti that cold runs delete
+CACHE_ROOT = "~/.quanti_cache"
+
+# local path -> path inside the remote ~/Quanti
+FILES_TO_UPLOAD = {
+    "benchmark.py": "benchmark.py",
+    "vllm_manager.py": "vllm_manager.py",
+    "utils.py": "utils.py",
+    "energy.py": "energy.py",
+    "samplers.py": "samplers.py",
+    "loadgen.py": "loadgen.py",
+    "attribution.py": "attribution.py",
+    "live_metrics.py": "live_metrics.py",
+    "workloads.py": "workloads.py",
+    "batch_writer.py": "batch_writer.py",
+    "mock_server.py": "mock_server.py",
+    "harness_bench.py": "harness_bench.py",
+    "agent.py": "agent.py",
+    "colocate.py": "colocate.py",
+    "serve_configs.json": "serve_configs.json",
+    "requirements.txt": "requirements.txt",
+    "data/input/llm_workload_10.csv": "data/input/llm_workload_10.csv",
+    "data/input/llm_workload_100.csv": "data/input/llm_workload_100.csv",
+    "data/input/llm_workload_1000.csv": "data/input/llm_workload_1000.csv",
+}
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def local_manifest(files: dict) -> dict:
+    """Content hash of every local file that exists, keyed by its remote path."""
+    return {remote: file_digest(local) for local, remote in files.items() if os.path.exists(local)}
+
+
+def read_remote_manifest(transport, remote_root: str = "~/Quanti") -> dict:
+    result = transport.run(f"cat {remote_root}/{MANIFEST} 2>/dev/null || true")
+    try:
+        return json.loads(result.stdout or b"{}")
+    except ValueError:
+        return {}
+
+
+def build_archive(files: dict, changed: list, manifest: dict) -> bytes:
+    """gzip'd tar of the changed files plus the new manifest, written last."""
+    remote_to_local = {remote: local for local, remote in files.items()}
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for remote in changed:
+            tar.add(remote_to_local[remote], arcname=remote)
+        data = json.dumps(manifest, indent=1, sort_keys=True).encode()
+        info = tarfile.TarInfo(MANIFEST)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def sync_files(transport, files: dict = None, remote_root: str = "~/Quanti", cache_root: str = CACHE_ROOT) -> list:
+    """Bring remote_root in line with the local files, sending only what changed.
+
+    Local hashes are compared against the manifest left in cache_root by the previous
+    sync, and the changed files go over as one streamed tar.gz into the cache. The cache
+    survives cleanup_server, so cold runs stay incremental too: remote_root is then
+    copied from the cache on the host whenever its manifest differs (or the tree is gone).
+    Returns the remote paths sent.
+    """
+    files = files or FILES_TO_UPLOAD
+    manifest = local_manifest(files)
+    remote = read_remote_manifest(transport, cache_root)
+    changed = sorted(path for path, digest in manifest.items() if remote.get(path) != digest)
+
+    if changed:
+        archive = build_archive(files, changed, manifest)
+        print(f"  📤 Syncing {len(changed)} changed file(s) ({len(archive) / 1024:.1f} KiB): {', '.join(changed)}")
+        result = transport.run(f"mkdir -p {cache_root} && tar xzf - -C {cache_root}", input=archive)
+        if result.returncode != 0:
+            raise RuntimeError(f"sync failed: {result.stderr.decode(errors='replace').strip()}")
+    else:
+        print("  ✅ Server files are up to date")
+
+    # The manifest goes last, so a copy cut short is redone by the next sync
+    result = transport.run(
+        f"cmp -s {cache_root}/{MANIFEST} {remote_root}/{MANIFEST} || "
+        f"{{ mkdir -p {remote_root}/data/input {remote_root}/data/results "
+        f"&& tar cf - -C {cache_root} --exclude ./{MANIFEST} . | tar xf - -C {remote_root} "
+        f"&& cp {cache_root}/{MANIFEST} {remote_root}/{MANIFEST}; }}")
+    if result.returncode != 0:
+        raise RuntimeError(f"sync failed: {result.stderr.decode(errors='replace').strip()}")
+    return changed
+
+
+def upload_all_files(transport=None) -> list:
+    """Upload all benchmarking scripts and data files to the server. Returns the files that changed."""
+    transport = transport or SshTransport("glg1")
+    try:
+        return sync_files(transport)
+    except Exception as e:
+        print(f"❌ Failed to upload files: {e}")
+        sys.exit(1)
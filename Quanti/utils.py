@@ -1,6 +1,4 @@
 import argparse
-import csv
-import glob
 import subprocess
 from datetime import datetime
 import os
@@ -14,67 +12,94 @@ def parse_args(argv=None):
         prog="main.py",
         description="Run an LLM workload over SSH and record energy metrics."
     )
-    parser.add_argument("llm", nargs="?", default="Llama-3-8B")
+    parser.add_argument("llm", nargs="?", default="Llama-3-8B",
+                       help="Model alias, or several comma-separated ones to co-locate on one GPU (default: Llama-3-8B)")
     parser.add_argument("workload", nargs="?", default=WORKLOAD)
     parser.add_argument("--output-dir", default="data/outputs",
                        help="Base output directory (default: data/outputs)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                       help="Requests kept in flight on the server (default: 1)")
+    parser.add_argument("--arrival", choices=["closed", "poisson", "replay"], default="closed",
+                       help="closed-loop replay, or open-loop Poisson / trace-replay arrivals (default: closed)")
+    parser.add_argument("--qps", type=float, default=None,
+                       help="Target request rate for --arrival poisson")
+    parser.add_argument("--replay-column", default=None,
+                       help="Workload column with arrival timestamps for --arrival replay")
+    parser.add_argument("--seed", type=int, default=None,
+                       help="Seed for the Poisson arrival process")
+    parser.add_argument("--stream", action="store_true",
+                       help="Stream completions and record TTFT and inter-token latency")
+    parser.add_argument("--idle-baseline-s", type=float, default=0.0,
+                       help="Sample the idle GPU for this many seconds before the workload (default: off)")
+    parser.add_argument("--sampler", default="auto",
+                       help="Power sampler: auto, nvml, nvidia-smi or replay:<trace.csv> (default: auto)")
+    parser.add_argument("--sample-interval-ms", type=float, default=100,
+                       help="Power sampling interval (default: 100)")
+    parser.add_argument("--rapl", nargs="?", const="/sys/class/powercap", default=None, metavar="ROOT",
+                       help="Also sample CPU/DRAM power from RAPL (powercap root, default: /sys/class/powercap)")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                       help="Serve live metrics on the server's localhost:PORT (reach it with ssh -L; default: off)")
+    parser.add_argument("--warm", action="store_true",
+                       help="Keep the server files and vLLM instance loaded between runs of the same model")
+    parser.add_argument("--startup-timeout-s", type=float, default=600,
+                       help="Give up if vLLM is not ready after this many seconds (default: 600)")
+    parser.add_argument("--max-num-seqs", type=int, default=None,
+                       help="vLLM --max-num-seqs (default: the model's saved recommendation, else 32)")
+    parser.add_argument("--max-model-len", type=int, default=None,
+                       help="vLLM --max-model-len (default: the model's saved recommendation, else 2048)")
+    parser.add_argument("--gpu-memory-utilization", type=float, default=None,
+                       help="vLLM --gpu-memory-utilization (default: the model's saved recommendation, else 0.85)")
+    parser.add_argument("--ports", default=None,
+                       help="Co-location: comma-separated port of every instance (default: 8000, 8001, ...)")
+    parser.add_argument("--memory-fractions", default=None,
+                       help="Co-location: comma-separated --gpu-memory-utilization of every instance (default: even split)")
+    parser.add_argument("--results-format", choices=["csv", "csv.gz"], default="csv",
+                       help="Format of the per-request results and energy traces (default: csv)")
+    parser.add_argument("--fetch-interval-s", type=float, default=10.0,
+                       help="Pull new result data from the server this often during the run; 0 fetches only at the end (default: 10)")
+    parser.add_argument("--host", default="glg1",
+                       help="GPU host to run on: an SSH host, or local:<dir> to run locally (default: glg1)")
+    parser.add_argument("--catalog", default="data/catalog.sqlite",
+                       help="Local SQLite run catalog the downloaded run is recorded in (default: data/catalog.sqlite)")
+    parser.add_argument("--agent", action="store_true",
+                       help="Run through the persistent benchmark agent on the host, started on first use")
+    parser.add_argument("--teardown", action="store_true",
+                       help="Only stop the remote agent and vLLM server and remove ~/Quanti (ends a series of --warm/--agent runs)")
     return parser.parse_args(argv)
 
 
-def get_workload_size(workload_path: str) -> str:
-    """Extract workload size from filename like llm_workload_100.csv -> 100"""
-    filename = os.path.basename(workload_path)
-    if "workload_" in filename:
-        try:
-            return filename.split("workload_")[1].split(".")[0]
-        except:
-            pass
-    # Fallback: count CSV lines
-    import pandas as pd
-    return str(len(pd.read_csv(workload_path)))
-
-
-def get_next_run_number(output_base_dir: str, model: str, workload_size: str) -> str:
-    """Get next run number - resets per model/workload combination"""
-    pattern = f"{output_base_dir}/r*_{model}_workload-{workload_size}_*"
-    existing_runs = glob.glob(pattern)
-
-    if not existing_runs:
-        return "r00"
-
-    run_numbers = []
-    for run_path in existing_runs:
-        dirname = os.path.basename(run_path)
-        if dirname.startswith("r"):
-            try:
-                run_num = int(dirname.split("_")[0][1:])  # Extract from "r00"
-                run_numbers.append(run_num)
-            except ValueError:
-                continue
-
-    return f"r{max(run_numbers) + 1:02d}" if run_numbers else "r00"
-
-
-def create_run_directory(output_base_dir: str, model: str, workload_path: str) -> str:
-    """Create structured run directory"""
-    workload_size = get_workload_size(workload_path)
-    run_number = get_next_run_number(output_base_dir, model, workload_size)
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")  # Readable format
-
-    run_dir = f"{output_base_dir}/{run_number}_{model}_workload-{workload_size}_{timestamp}"
-    os.makedirs(run_dir, exist_ok=True)
-    os.makedirs(f"{run_dir}/detailed", exist_ok=True)
-
-    return run_dir
-
-
-def append_csv(path: str, idx: int, prompt: str, reply: str) -> None:
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    mode = "a" if os.path.isfile(path) else "w"
-    with open(path, mode, newline="", encoding="utf-8") as fh:
-        w = csv.writer(fh)
-        if fh.tell() == 0: w.writerow(["idx", "prompt", "reply"])
-        w.writerow([idx, prompt, reply])
+def benchmark_flags(args) -> str:
+    """Forward the load-generation options of main.py to benchmark.py."""
+    flags = [f"--concurrency {args.concurrency}", f"--arrival {args.arrival}"]
+    if args.qps is not None:
+        flags.append(f"--qps {args.qps}")
+    if args.replay_column:
+        flags.append(f"--replay-column {args.replay_column}")
+    if args.seed is not None:
+        flags.append(f"--seed {args.seed}")
+    if args.stream:
+        flags.append("--stream")
+    if args.idle_baseline_s > 0:
+        flags.append(f"--idle-baseline-s {args.idle_baseline_s}")
+    flags.append(f"--sampler {args.sampler} --sample-interval-ms {args.sample_interval_ms}")
+    if args.rapl:
+        flags.append(f"--rapl {args.rapl}")
+    if args.metrics_port:
+        flags.append(f"--metrics-port {args.metrics_port}")
+    if args.warm:
+        flags.append("--warm")
+    flags.append(f"--startup-timeout-s {args.startup_timeout_s}")
+    for flag, value in (("--max-num-seqs", args.max_num_seqs), ("--max-model-len", args.max_model_len),
+                        ("--gpu-memory-utilization", args.gpu_memory_utilization)):
+        if value is not None:
+            flags.append(f"{flag} {value}")
+    if args.ports:
+        flags.append(f"--ports {args.ports}")
+    if args.memory_fractions:
+        flags.append(f"--memory-fractions {args.memory_fractions}")
+    if args.results_format != "csv":
+        flags.append(f"--results-format {args.results_format}")
+    return " ".join(flags)
 
 
 def quote(cmd: str) -> str:
@@ -84,16 +109,20 @@ def quote(cmd: str) -> str:
 def now_tag():
     return datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
 
-def cleanup_server():
-    """Remove all Quanti traces from the server."""
-    print("🧹 Cleaning up server (removing ~/Quanti)...")
-    cleanup_cmd = "ssh glg1 'rm -rf ~/Quanti'"
-    result = subprocess.run(cleanup_cmd, shell=True, capture_output=True, text=True)
+def stop_remote_server(transport):
+    """Stop the vLLM server left running by --warm runs."""
+    print(f"🛑 Stopping vLLM server on {transport.host}...")
+    transport.run('pkill -f "vllm serve" || true; rm -f ~/.quanti_server.json')
+
+
+def cleanup_server(transport):
+    """Remove ~/Quanti from the server; the upload cache stays so the next sync is incremental."""
+    print(f"🧹 Cleaning up {transport.host} (removing ~/Quanti)...")
+    result = transport.run("rm -rf ~/Quanti")
     if result.returncode == 0:
         print("✅ Server cleanup complete")
     else:
-        print(f"⚠️ Server cleanup had issues: {result.stderr}")
+        print(f"⚠️ Server cleanup had issues: {result.stderr.decode(errors='replace')}")
         # Try force cleanup
-        force_cmd = "ssh glg1 'rm -rf ~/Quanti || true'"
-        subprocess.run(force_cmd, shell=True)
+        transport.run("rm -rf ~/Quanti || true")
         print("🔄 Forced cleanup attempted")
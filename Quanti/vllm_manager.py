@@ -1,3 +1,6 @@
+import json
+import os
+
 # -------- Hugging-Face model aliases ----------------------------------------
 models: dict[str, str] = {
     "Llama-3-8B": "meta-llama/Llama-3.1-8B-Instruct",
@@ -8,22 +11,61 @@ models: dict[str, str] = {
     "Mistral-8B-AWQ": "solidrust/Mistral-NeMo-Minitron-8B-Base-AWQ",
 }
 
+# -------- Serve parameters -------------------------------------------------
+DEFAULT_SERVE_CONFIG = {
+    "gpu_memory_utilization": 0.85,
+    "max_len": 2_048,
+    "max_num_seqs": 32,
+}
+
+# Per-alias recommendations written by `python -m Quanti.sweep`
+SERVE_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve_configs.json")
+
+
+def load_recommendations(path: str = SERVE_CONFIG_FILE) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_recommendation(alias: str, config: dict, path: str = SERVE_CONFIG_FILE) -> None:
+    """Store the recommended serve config of one alias, keeping the others."""
+    saved = load_recommendations(path)
+    saved[alias] = config
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def serve_config(alias: str) -> dict:
+    """Serve parameters of an alias: the defaults, overridden by its saved recommendation."""
+    recommended = load_recommendations().get(alias, {})
+    return {k: recommended.get(k, v) for k, v in DEFAULT_SERVE_CONFIG.items()}
+
 
 def cmd_serve_model(
         alias: str,
-        gpu_memory_utilization: float = 0.85,
-        max_len: int = 2_048,
+        gpu_memory_utilization: float = None,
+        max_len: int = None,
         port: int = 8_000,
+        max_num_seqs: int = None,
 ) -> str:
-    """Generate vLLM serve command - FIXED version"""
+    """Generate vLLM serve command; unset parameters come from serve_config(alias)"""
     repo = models[alias]
+    config = serve_config(alias)
+    gpu_memory_utilization = gpu_memory_utilization or config["gpu_memory_utilization"]
+    max_len = max_len or config["max_len"]
+    max_num_seqs = max_num_seqs or config["max_num_seqs"]
 
     # Generate arguments for API server module
     args = [
         f'"{repo}"',
         f"--port {port}",
         f"--max-model-len {max_len}",
-        f"--max-num-seqs 32",
+        f"--max-num-seqs {max_num_seqs}",
         f"--gpu-memory-utilization {gpu_memory_utilization}",
         "--host 0.0.0.0",
         "--trust-remote-code",
@@ -0,0 +1,147 @@
+"""Workload sources that yield prompts lazily.
+
+A workload is either a CSV file with a `text` column (and optionally `max_tokens` and a
+replay timestamp column), read in chunks so its size doesn't bound memory, or a
+synthetic spec such as
+
+    synthetic:n=1000000,input=lognormal:5:0.6,output=uniform:16:256,seed=0
+
+which draws prompt lengths (in words) and `max_tokens` from the given distributions.
+Distributions: const:N, uniform:LO:HI, normal:MEAN:SD, lognormal:MU:SIGMA, exp:MEAN.
+
+Usage: python3 workloads.py <spec> <out.csv>   (write a synthetic workload to a CSV)
+"""
+import csv
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+SYNTHETIC_PREFIX = "synthetic:"
+CHUNK_ROWS = 10_000
+DEFAULT_MAX_TOKENS = 128
+
+# Plain words, so synthetic prompts tokenize roughly one token per word
+VOCAB = np.array((
+    "the of and to in is for that on with as by this be are from at or an it not which have "
+    "data system model energy power time user value request server process memory network "
+    "design test result report table query update policy review plan task team project "
+    "write explain describe summarize compare list analyze improve create check build "
+    "small large fast slow simple clear useful common public local global final early "
+    "city river market school garden music story history science health water travel "
+    "price order account service product customer support message language question answer"
+).split())
+
+
+def is_synthetic(workload: str) -> bool:
+    return workload.startswith(SYNTHETIC_PREFIX)
+
+
+def parse_distribution(spec: str):
+    """sampler(rng, size) -> int array (>= 1) for a distribution spec like 'uniform:16:256'."""
+    kind, *params = spec.split(":")
+    p = [float(x) for x in params]
+    draw = {
+        "const": lambda rng, n: np.full(n, p[0]),
+        "uniform": lambda rng, n: rng.integers(int(p[0]), int(p[1]) + 1, size=n),
+        "normal": lambda rng, n: rng.normal(p[0], p[1], size=n),
+        "lognormal": lambda rng, n: rng.lognormal(p[0], p[1], size=n),
+        "exp": lambda rng, n: rng.exponential(p[0], size=n),
+    }.get(kind)
+    if draw is None:
+        raise ValueError(f"unknown distribution '{kind}' in '{spec}'")
+    return lambda rng, n: np.maximum(1, np.rint(draw(rng, n))).astype(np.int64)
+
+
+def parse_synthetic(workload: str) -> dict:
+    fields = dict(item.split("=", 1) for item in workload[len(SYNTHETIC_PREFIX):].split(",") if item)
+    spec = {
+        "n": int(fields.pop("n", 1000)),
+        "input": fields.pop("input", "lognormal:4.5:0.5"),
+        "output": fields.pop("output", f"const:{DEFAULT_MAX_TOKENS}"),
+        "seed": int(fields.pop("seed", 0)),
+    }
+    if fields:
+        raise ValueError(f"unknown synthetic workload fields: {sorted(fields)}")
+    return spec
+
+
+def synthetic_requests(n: int, input_dist: str, output_dist: str, seed: int = 0, chunk_rows: int = CHUNK_ROWS):
+    """Yield n {'text', 'max_tokens'} requests; the same arguments always give the same prompts."""
+    rng = np.random.default_rng(seed)
+    input_len = parse_distribution(input_dist)
+    output_len = parse_distribution(output_dist)
+    for start in range(0, n, chunk_rows):
+        size = min(chunk_rows, n - start)
+        lengths = input_len(rng, size)
+        max_tokens = output_len(rng, size)
+        words = VOCAB[rng.integers(0, len(VOCAB), size=int(lengths.sum()))]
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        for k in range(size):
+            yield {"text": " ".join(words[bounds[k]:bounds[k + 1]]), "max_tokens": int(max_tokens[k])}
+
+
+class WorkloadSource:
+    """Iterable of request dicts ({'text', 'max_tokens', ...}) for a workload path or synthetic spec.
+
+    `size` is known up front for synthetic workloads and None for CSVs (counted while
+    streaming); `columns` lists the fields every request carries.
+    """
+
+    def __init__(self, workload: str, chunk_rows: int = CHUNK_ROWS, extra_columns=()):
+        self.workload = workload
+        self.chunk_rows = chunk_rows
+        if is_synthetic(workload):
+            self.spec = parse_synthetic(workload)
+            self.size = self.spec["n"]
+            self.columns = ["text", "max_tokens"]
+        else:
+            self.spec = None
+            self.size = None
+            header = pd.read_csv(workload, nrows=0).columns
+            self.columns = list(header)
+            if "text" not in header:
+                raise ValueError("workload CSV must contain a 'text' column")
+            missing = [c for c in extra_columns if c not in header]
+            if missing:
+                raise ValueError(f"workload CSV has no column(s) {missing}")
+        self.usecols = [c for c in self.columns if c in ("text", "max_tokens", *extra_columns)]
+
+    def __iter__(self):
+        if self.spec:
+            yield from synthetic_requests(self.spec["n"], self.spec["input"], self.spec["output"],
+                                          self.spec["seed"], self.chunk_rows)
+            return
+        for chunk in pd.read_csv(self.workload, usecols=self.usecols, chunksize=self.chunk_rows):
+            if "max_tokens" not in chunk:
+                chunk["max_tokens"] = DEFAULT_MAX_TOKENS
+            chunk["max_tokens"] = chunk["max_tokens"].fillna(DEFAULT_MAX_TOKENS).astype(int)
+            yield from chunk.to_dict("records")
+
+
+def count_requests(workload: str) -> int:
+    """Number of requests, without holding the workload in memory."""
+    if is_synthetic(workload):
+        return parse_synthetic(workload)["n"]
+    return sum(len(chunk) for chunk in pd.read_csv(workload, usecols=["text"], chunksize=CHUNK_ROWS))
+
+
+def write_csv(workload: str, out_path: str) -> int:
+    """Materialize a workload (typically synthetic) as a CSV, streaming. Returns the row count."""
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    n = 0
+    with open(out_path, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["text", "max_tokens"])
+        for req in WorkloadSource(workload):
+            w.writerow([req["text"], req["max_tokens"]])
+            n += 1
+    return n
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(2)
+    print(f"📝 Wrote {write_csv(sys.argv[1], sys.argv[2])} requests to {sys.argv[2]}")
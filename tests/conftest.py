@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Client-side modules import each other as Quanti.<module>; the ones shipped to the GPU
+# host use bare imports from inside the Quanti directory. Tests need both to resolve.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "Quanti")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,65 @@
+import json
+import os
+import socket
+from pathlib import Path
+
+from Quanti.agent_client import AgentClient
+from Quanti.transport import LocalTransport
+from Quanti.uploader import upload_all_files
+from colocate import colocation_plan
+from mock_server import serve_in_thread
+
+MODELS = ["Llama-3-8B", "Llama-3-8B-AWQ"]
+QUANTI = Path(__file__).resolve().parent.parent / "Quanti"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_trace(path, n=5):
+    rows = ["t_local_s,power_W,util_pct,mem_used_MB,mem_total_MB"]
+    rows += [f"{0.05 * i:.2f},{200 + i},50,1000,80000" for i in range(n)]
+    path.write_text("\n".join(rows) + "\n")
+
+
+def test_agent_jobs_reuse_the_metrics_port_after_a_crash(tmp_path, monkeypatch):
+    monkeypatch.chdir(QUANTI)  # the upload list is relative to Quanti/
+    root = tmp_path / "host"
+    transport = LocalTransport(str(root))
+    upload_all_files(transport)
+
+    # Mock servers stand in for a warm pair of co-located vLLM instances
+    ports = [free_port(), free_port()]
+    mocks = [serve_in_thread(port, ttft_s=0.001, decode_tok_per_s=0) for port in ports]
+    plan = colocation_plan(MODELS, ports)
+    state = {"llm": ",".join(MODELS), "args": " | ".join(inst["vllm_args"] for inst in plan),
+             "pid": os.getpid(), "port": ports[0],
+             "instances": [{"llm": inst["llm"], "args": inst["vllm_args"], "pid": os.getpid(), "port": inst["port"]}
+                           for inst in plan]}
+    (root / ".quanti_server.json").write_text(json.dumps(state))
+    trace = tmp_path / "trace.csv"
+    write_trace(trace)
+
+    # The first job crashes once its metrics server is up: its trace path is a directory
+    (root / "Quanti" / "out" / "r0" / "detailed" / "energy_trace.csv").mkdir(parents=True)
+    metrics_port = free_port()
+    logs = []
+    try:
+        with AgentClient(transport, daemon=False) as agent:
+            codes = [agent.run([",".join(MODELS), "synthetic:n=3,seed=0", f"out/r{i}", "--warm",
+                                "--ports", ",".join(map(str, ports)), "--sampler", f"replay:{trace}",
+                                "--metrics-port", str(metrics_port), "--run-number", str(i)],
+                               on_log=logs.append)
+                     for i in range(3)]
+    finally:
+        for mock in mocks:
+            mock.shutdown()
+            mock.server_close()
+
+    assert codes == [1, 0, 0], "\n".join(logs)
+    for i in (1, 2):
+        summary = json.loads((root / "Quanti" / "out" / f"r{i}" / "summary.json").read_text())
+        assert (summary["n_prompts"], summary["run_number"]) == (6, i)
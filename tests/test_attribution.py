@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from attribution import attribute_energy, attribute_runs
+
+# Power rises linearly, 100 W + 10 W/s, so the trapezoid rule is exact
+T = np.arange(0, 10.01, 0.5)
+POWER = 100 + 10 * T
+# Overlapping requests, idle over [0, 1], [6, 8] and [9, 10]
+START = [1.0, 2.0, 4.0, 8.0]
+END = [3.0, 5.0, 6.0, 9.0]
+
+
+def energy(a, b):
+    return 100 * (b - a) + 5 * (b ** 2 - a ** 2)
+
+
+def expected():
+    # Each stretch is split evenly between the requests in flight during it
+    return np.array([
+        energy(1, 2) + energy(2, 3) / 2,
+        energy(2, 3) / 2 + energy(3, 4) + energy(4, 5) / 2,
+        energy(4, 5) / 2 + energy(5, 6),
+        energy(8, 9),
+    ])
+
+
+def test_overlapping_requests_share_each_stretch_equally():
+    shares = attribute_energy(T, POWER, START, END)
+    assert shares == pytest.approx(expected())
+    idle = energy(0, 1) + energy(6, 8) + energy(9, 10)
+    assert shares.sum() == pytest.approx(energy(0, 10) - idle)
+
+
+def test_attribute_runs_rewrites_energy_j_across_results_files(tmp_path):
+    trace = tmp_path / "energy_trace.csv"
+    pd.DataFrame({"t_local_s": T, "power_W": POWER}).to_csv(trace, index=False)
+    files = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    # Requests 0 and 2 go to one server, 1 and 3 to the other; overlaps still split across them
+    for path, rows in zip(files, ([0, 2], [1, 3])):
+        pd.DataFrame({"prompt": [f"p{i}" for i in rows], "t_send_s": [START[i] for i in rows],
+                      "t_end_s": [END[i] for i in rows]}).to_csv(path, index=False)
+
+    summaries = attribute_runs([str(f) for f in files], str(trace))
+
+    want = expected()
+    for path, rows, summary in zip(files, ([0, 2], [1, 3]), summaries):
+        frame = pd.read_csv(path)
+        assert list(frame["prompt"]) == [f"p{i}" for i in rows]
+        assert frame["energy_J"].tolist() == pytest.approx(want[rows], abs=1e-4)
+        assert summary["attributed_energy_J"] == pytest.approx(want[rows].sum(), abs=1e-3)
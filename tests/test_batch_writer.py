@@ -0,0 +1,33 @@
+import csv
+import random
+import zlib
+
+from batch_writer import BatchWriter, open_text, render_records
+
+COLUMNS = ["idx", "payload"]
+
+
+def rows(start, stop, rng):
+    return [{"idx": str(i), "payload": "%032x" % rng.getrandbits(128)} for i in range(start, stop)]
+
+
+def test_truncated_gzip_member_reads_back_its_complete_lines(tmp_path):
+    rng = random.Random(0)
+    path = tmp_path / "query_responses.csv.gz"
+    flushed = rows(0, 4, rng)
+    with BatchWriter(str(path), columns=COLUMNS, flush_items=2) as writer:
+        for row in flushed:
+            writer.write(row)
+    assert writer.batches == 2
+
+    # The run is killed while the next (large) batch is being written: half its member reaches the disk
+    pending = rows(4, 20000, rng)
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+    member = gz.compress(render_records(pending, COLUMNS).encode()) + gz.flush()
+    with open(path, "ab") as f:
+        f.write(member[:len(member) // 2])
+
+    with open_text(str(path)) as f:
+        read = list(csv.DictReader(f))
+    assert len(read) > len(flushed)
+    assert read == (flushed + pending)[:len(read)]
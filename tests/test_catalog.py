@@ -0,0 +1,25 @@
+import json
+import sqlite3
+
+from Quanti.catalog import RunCatalog
+
+
+def test_reserved_run_is_recorded_in_its_own_row(tmp_path):
+    catalog = RunCatalog(str(tmp_path / "runs.sqlite"))
+    first, number = catalog.reserve("Llama-3-8B", "data/input/llm_workload_10.csv", number=3)
+    assert number == 3
+    # A taken number falls back to the next free one
+    second, number = catalog.reserve("Llama-3-8B", "data/input/llm_workload_10.csv", number=3)
+    assert number == 4
+
+    run_dir = tmp_path / "r03_Llama-3-8B"
+    run_dir.mkdir()
+    (run_dir / "summary.json").write_text(json.dumps(
+        {"llm": "Llama-3-8B", "workload": "data/input/llm_workload_10.csv", "energy_Wh": 1.5, "run_number": 3}))
+    assert catalog.record_dir(str(run_dir), host="glg1", run_id=first) == first
+    catalog.fail(second, "benchmark exited with 1")
+    catalog.close()
+
+    with sqlite3.connect(tmp_path / "runs.sqlite") as conn:
+        rows = conn.execute("SELECT run_number, status, host, run_dir FROM runs ORDER BY id").fetchall()
+    assert rows == [(3, "done", "glg1", str(run_dir)), (4, "failed", None, None)]
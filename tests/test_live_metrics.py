@@ -0,0 +1,31 @@
+import pytest
+
+from live_metrics import LiveMetrics, WindowedHistogram, WindowedMean
+
+
+def test_out_of_order_samples_leave_the_window_on_time():
+    mean, hist = WindowedMean(10), WindowedHistogram(10)
+    # A slow request finishing at t=2 is reported after later ones
+    for t, value in [(5.0, 1.0), (11.0, 2.0), (2.0, 4.0), (12.5, 8.0)]:
+        mean.add(t, value)
+        hist.add(t, value)
+    # Only t=2 is older than 12.5 - 10
+    assert mean.count == hist.count == 3
+    assert mean.total == 11.0
+    mean.evict(16.0)
+    hist.evict(16.0)
+    assert mean.count == hist.count == 2
+    assert mean.total == 10.0
+
+
+def test_late_report_of_an_expired_request_is_not_counted():
+    now = [30.0]
+    live = LiveMetrics(clock=lambda: now[0], windows=(10,))
+    for t_end in (25.0, 28.0, 29.5):
+        live.record_request(t_end, 0.5, completion_tokens=10)
+    live.record_request(3.0, 27.0, completion_tokens=10)  # long request, reported late
+    window = live.snapshot()["windows"]["10s"]
+    assert live.requests_total == 4
+    assert window["requests_per_s"] == pytest.approx(0.3)
+    assert window["output_tok_per_s"] == pytest.approx(3.0)
+    assert window["latency_p99_s"] < 1.0
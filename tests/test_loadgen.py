@@ -0,0 +1,119 @@
+import itertools
+import threading
+
+from loadgen import run_closed_loop, run_open_loop
+
+
+def test_closed_loop_reports_in_workload_order():
+    second_done = threading.Event()
+
+    def send(prompt):
+        # The first request only returns once a later one has finished
+        if prompt == "p0":
+            assert second_done.wait(timeout=5)
+        if prompt == "p2":
+            second_done.set()
+        return {"prompt": prompt}
+
+    completed, reported = [], []
+    n = run_closed_loop(((i, f"p{i}") for i in range(6)), send, concurrency=3,
+                        on_result=lambda idx, prompt, result, timing: reported.append((idx, result["prompt"])),
+                        on_complete=lambda idx, *_: completed.append(idx))
+
+    assert n == 6
+    assert completed.index(2) < completed.index(0)
+    assert reported == [(i, f"p{i}") for i in range(6)]
+
+
+def test_closed_loop_keeps_at_most_concurrency_requests_in_flight():
+    lock = threading.Lock()
+    state = {"in_flight": 0, "peak": 0}
+    # Every request waits for two others, so three must be in flight together to make progress
+    barrier = threading.Barrier(3, timeout=5)
+
+    def send(prompt):
+        with lock:
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+        barrier.wait()
+        with lock:
+            state["in_flight"] -= 1
+        return {}
+
+    assert run_closed_loop(enumerate(range(9)), send, concurrency=3) == 9
+    assert state["peak"] == 3
+
+
+def test_closed_loop_times_requests_on_the_injected_clock():
+    ticks = itertools.count()
+    timings = []
+    run_closed_loop(enumerate("ab"), lambda prompt: {}, clock=lambda: next(ticks),
+                    on_result=lambda idx, prompt, result, timing: timings.append(timing))
+    # origin = 0; each request reads the clock once before and once after send
+    assert [(t["t_send_s"], t["t_end_s"], t["latency_s"], t["queue_delay_s"]) for t in timings] == \
+        [(1, 2, 1, 0), (3, 4, 1, 0)]
+
+
+class FakeClock:
+    """Virtual time, advanced only by sleep(); sleep first waits until `ready()` holds."""
+
+    def __init__(self, ready=lambda clock: True):
+        self.now = 0.0
+        self.ready = ready
+        self.cond = threading.Condition()
+
+    def __call__(self):
+        with self.cond:
+            return self.now
+
+    def sleep(self, seconds):
+        with self.cond:
+            assert self.cond.wait_for(lambda: self.ready(self), timeout=5)
+            self.now += seconds
+            self.cond.notify_all()
+
+    def wait_until(self, t):
+        with self.cond:
+            assert self.cond.wait_for(lambda: self.now >= t, timeout=5)
+
+
+def test_open_loop_sends_at_the_scheduled_offsets():
+    offsets = [0.0, 0.5, 0.5, 2.0, 3.25]
+    sent = []
+    # Time only moves on once every request due so far has been sent
+    clock = FakeClock(ready=lambda c: len(sent) == sum(t <= c.now for t in offsets))
+
+    def send(prompt):
+        with clock.cond:
+            sent.append((prompt, clock.now))
+            clock.cond.notify_all()
+        return {}
+
+    timings = {}
+    n = run_open_loop(((i, f"p{i}", t) for i, t in enumerate(offsets)), send, clock=clock, sleep=clock.sleep,
+                      on_result=lambda idx, prompt, result, timing: timings.__setitem__(idx, timing))
+
+    assert n == 5
+    assert sorted(sent) == [(f"p{i}", t) for i, t in enumerate(offsets)]
+    assert [timings[i]["t_send_s"] for i in range(5)] == offsets
+    assert all(timings[i]["queue_delay_s"] == 0 for i in range(5))
+
+
+def test_open_loop_records_queueing_behind_busy_workers():
+    started = threading.Event()
+    clock = FakeClock(ready=lambda c: started.is_set())
+
+    def send(prompt):
+        if prompt == "a":
+            # Holds the only worker until the last arrival is due
+            started.set()
+            clock.wait_until(2.0)
+        return {}
+
+    timings = {}
+    run_open_loop(iter([(0, "a", 0.0), (1, "b", 1.0), (2, "c", 2.0)]), send, max_in_flight=1, clock=clock,
+                  sleep=clock.sleep, on_result=lambda idx, prompt, result, timing: timings.__setitem__(idx, timing))
+
+    assert [(t["t_arrival_s"], t["t_send_s"], t["queue_delay_s"]) for t in map(timings.get, range(3))] == \
+        [(0.0, 0.0, 0.0), (1.0, 2.0, 1.0), (2.0, 2.0, 0.0)]
+    assert timings[0]["latency_s"] == 2.0 and timings[1]["latency_s"] == 1.0
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pytest
+
+from Quanti import regression
+
+
+def write_runs(root, values, **extra):
+    for i, energy in enumerate(values):
+        run = root / f"r{i:02d}"
+        run.mkdir(parents=True)
+        summary = {"llm": "Llama-3-8B", "workload": "data/input/llm_workload_10.csv",
+                   "energy_Wh": energy, "energy_gross_Wh": energy, **extra}
+        (run / "summary.json").write_text(json.dumps(summary))
+    return str(root)
+
+
+@pytest.mark.parametrize("m, n", [(2, 7), (3, 9), (4, 6)])
+def test_permutation_matches_exact_without_ties(m, n):
+    rng = np.random.default_rng(m * n)
+    x, y = rng.normal(size=m) + 0.5, rng.normal(size=n)
+    counts = regression.u_distribution(m, n)
+    exact = counts[int(round(regression.u_statistic(x, y))):].sum() / counts.sum()
+    assert regression.permutation_p(np.concatenate([x, y]), m, regression.u_statistic(x, y)) == pytest.approx(exact)
+
+
+def test_min_p_value_is_one_over_the_number_of_splits():
+    assert regression.min_p_value(1, 5) == pytest.approx(1 / 6)
+    assert regression.min_p_value(2, 30) == pytest.approx(1 / 496)
+
+
+def test_one_new_run_is_untestable_not_a_pass(tmp_path):
+    baseline = write_runs(tmp_path / "base", np.linspace(1.0, 1.1, 30))
+    new = write_runs(tmp_path / "new", [2.2])
+    assert regression.main([new, "--baseline", baseline, "--metrics", "energy_Wh"]) == 3
+
+
+def test_tied_repeats_that_double_the_energy_fail(tmp_path):
+    baseline = write_runs(tmp_path / "base", np.linspace(1.0, 1.1, 30))
+    new = write_runs(tmp_path / "new", [2.2, 2.2])
+    assert regression.main([new, "--baseline", baseline, "--metrics", "energy_Wh"]) == 1
+
+
+def test_runs_from_the_baseline_distribution_pass(tmp_path):
+    baseline = write_runs(tmp_path / "base", np.linspace(1.0, 1.1, 30))
+    new = write_runs(tmp_path / "new", [1.02, 1.05, 1.08])
+    assert regression.main([new, "--baseline", baseline, "--metrics", "energy_Wh"]) == 0
+
+
+def test_legacy_energy_is_recomputed_over_the_workload_window(tmp_path):
+    run = tmp_path / "r01"
+    (run / "detailed").mkdir(parents=True)
+    # 100 W for the 10 s workload, then 300 W the old definition also counted
+    rows = [f"{t},2025/01/01 00:00:00.000,{100.0 if t <= 10 else 300.0},50,1000,80000" for t in range(0, 16)]
+    (run / "detailed" / "energy_trace.csv").write_text(
+        "t_local_s,timestamp,power_W,util_pct,mem_used_MB,mem_total_MB\n" + "\n".join(rows) + "\n")
+    summary = {"energy_Wh": 0.9, "J_per_output_token": 3.0, "workload_duration_s": 10.0}
+    metrics = regression.run_metrics(summary, str(run))
+    assert metrics["energy_Wh"] == pytest.approx(1000.0 / 3600)
+    assert metrics["J_per_output_token"] == pytest.approx(3.0 * (1000.0 / 3600) / 0.9)
+
+    # Without its trace a legacy run can't be put on the new definition, so it isn't compared
+    assert "energy_Wh" not in regression.run_metrics(summary, str(tmp_path / "gone"))
+    assert regression.run_metrics({**summary, "energy_gross_Wh": 0.9})["energy_Wh"] == 0.9
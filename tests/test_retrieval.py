@@ -0,0 +1,44 @@
+import pytest
+
+from Quanti.retrieval import CHECKSUMS, ResultRetriever
+from Quanti.transport import LocalTransport
+
+RESULTS = "detailed/query_responses.csv"
+
+
+class CorruptingTransport(LocalTransport):
+    """Mangles every fetch of one file once `corrupt` is set, like a link that flips bytes."""
+
+    def __init__(self, root, target, mangle):
+        super().__init__(root)
+        self.target, self.mangle = target, mangle
+        self.corrupt = False
+
+    def run(self, cmd, input=None, timeout=None):
+        if self.corrupt and "tail -c" in cmd and self.target in cmd:
+            cmd = self.mangle(cmd)
+        return super().run(cmd, input=input, timeout=timeout)
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda cmd: cmd.replace(" | gzip -1", " | tr 0-9 a-j | gzip -1"),  # same length, other bytes
+    lambda cmd: cmd + " | head -c 20",  # truncated gzip stream
+], ids=["content", "stream"])
+def test_file_corrupted_mid_run_is_reported_unverified(tmp_path, mangle):
+    transport = CorruptingTransport(str(tmp_path / "host"), RESULTS, mangle)
+    remote = tmp_path / "host" / "Quanti" / "out"
+    (remote / "detailed").mkdir(parents=True)
+    (remote / "summary.json").write_text('{"energy_Wh": 1.5}\n')
+    (remote / RESULTS).write_text("".join(f"{i},prompt {i},{i * 7}\n" for i in range(100)))
+    local = tmp_path / "local"
+    retriever = ResultRetriever(transport, "~/Quanti/out", str(local), interval_s=0)
+    assert retriever.sync() == 2
+
+    # The run appends more rows, and from now on that file arrives damaged
+    with open(remote / RESULTS, "a") as fh:
+        fh.write("".join(f"{i},prompt {i},{i * 7}\n" for i in range(100, 200)))
+    transport.corrupt = True
+
+    assert retriever.finish() == [RESULTS]
+    assert (local / "summary.json").read_text() == (remote / "summary.json").read_text()
+    assert not (local / CHECKSUMS).exists()
@@ -0,0 +1,51 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from energy import EnergyMonitor
+import samplers
+from samplers import RaplSampler, ReplaySampler
+
+TRACE = Path(__file__).resolve().parent / "data" / "replay_trace.csv"
+TRACE_J = 75.0  # power rises linearly from 100 W to 200 W over 0.5 s
+
+
+def test_replay_sampler_yields_the_recorded_rows():
+    samples = list(ReplaySampler(str(TRACE), speed=0).samples(threading.Event()))
+    assert [power for _, power, _, _, _ in samples] == [100.0 + 10 * i for i in range(11)]
+    assert [util for _, _, util, _, _ in samples] == [40.0 + i for i in range(11)]
+    assert {(used, total) for _, _, _, used, total in samples} == {(1000.0, 80000.0)}
+
+
+def test_replayed_trace_integrates_to_the_recorded_energy(tmp_path):
+    monitor = EnergyMonitor(output_dir=str(tmp_path), sampler=ReplaySampler(str(TRACE)))
+    monitor.start()
+    monitor._thr.join(timeout=10)  # the replay ends on its own
+    summary = monitor.stop()
+    assert summary["samples"] == 11
+    assert summary["energy_trace_Wh"] * 3600 == pytest.approx(TRACE_J, rel=0.1)
+
+
+def write_zone(root, zone, name, energy_uj, max_uj):
+    path = root / zone
+    path.mkdir(exist_ok=True)
+    (path / "name").write_text(f"{name}\n")
+    (path / "max_energy_range_uj").write_text(f"{max_uj}\n")
+    (path / "energy_uj").write_text(f"{energy_uj}\n")
+
+
+def test_rapl_power_survives_a_counter_wrap(tmp_path, monkeypatch):
+    write_zone(tmp_path, "intel-rapl:0", "package-0", 9_500_000, 10_000_000)
+    write_zone(tmp_path, "intel-rapl:0:0", "dram", 100_000, 10_000_000)
+    clock = iter([100.0, 100.5])
+    monkeypatch.setattr(samplers.time, "monotonic", lambda: next(clock))
+
+    rapl = RaplSampler(str(tmp_path))
+    assert rapl.host_domains == ["package-0", "package-0_dram"]
+    assert rapl.read() == {"package-0": 0.0, "package-0_dram": 0.0}
+
+    # The package counter wraps at max_energy_range_uj: 0.5 J to the top, 0.5 J after it
+    (tmp_path / "intel-rapl:0" / "energy_uj").write_text("500000\n")
+    (tmp_path / "intel-rapl:0:0" / "energy_uj").write_text("350000\n")
+    assert rapl.read() == pytest.approx({"package-0": 2.0, "package-0_dram": 0.5})
@@ -0,0 +1,48 @@
+import json
+import threading
+import time
+
+from Quanti import scheduler
+from Quanti.hostpool import Host, HostPool
+
+
+def test_parallel_hosts_record_every_run(tmp_path, monkeypatch):
+    def fake_execute(run, host, extra_args):
+        time.sleep(0.001)
+        return ""
+
+    monkeypatch.setattr(scheduler, "execute_on_host", fake_execute)
+    matrix = {"models": ["m1", "m2", "m3", "m4"], "workloads": [f"data/input/llm_workload_{i}.csv" for i in range(10)],
+              "repeats": 10, "output_dir": str(tmp_path / "out"), "args": [], "max_attempts": 3}
+    state = scheduler.RunState(str(tmp_path / "state.json"))
+    hosts = [f"local:{tmp_path / f'host{i}'}" for i in range(4)]
+
+    done = []
+    thread = threading.Thread(target=lambda: done.append(scheduler.run_matrix_on_hosts(matrix, state, hosts)),
+                              daemon=True)
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive(), "run_matrix_on_hosts hung"
+
+    assert done[0][scheduler.DONE] == 400
+    with open(tmp_path / "state.json") as f:
+        saved = json.load(f)["runs"]
+    assert len(saved) == 400 and all(r["status"] == scheduler.DONE for r in saved.values())
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_failing_on_result_does_not_stall_the_pool(tmp_path):
+    def on_result(run, host, error):
+        raise OSError("disk full")
+
+    host = Host(f"local:{tmp_path / 'host'}")
+    host.gpu_model = "unknown"
+    pool = HostPool([host], lambda run, h: "", on_result=on_result)
+    runs = [{"key": str(i), "model": "m", "workload": "w"} for i in range(5)]
+
+    left = []
+    thread = threading.Thread(target=lambda: left.append(pool.run(runs)), daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "pool hung after on_result raised"
+    assert left == [[]]
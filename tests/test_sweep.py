@@ -0,0 +1,20 @@
+import json
+
+from Quanti import sweep
+
+
+def point(seqs, j, tok_s, p99, status=sweep.OK):
+    p = {"gpu_memory_utilization": 0.85, "max_len": 2048, "max_num_seqs": seqs, "concurrency": 1}
+    return {**p, "key": sweep.point_key(p), "status": status,
+            "J_per_output_token": j, "decode_tok_per_s": tok_s, "latency_p99_s": p99}
+
+
+def test_points_without_every_metric_stay_off_the_front(tmp_path):
+    points = [point(8, 0.5, 100.0, 1.0), point(16, None, 150.0, 0.5), point(32, 0.4, 120.0, 1.2)]
+    front = sweep.pareto_front(points)
+    assert [p["max_num_seqs"] for p in front] == [8, 32]
+
+    best = sweep.report(points, str(tmp_path))
+    assert best["max_num_seqs"] == 32
+    saved = json.loads((tmp_path / "pareto.json").read_text())
+    assert [p["max_num_seqs"] for p in saved["front"]] == [32, 8]
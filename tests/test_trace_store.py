@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from Quanti.trace_store import TraceStore
+
+
+def write_run(run_dir, llm, power, rapl=False):
+    (run_dir / "detailed").mkdir(parents=True)
+    (run_dir / "summary.json").write_text(json.dumps({"llm": llm, "workload": "data/input/llm_workload_10.csv",
+                                                      "energy_Wh": 0.5, "stream": False}))
+    trace = pd.DataFrame({"timestamp": [f"2026/01/01 00:00:0{i}.000" for i in range(len(power))],
+                          "t_local_s": np.arange(len(power), dtype=float), "power_W": power})
+    if rapl:
+        trace["rapl_package-0_W"] = 30.0
+    trace.to_csv(run_dir / "detailed" / "energy_trace.csv", index=False)
+    pd.DataFrame({"prompt": ["a", "b"], "latency_s": [0.1, 0.2]}).to_csv(
+        run_dir / "detailed" / "query_responses.csv", index=False)
+
+
+def test_ingest_only_appends_new_or_changed_runs(tmp_path):
+    root, path = tmp_path / "outputs", str(tmp_path / "store")
+    write_run(root / "r00_a", "Llama-3-8B", [100.0, 110.0])
+    write_run(root / "r01_a", "Llama-3-8B", [120.0, 130.0, 140.0])
+
+    assert sorted(TraceStore(path).ingest(str(root))) == ["r00_a", "r01_a"]
+    assert TraceStore(path).ingest(str(root)) == []
+
+    # A redone run has a new fingerprint and goes into a chunk of its own
+    (root / "r01_a" / "detailed" / "energy_trace.csv").unlink()
+    write_run(root / "r02_b", "Granite-8B", [90.0])
+    pd.DataFrame({"t_local_s": [0.0], "power_W": [150.0]}).to_csv(
+        root / "r01_a" / "detailed" / "energy_trace.csv", index=False)
+    store = TraceStore(path)
+    assert sorted(store.ingest(str(root))) == ["r01_a", "r02_b"]
+    assert len(store.manifest["chunks"]) == 2
+    assert store.manifest["runs"]["r00_a"]["chunk"] == store.manifest["chunks"][0]
+    assert TraceStore(path).load("trace", run_ids=[store.manifest["runs"]["r01_a"]["run_id"]])["power_W"].tolist() \
+        == [150.0]
+
+
+def test_load_round_trips_the_stored_columns(tmp_path):
+    root, path = tmp_path / "outputs", str(tmp_path / "store")
+    write_run(root / "r00_a", "Llama-3-8B", [100.0, 110.0], rapl=True)
+    write_run(root / "r03_b", "Granite-8B", [90.0, 95.0, 99.0])
+    TraceStore(path).ingest(str(root))
+
+    store = TraceStore(path)
+    runs = store.runs()
+    assert runs[["model", "workload", "repeat", "n_trace", "n_requests"]].values.tolist() == [
+        ["Granite-8B", "llm_workload_10", 3, 3, 2], ["Llama-3-8B", "llm_workload_10", 0, 2, 2]]
+    assert runs["energy_Wh"].tolist() == [0.5, 0.5] and "stream" not in runs
+
+    granite = store.load("trace", model="Granite-8B")
+    assert granite["power_W"].tolist() == [90.0, 95.0, 99.0]
+    assert granite["t_epoch_s"][1] - granite["t_epoch_s"][0] == 1.0
+    # A column only one run has is NaN for the others
+    assert np.isnan(granite["rapl_package-0_W"]).all()
+
+    frame = store.load_frame("trace", columns=["power_W"])
+    assert list(frame.columns) == ["run_id", "power_W", "model", "workload", "repeat"]
+    assert frame.groupby("model")["power_W"].sum().to_dict() == {"Granite-8B": 284.0, "Llama-3-8B": 210.0}
+    requests = store.load_frame("requests", workload="llm_workload_10")
+    assert requests["latency_s"].tolist() == [0.1, 0.2, 0.1, 0.2] and "prompt" not in requests
@@ -0,0 +1,30 @@
+from Quanti.transport import LocalTransport
+from Quanti.uploader import MANIFEST, sync_files
+
+
+def test_uploads_stay_incremental_across_cold_cleanups(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    (src / "data").mkdir(parents=True)
+    (src / "a.py").write_text("print('a')\n")
+    (src / "data" / "w.csv").write_text("prompt\nhi\n")
+    monkeypatch.chdir(src)
+    files = {"a.py": "a.py", "data/w.csv": "data/input/w.csv"}
+    transport = LocalTransport(str(tmp_path / "host"))
+    remote = tmp_path / "host" / "Quanti"
+
+    assert sync_files(transport, files) == ["a.py", "data/input/w.csv"]
+    before = {p: p.stat().st_mtime_ns for p in remote.rglob("*") if p.is_file()}
+    assert sync_files(transport, files) == []
+    assert {p: p.stat().st_mtime_ns for p in remote.rglob("*") if p.is_file()} == before
+
+    # Only the edited file goes over the wire
+    (src / "a.py").write_text("print('b')\n")
+    assert sync_files(transport, files) == ["a.py"]
+    assert (remote / "a.py").read_text() == "print('b')\n"
+
+    # cleanup_server after a cold run: the tree comes back from the host's cache, nothing is sent
+    transport.run("rm -rf ~/Quanti")
+    assert sync_files(transport, files) == []
+    assert (remote / "a.py").read_text() == "print('b')\n"
+    assert (remote / "data" / "input" / "w.csv").read_text() == "prompt\nhi\n"
+    assert (remote / MANIFEST).exists() and (remote / "data" / "results").is_dir()